@@ -0,0 +1,117 @@
+'''
+Benchmark of the messages per second that go through the Reactions listener.
+
+Run it from the root of the repository:
+
+    python -m benchmarks.bench_reactions --messages 200000 --match-ratio 0.01
+
+It measures the compiled trigger matcher against the previous linear lookup,
+and then the whole `Reactions.on_message` with fake messages (the reactions
+are no-ops, so only the listener's own cost is measured).
+'''
+import argparse
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+from utils.const import WORDS_TO_REACT
+from utils.trigger_matcher import TriggerMatcher
+
+FILLER_WORDS = [
+  "hola", "gg", "que onda", "alguien juega?", "jajaja", "lol", "ok", "nos vemos",
+  "mañana", "rocket", "partida", "dale", "buenas", "xd", "me voy a dormir",
+]
+
+def make_messages(count: int, match_ratio: float, seed: int = 0) -> list[str]:
+  '''
+  Create the content of the messages, `match_ratio` of them are triggers.
+  '''
+  rng = random.Random(seed)
+  messages = []
+
+  for _ in range(count):
+    if rng.random() < match_ratio:
+      messages.append(rng.choice(WORDS_TO_REACT).upper())
+    else:
+      messages.append(" ".join(rng.choices(FILLER_WORDS, k=rng.randint(1, 12))))
+
+  return messages
+
+def report(name: str, count: int, seconds: float):
+  ''' Print the throughput of a benchmark. '''
+  print(f"{name:<28} {count / seconds:>14,.0f} msg/s  ({seconds * 1000:.1f} ms)")
+
+# region matcher
+def bench_matcher(messages: list[str]):
+  '''
+  Compare the compiled matcher with the previous linear lookup.
+  '''
+  start = time.perf_counter()
+  for content in messages:
+    _ = content.lower() in [word for word in WORDS_TO_REACT]
+  report("linear list (previous)", len(messages), time.perf_counter() - start)
+
+  matcher = TriggerMatcher(exact=WORDS_TO_REACT)
+  start = time.perf_counter()
+  for content in messages:
+    matcher.match(content)
+  report("compiled exact", len(messages), time.perf_counter() - start)
+
+  matcher = TriggerMatcher(exact=WORDS_TO_REACT, substrings=["for honor", "minecraft"])
+  start = time.perf_counter()
+  for content in messages:
+    matcher.match(content)
+  report("compiled exact + substring", len(messages), time.perf_counter() - start)
+# endregion
+
+# region listener
+async def bench_listener(messages: list[str]):
+  '''
+  Drive `Reactions.on_message` with fake messages.
+  '''
+  from cogs.reactions import Reactions # Needs the Discord library
+
+  async def noop(*_args, **_kwargs):
+    return None
+
+  bot_user = SimpleNamespace(name="bot")
+  author = SimpleNamespace(id=1, name="user")
+  guild = SimpleNamespace(id=1)
+  channel = SimpleNamespace(id=1, send=noop)
+
+  cog = Reactions(SimpleNamespace(user=bot_user))
+  fake_messages = [
+    SimpleNamespace(
+      content=content,
+      author=author,
+      guild=guild,
+      channel=channel,
+      id=index,
+      add_reaction=noop
+    ) for index, content in enumerate(messages)
+  ]
+
+  start = time.perf_counter()
+  for message in fake_messages:
+    await cog.on_message(message)
+  report("Reactions.on_message", len(messages), time.perf_counter() - start)
+  print(f"Dispatcher: {cog.dispatcher.stats()}")
+# endregion
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--messages", type=int, default=100_000, help="Number of messages")
+  parser.add_argument("--match-ratio", type=float, default=0.01, help="Ratio of trigger messages")
+  parser.add_argument("--skip-listener", action="store_true", help="Only benchmark the matcher")
+  args = parser.parse_args()
+
+  messages = make_messages(args.messages, args.match_ratio)
+
+  bench_matcher(messages)
+
+  if not args.skip_listener:
+    asyncio.run(bench_listener(messages))
+
+if __name__ == "__main__":
+  main()
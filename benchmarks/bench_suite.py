@@ -0,0 +1,89 @@
+'''
+Offline benchmark suite of the models, the parsers and the embed builders.
+
+Run it from the root of the repository:
+
+    python -m benchmarks.bench_suite
+    python -m benchmarks.bench_suite --filter embeds --output results.json
+    python -m benchmarks.bench_suite --update-baseline
+
+It measures the throughput and the allocations of every case in
+`benchmarks/cases.py`, writes them as JSON and compares them with
+`benchmarks/baseline.json`. It exits with 1 if a case regressed, or if an
+embed builder has no case. The baseline depends on the machine: update it on the
+machine that runs the comparison, after checking the numbers.
+'''
+import argparse
+import os
+import platform
+import re
+import sys
+
+from benchmarks.cases import CASES, missing_embed_cases
+from benchmarks.harness import compare, load_json, measure, save_json
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+def parse_args() -> argparse.Namespace:
+  ''' Parse the arguments of the suite. '''
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--filter", default="", help="regular expression of the cases to run")
+  parser.add_argument("--output", help="file where the results are written as JSON")
+  parser.add_argument("--baseline", default=BASELINE_PATH, help="file with the stored results")
+  parser.add_argument("--update-baseline", action="store_true", help="store the results as the baseline")
+  parser.add_argument("--min-time", type=float, default=0.2, help="seconds of each timed run")
+  parser.add_argument("--repeat", type=int, default=5, help="timed runs of each case, the best one is kept")
+  parser.add_argument("--time-tolerance", type=float, default=0.3, help="throughput that can be lost, 0.3 is 30%%")
+  parser.add_argument("--alloc-tolerance", type=float, default=0.1, help="allocations that can be added, 0.1 is 10%%")
+  return parser.parse_args()
+
+def main() -> int:
+  ''' Run the suite, returns the exit code. '''
+  args = parse_args()
+  missing = missing_embed_cases()
+  pattern = re.compile(args.filter)
+  results = {}
+
+  print(f"{'case':<40} {'ops/s':>12} {'ns/op':>12} {'alloc B':>10} {'retained B':>11}")
+  for name, func in CASES.items():
+    if not pattern.search(name):
+      continue
+
+    result = results[name] = measure(func, min_time=args.min_time, repeat=args.repeat)
+    print(
+      f"{name:<40} {result['ops_per_sec']:>12,.0f} {result['ns_per_op']:>12,.0f} "
+      f"{result['alloc_bytes']:>10,} {result['retained_bytes']:>11,}"
+    )
+
+  if args.output:
+    save_json(args.output, {
+      "python": platform.python_version(),
+      "machine": platform.machine(),
+      "results": results,
+    })
+
+  if args.update_baseline:
+    baseline = load_json(args.baseline)
+    save_json(args.baseline, {**baseline, **results})
+    print(f"\nBaseline updated: {args.baseline}")
+    return 0
+
+  baseline = load_json(args.baseline)
+  new_cases = sorted(name for name in results if name not in baseline)
+  regressions = compare(results, baseline, args.time_tolerance, args.alloc_tolerance)
+
+  if new_cases:
+    print("\nCases without baseline: " + ", ".join(new_cases))
+
+  if missing:
+    print("\nEmbed builders without a case: " + ", ".join(missing))
+
+  if regressions:
+    print("\nRegressions:")
+    for regression in regressions:
+      print(f"  {regression}")
+
+  return 1 if regressions or missing else 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,124 @@
+'''
+The cases of the benchmark suite.
+
+The inputs come from the sample responses in `benchmarks/fixtures`, which have
+the shape of the Google Books, tracker.gg, OpenWeather and Spotify responses.
+Each case builds the objects of one whole response, as a command does.
+'''
+import datetime
+import json
+import os
+from types import SimpleNamespace
+from typing import Callable
+
+import discord
+
+from classes.Book import Book
+from classes.rocket_league import Playlist as RLPlaylist, RocketLeaguePlayer
+from classes.spotify import Playlist as SpotifyPlaylist, SpotifyUser, Track
+from classes.Weather import WeatherData
+from embeds import book_embeds, common_embeds, rocket_league_embeds, spotify_embeds
+from services.rocket_league import is_playlist_type, is_ranked_playlist, parse_player_data
+from utils.loop_monitor import BlockingSite
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# The modules with the embed builders, every `create_*_embed` needs a case
+EMBED_MODULES = (book_embeds, common_embeds, rocket_league_embeds, spotify_embeds)
+
+def load_fixture(name: str) -> dict:
+  ''' Read a fixture from `benchmarks/fixtures`. '''
+  with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as file:
+    return json.load(file)
+
+# region inputs
+books_data = load_fixture("google_books.json")
+player_data = load_fixture("tracker_gg.json")
+weather_data = load_fixture("openweather.json")
+tracks_data = load_fixture("spotify_top_tracks.json")
+playlists_data = load_fixture("spotify_playlists.json")
+
+segments = player_data["data"]["segments"]
+ranked_segments = [
+  playlist for playlist in segments if is_ranked_playlist(playlist) and is_playlist_type(playlist)
+]
+lifetime_segment = [playlist for playlist in segments if playlist["metadata"]["name"] == "Lifetime"]
+
+books = [Book.from_dict(item, item["volumeInfo"]) for item in books_data["items"]]
+player = parse_player_data(player_data)
+weather = WeatherData.from_dict(weather_data)
+tracks = [Track.from_dict(track) for track in tracks_data["items"]]
+owner = SpotifyUser.from_dict(playlists_data["user"])
+playlists = [SpotifyPlaylist.from_dict(playlist, owner) for playlist in playlists_data["items"]]
+
+# The attributes of a member read by `create_avatar_embed`
+member = SimpleNamespace(
+  name="ZOMB_-Frank",
+  color=discord.Color.blurple(),
+  top_role="Blade Runner",
+  created_at=datetime.datetime(2019, 10, 1, tzinfo=datetime.timezone.utc),
+  joined_at=datetime.datetime(2021, 3, 14, tzinfo=datetime.timezone.utc),
+  avatar="https://cdn.discordapp.com/avatars/1/avatar.png",
+)
+avatar_url = member.avatar
+
+stats_summary = {
+  "Commands": [f"/command{index} final: p50 0.120s · p99 0.950s (100)" for index in range(10)],
+  "Upstreams": ["www.googleapis.com: p99 0.410s · 120 KiB · 200×50"],
+  "Caches": ["books: 80% hits (40 L1, 0 L2, 10 L1 misses)"],
+  "Event loop": ["lag p50 0.4ms · p99 3.1ms"],
+}
+blocking_sites = [BlockingSite(f"spotipy/client.py:_get in cogs/spotify.py:command{index}") for index in range(10)]
+profile_top = [(f"cogs/utilities.py:function{index}", 100 - index, index) for index in range(15)]
+# endregion
+
+# region cases
+CASES: dict[str, Callable[[], object]] = {
+  # Models
+  "models.book_from_dict": lambda: [Book.from_dict(item, item["volumeInfo"]) for item in books_data["items"]],
+  "models.rl_playlist_from_dict": lambda: [RLPlaylist.from_dict(playlist) for playlist in ranked_segments],
+  "models.rl_player_from_data": lambda: RocketLeaguePlayer.from_data(player_data, player.playlists, lifetime_segment),
+  "models.weather_from_dict": lambda: WeatherData.from_dict(weather_data),
+  "models.track_from_dict": lambda: [Track.from_dict(track) for track in tracks_data["items"]],
+  "models.spotify_playlist_from_dict": lambda: [
+    SpotifyPlaylist.from_dict(playlist, owner) for playlist in playlists_data["items"]
+  ],
+  # Parsers
+  "parsers.rl_parse_player_data": lambda: parse_player_data(player_data),
+  # Embeds
+  "embeds.create_book_embed": lambda: book_embeds.create_book_embed(books[0]),
+  "embeds.create_base_book_embed": book_embeds.create_base_book_embed,
+  "embeds.create_avatar_embed": lambda: common_embeds.create_avatar_embed(member),
+  "embeds.create_eeorigins_embed": common_embeds.create_eeorigins_embed,
+  "embeds.create_weather_embed": lambda: common_embeds.create_weather_embed(weather),
+  "embeds.create_error_embed": lambda: common_embeds.create_error_embed("Error 🤖", "An error occurred."),
+  "embeds.create_commands_embed": lambda: common_embeds.create_commands_embed(avatar_url),
+  "embeds.create_clear_embed": lambda: common_embeds.create_clear_embed(10),
+  "embeds.create_stats_embed": lambda: common_embeds.create_stats_embed(stats_summary),
+  "embeds.create_blocking_embed": lambda: common_embeds.create_blocking_embed(blocking_sites),
+  "embeds.create_profile_embed": lambda: common_embeds.create_profile_embed(10.0, 2000, 350, profile_top),
+  "embeds.create_base_rl_embed": lambda: rocket_league_embeds.create_base_rl_embed(player),
+  "embeds.create_rl_embed": lambda: rocket_league_embeds.create_rl_embed(player.playlists[0], player),
+  "embeds.create_tracks_embed": lambda: spotify_embeds.create_tracks_embed(tracks[:5], page="1/4"),
+  "embeds.create_playlists_embed": lambda: spotify_embeds.create_playlists_embed(playlists[:5], page="1/4"),
+  "embeds.create_playlist_created_embed": lambda: spotify_embeds.create_playlist_created_embed(
+    playlists[0].uri, playlists[0].name, playlists[0].description
+  ),
+}
+# endregion
+
+# region coverage
+def missing_embed_cases() -> list[str]:
+  '''
+  Get the embed builders without a case, so a new builder can't skip the suite.
+
+  return: `list[str]`
+  '''
+  builders = {
+    name
+    for module in EMBED_MODULES
+    for name in vars(module)
+    if name.startswith("create_") and name.endswith("_embed")
+  }
+  return sorted(name for name in builders if f"embeds.{name}" not in CASES)
+# endregion
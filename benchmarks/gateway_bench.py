@@ -0,0 +1,307 @@
+'''
+Memory and throughput of the gateway profiles over a stream of gateway events.
+
+Run it from the root of the repository:
+
+    python -m benchmarks.gateway_bench
+    python -m benchmarks.gateway_bench --guilds 50 --members 5000 --events 200000
+    python -m benchmarks.gateway_bench --stream recorded.jsonl
+
+Each profile of `utils/gateway_profile.py` replays the same stream in its own
+process, through the parsers and the cache of the library, as if it came from
+Discord. The events a profile doesn't subscribe to are dropped first, as
+Discord does: without `presences` there are no presence updates, without
+`members` the guilds come without their member lists, and the member chunks only
+arrive to a profile that requests them. It reports the resident memory added by
+the replay, the seconds and the events per second it took to decode and parse
+the stream, and what ended up in the cache.
+
+The default stream is synthetic: a few large guilds, then a mix of messages,
+presence updates, typing events and member updates. A recorded stream is a JSON
+Lines file with one dispatch per line, `{"t": "MESSAGE_CREATE", "d": {...}}`,
+recorded with every intent so that every profile can filter it.
+'''
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from utils.gateway_profile import PROFILES
+
+def parse_args() -> argparse.Namespace:
+  ''' Parse the arguments of the benchmark. '''
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--profiles", default=",".join(PROFILES), help="profiles to compare, separated by commas")
+  parser.add_argument("--stream", help="JSON Lines file with a recorded stream, default is a synthetic one")
+  parser.add_argument("--write-stream", help="file where the synthetic stream is written as JSON Lines")
+  parser.add_argument("--guilds", type=int, default=20, help="guilds of the synthetic stream")
+  parser.add_argument("--members", type=int, default=2000, help="members of each guild of the synthetic stream")
+  parser.add_argument("--events", type=int, default=100000, help="events after the guilds in the synthetic stream")
+  parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic stream")
+  parser.add_argument("--output", help="file where the results are written as JSON")
+  parser.add_argument("--child", help=argparse.SUPPRESS) # The profile replayed by a child process
+  return parser.parse_args()
+
+# region synthetic stream
+TIMESTAMP = "2024-05-01T12:00:00.000000+00:00"
+BOT_ID = 10**17
+
+def user_payload(user_id: int) -> dict:
+  return {"id": str(user_id), "username": f"user{user_id % 100000}", "discriminator": "0",
+    "global_name": None, "avatar": None, "bot": False}
+
+def member_payload(user_id: int) -> dict:
+  return {"user": user_payload(user_id), "roles": [], "joined_at": TIMESTAMP, "deaf": False,
+    "mute": False, "flags": 0, "nick": None}
+
+def presence_payload(guild_id: int, user_id: int, status: str) -> dict:
+  return {"user": {"id": str(user_id)}, "guild_id": str(guild_id), "status": status,
+    "client_status": {"desktop": status},
+    "activities": [{"name": "Spotify", "type": 2, "id": "spotify:1", "created_at": 0,
+      "details": "Tears in Rain", "state": "Vangelis"}]}
+
+def guild_payload(guild_id: int, member_ids: list[int], channel_ids: list[int]) -> dict:
+  return {
+    "id": str(guild_id), "name": f"guild{guild_id}", "icon": None, "owner_id": str(member_ids[0]),
+    "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0,
+      "color": 0, "hoist": False, "managed": False, "mentionable": False}],
+    "emojis": [], "stickers": [], "features": [], "threads": [], "voice_states": [],
+    "member_count": len(member_ids), "large": len(member_ids) > 250, "unavailable": False,
+    "members": [member_payload(BOT_ID)] + [member_payload(user_id) for user_id in member_ids],
+    "presences": [presence_payload(guild_id, user_id, "online") for user_id in member_ids[::4]],
+    "channels": [
+      {"id": str(channel_id), "type": 0, "name": f"channel{index}", "position": index,
+        "permission_overwrites": [], "nsfw": False, "parent_id": None, "topic": None,
+        "rate_limit_per_user": 0, "last_message_id": None}
+      for index, channel_id in enumerate(channel_ids)
+    ],
+    "verification_level": 0, "default_message_notifications": 0, "explicit_content_filter": 0,
+    "mfa_level": 0, "premium_tier": 0, "system_channel_flags": 0, "preferred_locale": "en-US",
+    "nsfw_level": 0, "premium_progress_bar_enabled": False,
+  }
+
+def synthetic_stream(guilds: int, members: int, events: int, seed: int) -> list[dict]:
+  '''
+  Build a stream: the READY, the guilds, their member chunks and then a mix of
+  messages (40%), presence updates (35%), typing events (15%) and member updates.
+
+  return: `list[dict]`
+      The dispatches, `{"t": ..., "d": ...}`.
+  '''
+  rng = random.Random(seed)
+  guild_members = {}
+  guild_channels = {}
+
+  for index in range(guilds):
+    guild_id = 10**15 + index
+    guild_members[guild_id] = [10**16 + index * members + number for number in range(members)]
+    guild_channels[guild_id] = [guild_id * 100 + number for number in range(10)]
+
+  stream = [{"t": "READY", "d": {
+    "v": 10, "user": {**user_payload(BOT_ID), "bot": True}, "session_id": "replay",
+    "resume_gateway_url": "wss://gateway.discord.gg", "application": {"id": str(BOT_ID), "flags": 0},
+    "guilds": [{"id": str(guild_id), "unavailable": True} for guild_id in guild_members],
+  }}]
+
+  for guild_id, member_ids in guild_members.items():
+    stream.append({"t": "GUILD_CREATE", "d": guild_payload(guild_id, member_ids, guild_channels[guild_id])})
+
+  for guild_id, member_ids in guild_members.items():
+    stream.append({"t": "GUILD_MEMBERS_CHUNK", "d": {
+      "guild_id": str(guild_id), "chunk_index": 0, "chunk_count": 1,
+      "members": [member_payload(user_id) for user_id in member_ids],
+    }})
+
+  guild_ids = list(guild_members)
+  for number in range(events):
+    guild_id = rng.choice(guild_ids)
+    user_id = rng.choice(guild_members[guild_id])
+    channel_id = rng.choice(guild_channels[guild_id])
+    kind = rng.random()
+
+    if kind < 0.40:
+      stream.append({"t": "MESSAGE_CREATE", "d": {
+        "id": str(10**18 + number), "channel_id": str(channel_id), "guild_id": str(guild_id),
+        "author": user_payload(user_id), "member": {"roles": [], "joined_at": TIMESTAMP, "deaf": False,
+          "mute": False, "flags": 0}, "content": "all those moments will be lost in time",
+        "timestamp": TIMESTAMP, "edited_timestamp": None, "tts": False, "mention_everyone": False,
+        "mentions": [], "mention_roles": [], "attachments": [], "embeds": [], "pinned": False,
+        "type": 0, "flags": 0,
+      }})
+    elif kind < 0.75:
+      stream.append({"t": "PRESENCE_UPDATE", "d": presence_payload(guild_id, user_id, rng.choice(("online", "idle", "dnd")))})
+    elif kind < 0.90:
+      stream.append({"t": "TYPING_START", "d": {
+        "channel_id": str(channel_id), "guild_id": str(guild_id), "user_id": str(user_id),
+        "timestamp": 1714564800, "member": member_payload(user_id),
+      }})
+    else:
+      stream.append({"t": "GUILD_MEMBER_UPDATE", "d": {
+        **member_payload(user_id), "guild_id": str(guild_id), "nick": f"nick{number}",
+      }})
+
+  return stream
+
+def write_stream(path: str, stream: list[dict]):
+  ''' Write a stream, one dispatch per line. '''
+  with open(path, "w", encoding="utf-8") as file:
+    for dispatch in stream:
+      file.write(json.dumps(dispatch, separators=(",", ":")) + "\n")
+# endregion
+
+# region filter
+def filter_dispatch(dispatch: dict, profile) -> dict | None:
+  '''
+  Drop what Discord wouldn't send to a profile.
+
+  return: `dict` | `None`
+      The dispatch as the profile receives it, `None` if it doesn't.
+  '''
+  intents = profile.intents
+  event, data = dispatch["t"], dispatch["d"]
+
+  if event == "GUILD_CREATE":
+    if not intents.presences:
+      data["presences"] = []
+    if not intents.members:
+      # Only the bot's own member comes with the guild
+      data["members"] = [member for member in data["members"] if member["user"]["id"] == str(BOT_ID)]
+  elif event == "GUILD_MEMBERS_CHUNK" and not (profile.chunk_guilds_at_startup and intents.members):
+    return None
+  elif event == "PRESENCE_UPDATE" and not intents.presences:
+    return None
+  elif event == "GUILD_MEMBER_UPDATE" and not intents.members:
+    return None
+  elif event == "TYPING_START" and not (intents.guild_typing if "guild_id" in data else intents.dm_typing):
+    return None
+  elif event == "MESSAGE_CREATE":
+    if not (intents.guild_messages if "guild_id" in data else intents.dm_messages):
+      return None
+    if not intents.message_content:
+      data.update(content="", embeds=[], attachments=[])
+
+  return dispatch
+# endregion
+
+# region replay
+def resident_bytes() -> int | None:
+  ''' The resident memory of the process, `None` where it can't be read. '''
+  try:
+    with open("/proc/self/statm", encoding="ascii") as file:
+      return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+  except (OSError, ValueError, AttributeError):
+    return None
+
+async def replay(profile, path: str) -> dict:
+  '''
+  Read a stream file and parse the events a profile receives, with its cache.
+  The events are decoded one at a time, as they arrive from the gateway, so the
+  memory added is the cache of the library.
+
+  return: `dict`
+      The memory, the events per second and the size of the cache.
+  '''
+  import discord
+
+  class ReplayClient(discord.Client):
+    ''' A client that doesn't synchronize the commands, it never logged in. '''
+    async def on_connect(self):
+      pass
+
+  client = ReplayClient(**profile.options())
+  state = client._connection
+  parsers = state.parsers
+  events = 0
+
+  gc.collect()
+  before = resident_bytes()
+  start = time.perf_counter()
+
+  with open(path, encoding="utf-8") as file:
+    for line in file:
+      dispatch = filter_dispatch(json.loads(line), profile)
+
+      if dispatch is not None:
+        parsers[dispatch["t"]](dispatch["d"])
+        events += 1
+
+  seconds = time.perf_counter() - start
+
+  # The READY waits for the guilds and the chunks, nothing else arrives
+  if state._ready_task is not None:
+    state._ready_task.cancel()
+
+  gc.collect()
+  after = resident_bytes()
+
+  return {
+    "profile": profile.name,
+    "events": events,
+    "seconds": round(seconds, 3),
+    "events_per_sec": round(events / seconds, 1),
+    "rss_added_bytes": None if before is None else after - before,
+    "guilds": len(client.guilds),
+    "members": sum(len(guild.members) for guild in client.guilds),
+    "users": len(client.users),
+    "messages": len(client.cached_messages),
+  }
+
+def run_child(name: str, path: str):
+  ''' Replay a stream file with a profile and print the result as JSON. '''
+  from utils.gateway_profile import get_profile
+
+  print(json.dumps(asyncio.run(replay(get_profile(name), path))))
+# endregion
+
+def main() -> int:
+  ''' Run the benchmark, returns the exit code. '''
+  args = parse_args()
+
+  if args.child:
+    run_child(args.child, args.stream)
+    return 0
+
+  path = args.stream
+  if path is None:
+    stream = synthetic_stream(args.guilds, args.members, args.events, args.seed)
+    path = args.write_stream or os.path.join(tempfile.gettempdir(), f"gateway_stream_{os.getpid()}.jsonl")
+    write_stream(path, stream)
+    del stream
+
+  results = []
+  print(f"{'profile':<10} {'events':>9} {'seconds':>8} {'events/s':>11} {'RSS added':>11} {'members':>9} {'users':>8} {'messages':>9}")
+
+  try:
+    for name in (name.strip() for name in args.profiles.split(",") if name.strip()):
+      # A fresh process per profile, so the memory of one doesn't count in the next
+      child = subprocess.run(
+        [sys.executable, "-m", "benchmarks.gateway_bench", "--child", name, "--stream", path],
+        capture_output=True, text=True, check=True
+      )
+      result = json.loads(child.stdout.strip().splitlines()[-1])
+      results.append(result)
+
+      rss = "-" if result["rss_added_bytes"] is None else f"{result['rss_added_bytes'] / 2**20:,.1f} MiB"
+      print(
+        f"{result['profile']:<10} {result['events']:>9,} {result['seconds']:>8.2f} {result['events_per_sec']:>11,.0f} {rss:>11} "
+        f"{result['members']:>9,} {result['users']:>8,} {result['messages']:>9,}"
+      )
+  finally:
+    if args.stream is None and args.write_stream is None:
+      os.remove(path)
+
+  if args.output:
+    with open(args.output, "w", encoding="utf-8") as file:
+      json.dump({"arguments": vars(args), "results": results}, file, indent=2)
+      file.write("\n")
+
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
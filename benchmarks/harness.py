@@ -0,0 +1,149 @@
+'''
+The measuring and the baseline comparison of the benchmark suite.
+
+Each case is a function without arguments. Its throughput is the best of a few
+timed runs, each of them long enough to hide the timer's resolution. Its
+allocations are measured separately with `tracemalloc`, which slows the code
+down, so they never run in the timed loops.
+'''
+import gc
+import json
+import time
+import tracemalloc
+from typing import Callable
+
+
+# region measure
+def measure(func: Callable[[], object], min_time: float = 0.2, repeat: int = 5) -> dict:
+  '''
+  Measure the throughput and the allocations of a case.
+
+  Parameters
+  ----------
+  func: `Callable`
+      The case.
+  min_time: `float`
+      The seconds of each timed run.
+  repeat: `int`
+      The number of timed runs, the best one is kept.
+  return: `dict`
+      `ops_per_sec`, `ns_per_op`, `alloc_bytes` (peak bytes allocated during
+      one call) and `retained_bytes` (bytes still used by the result).
+  '''
+  func() # Warm up the caches of the interpreter and the libraries
+  loops = calibrate(func, min_time)
+  best = min(timed_run(func, loops) for _ in range(repeat))
+
+  alloc_bytes, retained_bytes = allocations(func)
+
+  return {
+    "ops_per_sec": round(loops / best, 1),
+    "ns_per_op": round(best / loops * 1e9, 1),
+    "alloc_bytes": alloc_bytes,
+    "retained_bytes": retained_bytes,
+  }
+
+def calibrate(func: Callable[[], object], min_time: float) -> int:
+  ''' The number of loops that take at least `min_time` seconds. '''
+  loops = 1
+
+  while True:
+    if timed_run(func, loops) >= min_time:
+      return loops
+    loops *= 2
+
+def timed_run(func: Callable[[], object], loops: int) -> float:
+  ''' The seconds of `loops` calls, without the garbage collector. '''
+  gc_was_enabled = gc.isenabled()
+  gc.disable()
+
+  try:
+    start = time.perf_counter()
+    for _ in range(loops):
+      func()
+    return time.perf_counter() - start
+  finally:
+    if gc_was_enabled:
+      gc.enable()
+
+def allocations(func: Callable[[], object]) -> tuple[int, int]:
+  ''' The peak bytes of one call and the bytes its result keeps alive. '''
+  gc.collect()
+  tracemalloc.start()
+
+  try:
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+
+    result = func()
+
+    retained, peak = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+
+  del result
+  return peak - before, max(retained - before, 0)
+# endregion
+
+# region baseline
+def compare(
+  results: dict[str, dict],
+  baseline: dict[str, dict],
+  time_tolerance: float,
+  alloc_tolerance: float
+) -> list[str]:
+  '''
+  Compare the results with a baseline.
+
+  A case regresses when its throughput is lower than the baseline by more than
+  `time_tolerance`, or when it allocates more than the baseline by more than
+  `alloc_tolerance`. The allocations barely depend on the machine, the
+  throughput does, so the throughput tolerance is wider.
+
+  Parameters
+  ----------
+  results: `dict`
+      The results of each case.
+  baseline: `dict`
+      The stored results of each case.
+  time_tolerance: `float`
+      The fraction of throughput that can be lost, 0.3 is 30%.
+  alloc_tolerance: `float`
+      The fraction of allocated bytes that can be added.
+  return: `list[str]`
+      The regressions, empty if there are none.
+  '''
+  regressions = []
+
+  for name, result in results.items():
+    stored = baseline.get(name)
+    if stored is None:
+      continue
+
+    if result["ops_per_sec"] < stored["ops_per_sec"] * (1 - time_tolerance):
+      regressions.append(
+        f"{name}: {result['ops_per_sec']:,.0f} ops/s, baseline {stored['ops_per_sec']:,.0f} ops/s"
+      )
+
+    # A few bytes of difference between interpreters is not a regression
+    if result["alloc_bytes"] > stored["alloc_bytes"] * (1 + alloc_tolerance) + 256:
+      regressions.append(
+        f"{name}: {result['alloc_bytes']:,} bytes allocated, baseline {stored['alloc_bytes']:,} bytes"
+      )
+
+  return regressions
+
+def load_json(path: str) -> dict:
+  ''' Read a JSON file, an empty dict if it doesn't exist. '''
+  try:
+    with open(path, encoding="utf-8") as file:
+      return json.load(file)
+  except FileNotFoundError:
+    return {}
+
+def save_json(path: str, data: dict):
+  ''' Write a JSON file. '''
+  with open(path, "w", encoding="utf-8") as file:
+    json.dump(data, file, indent=2, sort_keys=True)
+    file.write("\n")
+# endregion
@@ -0,0 +1,319 @@
+'''
+End-to-end load test of the `/weather`, `/books` and `/rlrank` commands.
+
+Run it from the root of the repository:
+
+    python -m benchmarks.load_test --concurrency 1,8,32,128 --requests 500
+    python -m benchmarks.load_test --latency 0.2 --error-rate 0.05 --keys 50
+
+It starts local aiohttp servers that stand in for OpenWeather, Google Books and
+tracker.gg (with the fixtures of `benchmarks/fixtures`, a configurable latency
+and error rate), points `WEATHER_ENDPOINT`, `GOOGLE_BOOKS_ENDPOINT` and
+`ROCKET_LEAGUE_ENDPOINT` at them, loads the real Utilities cog and invokes its
+commands with fake interactions. For each concurrency level it reports the
+commands per second and the p50/p99 latency from the invocation to the final
+followup. Nothing is sent to Discord.
+
+The caches are cleared between the levels. With `--keys` smaller than
+`--requests` the same cities, queries and nametags repeat, so the caches and the
+request coalescing take part.
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from aiohttp import web
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+COMMANDS = ("weather", "books", "rlrank")
+
+def parse_args() -> argparse.Namespace:
+  ''' Parse the arguments of the load test. '''
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--commands", default=",".join(COMMANDS), help="commands to run, separated by commas")
+  parser.add_argument("--concurrency", default="1,8,32,128", help="concurrency levels, separated by commas")
+  parser.add_argument("--requests", type=int, default=500, help="commands of each level")
+  parser.add_argument("--keys", type=int, default=0, help="distinct arguments of each command, 0 for all distinct")
+  parser.add_argument("--latency", type=float, default=0.05, help="mean seconds of the upstream responses")
+  parser.add_argument("--jitter", type=float, default=0.5, help="fraction of the latency added or removed at random")
+  parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream responses that are a 500")
+  parser.add_argument("--port", type=int, default=8950, help="port of the upstream stand-ins")
+  parser.add_argument("--seed", type=int, default=0, help="seed of the latency and the errors")
+  parser.add_argument("--output", help="file where the results are written as JSON")
+  return parser.parse_args()
+
+# region upstreams
+class Upstreams:
+  '''
+  The local stand-ins of the upstream APIs.
+
+  Parameters
+  ----------
+  latency: `float`
+      The mean seconds of a response.
+  jitter: `float`
+      The fraction of the latency added or removed at random.
+  error_rate: `float`
+      The fraction of responses that are a 500.
+  seed: `int`
+      The seed of the latency and the errors.
+  '''
+  def __init__(self, latency: float, jitter: float, error_rate: float, seed: int):
+    self.latency = latency
+    self.jitter = jitter
+    self.error_rate = error_rate
+    self.random = random.Random(seed)
+    self.requests = 0
+    self.errors = 0
+    self.fixtures = {
+      name: load_fixture(f"{name}.json") for name in ("openweather", "google_books", "tracker_gg")
+    }
+    self._runner: web.AppRunner = None
+
+  async def _respond(self, fixture: str) -> web.Response:
+    self.requests += 1
+    await asyncio.sleep(self.latency * (1 + self.random.uniform(-self.jitter, self.jitter)))
+
+    if self.random.random() < self.error_rate:
+      self.errors += 1
+      return web.json_response({"error": "stand-in failure"}, status=500)
+
+    return web.json_response(self.fixtures[fixture])
+
+  async def weather(self, request: web.Request) -> web.Response:
+    ''' OpenWeather's current weather. '''
+    return await self._respond("openweather")
+
+  async def books(self, request: web.Request) -> web.Response:
+    ''' Google Books' volumes search. '''
+    return await self._respond("google_books")
+
+  async def rocket_league(self, request: web.Request) -> web.Response:
+    ''' tracker.gg's Rocket League profile. '''
+    return await self._respond("tracker_gg")
+
+  async def start(self, port: int):
+    ''' Start listening on the local interface. '''
+    app = web.Application()
+    app.router.add_get("/weather", self.weather)
+    app.router.add_get("/books", self.books)
+    app.router.add_get("/rl/{nametag}", self.rocket_league)
+
+    self._runner = web.AppRunner(app, access_log=None)
+    await self._runner.setup()
+    await web.TCPSite(self._runner, "127.0.0.1", port).start()
+
+  async def stop(self):
+    ''' Stop listening. '''
+    await self._runner.cleanup()
+
+def load_fixture(name: str) -> dict:
+  ''' Read a fixture from `benchmarks/fixtures`. '''
+  with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as file:
+    return json.load(file)
+
+def point_endpoints(port: int):
+  '''
+  Point the endpoints of the services at the stand-ins. It must run before
+  `utils.apikeys` is imported, which reads them once.
+  '''
+  base = f"http://127.0.0.1:{port}"
+  os.environ["WEATHER_ENDPOINT"] = f"{base}/weather"
+  os.environ["GOOGLE_BOOKS_ENDPOINT"] = f"{base}/books?q="
+  os.environ["ROCKET_LEAGUE_ENDPOINT"] = f"{base}/rl/"
+  # The stand-ins ignore the token, but aiohttp rejects a missing query parameter
+  os.environ.setdefault("WEATHER_TOKEN", "load-test")
+  # Isolated from the shared cache, the exporter and the debug logs of a real bot
+  os.environ["REDIS_URL"] = ""
+  os.environ["METRICS_PORT"] = "0"
+  os.environ.setdefault("LOG_LEVEL", "WARNING")
+# endregion
+
+# region fake interactions
+class FakeResponse:
+  ''' The `interaction.response` of a fake interaction. '''
+  def __init__(self, interaction: "FakeInteraction"):
+    self.interaction = interaction
+    self._done = False
+
+  def is_done(self) -> bool:
+    return self._done
+
+  async def defer(self, *args, **kwargs):
+    self._done = True
+    self.interaction.deferred_at = time.perf_counter()
+
+  async def send_message(self, *args, **kwargs):
+    self._done = True
+    self.interaction.finish(kwargs.get("embed"))
+
+class FakeFollowup:
+  ''' The `interaction.followup` of a fake interaction. '''
+  def __init__(self, interaction: "FakeInteraction"):
+    self.interaction = interaction
+
+  async def send(self, *args, **kwargs):
+    self.interaction.finish(kwargs.get("embed"))
+
+class FakeInteraction:
+  '''
+  The attributes of a `nextcord.Interaction` used by the Utilities commands.
+  It records when the command deferred and when it sent its final message.
+  '''
+  def __init__(self, user_id: int, command_name: str):
+    self.user = SimpleNamespace(id=user_id, name=f"load-test-{user_id}", mention=f"<@{user_id}>")
+    self.guild_id = None
+    self.command_name = command_name
+    self.response = FakeResponse(self)
+    self.followup = FakeFollowup(self)
+    self.started_at = self.received_at = time.perf_counter()
+    self.deferred_at: float | None = None
+    self.finished_at: float | None = None
+    self.is_error = False
+
+  async def send(self, *args, **kwargs):
+    if self.response.is_done():
+      await self.followup.send(*args, **kwargs)
+    else:
+      await self.response.send_message(*args, **kwargs)
+
+  def finish(self, embed):
+    self.finished_at = time.perf_counter()
+    # The commands answer the failures with `create_error_embed`, which is red
+    self.is_error = embed is not None and embed.color is not None and embed.color.value == 0xE74C3C
+# endregion
+
+# region load
+def make_arguments(command: str, index: int) -> dict:
+  ''' The arguments of a command, distinct for each index. '''
+  if command == "weather":
+    return {"city": f"Ciudad {index}"}
+  if command == "books":
+    return {"query": f"ciencia ficcion {index}"}
+  return {"nametag": f"player-{index}"}
+
+async def run_level(cog, commands: list[str], concurrency: int, requests: int, keys: int) -> dict:
+  '''
+  Run `requests` commands with `concurrency` of them at the same time.
+
+  return: `dict`
+      The commands per second, the latency quantiles, the share of commands
+      answered without deferring and the errors.
+  '''
+  latencies = []
+  errors = 0
+  fast = 0
+  next_index = 0
+
+  async def worker():
+    nonlocal errors, fast, next_index
+
+    while next_index < requests:
+      index = next_index
+      next_index += 1
+
+      command = commands[index % len(commands)]
+      interaction = FakeInteraction(user_id=index, command_name=command)
+      arguments = make_arguments(command, index % keys if keys else index)
+
+      try:
+        await getattr(cog, command).invoke_callback(interaction, **arguments)
+      except Exception:
+        errors += 1
+        continue
+
+      if interaction.finished_at is None or interaction.is_error:
+        errors += 1
+      else:
+        latencies.append(interaction.finished_at - interaction.started_at)
+        fast += interaction.deferred_at is None
+
+  start = time.perf_counter()
+  await asyncio.gather(*(worker() for _ in range(concurrency)))
+  seconds = time.perf_counter() - start
+
+  latencies.sort()
+  return {
+    "concurrency": concurrency,
+    "requests": requests,
+    "commands_per_sec": round(requests / seconds, 1),
+    "p50_ms": round(quantile(latencies, 0.5) * 1000, 2),
+    "p99_ms": round(quantile(latencies, 0.99) * 1000, 2),
+    "fast_ratio": round(fast / requests, 3),
+    "errors": errors,
+  }
+
+def quantile(values: list[float], q: float) -> float:
+  ''' The quantile of sorted values, 0 if there are none. '''
+  if not values:
+    return 0.0
+  return values[min(int(q * len(values)), len(values) - 1)]
+
+async def clear_caches():
+  ''' Clear the caches of the services, so every level starts cold. '''
+  from services.books import books_cache
+  from services.rocket_league import player_cache
+  from services.weather import weather_cache
+
+  for cache in (books_cache, player_cache, weather_cache):
+    cache.local.clear()
+# endregion
+
+async def run(args: argparse.Namespace) -> list[dict]:
+  ''' Start the stand-ins, load the cog and run every level. '''
+  # Imported after the endpoints were pointed at the stand-ins
+  import discord
+  from discord.ext import commands as discord_commands
+
+  from utils.http_client import http_client
+
+  upstreams = Upstreams(args.latency, args.jitter, args.error_rate, args.seed)
+  await upstreams.start(args.port)
+
+  bot = discord_commands.Bot(intents=discord.Intents.none())
+  bot.load_extension("cogs.utilities")
+  cog = bot.get_cog("Utilities")
+
+  commands = [command.strip() for command in args.commands.split(",") if command.strip()]
+  results = []
+
+  print(f"{'concurrency':>11} {'commands/s':>11} {'p50 ms':>9} {'p99 ms':>9} {'fast':>6} {'errors':>7}")
+
+  try:
+    for concurrency in (int(level) for level in args.concurrency.split(",")):
+      await clear_caches()
+      result = await run_level(cog, commands, concurrency, args.requests, args.keys)
+      results.append(result)
+      print(
+        f"{result['concurrency']:>11} {result['commands_per_sec']:>11,.1f} "
+        f"{result['p50_ms']:>9,.1f} {result['p99_ms']:>9,.1f} {result['fast_ratio']:>6.0%} {result['errors']:>7}"
+      )
+  finally:
+    await http_client.close()
+    await bot.close()
+    await upstreams.stop()
+
+  print(f"\nUpstream requests: {upstreams.requests}, failed on purpose: {upstreams.errors}")
+  return results
+
+def main() -> int:
+  ''' Run the load test, returns the exit code. '''
+  args = parse_args()
+  point_endpoints(args.port)
+
+  results = asyncio.run(run(args))
+
+  if args.output:
+    with open(args.output, "w", encoding="utf-8") as file:
+      json.dump({"arguments": vars(args), "results": results}, file, indent=2)
+      file.write("\n")
+
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,402 @@
+'''
+This module is the entry point for the bot on several processes. It starts the
+workers, each one a `main.py` with a range of the shards, restarts them when
+they exit or stop sending heartbeats and serves their health.
+
+    python cluster.py --workers 4 [--shards 16]
+
+The total of shards is `--shards`, `SHARD_COUNT` or Discord's recommendation.
+The workers talk on the Redis channel when `REDIS_URL` is a Redis server,
+otherwise through the hub of this process. Each worker logs to its own file
+(`discord.worker0.log`, ...) and serves its metrics on the next port after
+`METRICS_PORT`.
+'''
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+from utils.apikeys import BOT_TOKEN, METRICS_PORT, SHARD_COUNT
+from utils.cluster import ClusterHub, create_bus, summarize_worker
+from utils.const import (
+  CLUSTER_HEALTH_LOG_INTERVAL,
+  CLUSTER_HEALTH_PORT,
+  CLUSTER_HEARTBEAT_INTERVAL,
+  CLUSTER_HEARTBEAT_TIMEOUT,
+  CLUSTER_HOST,
+  CLUSTER_HUB_PORT,
+  CLUSTER_MAX_RESTART_DELAY,
+  CLUSTER_RESTART_DELAY,
+  CLUSTER_STABLE_SECONDS,
+  CLUSTER_STARTUP_GRACE,
+  CLUSTER_STOP_TIMEOUT,
+)
+from utils.logger_config import logger
+
+GATEWAY_BOT_URL = "https://discord.com/api/v10/gateway/bot"
+
+async def recommended_shards(token: str) -> int:
+  '''
+  Get the shards Discord recommends for the bot.
+  This is an asynchronous function and should be called with 'await'.
+  '''
+  async with aiohttp.ClientSession() as session:
+    async with session.get(GATEWAY_BOT_URL, headers={"Authorization": f"Bot {token}"}) as response:
+      response.raise_for_status()
+      return (await response.json())["shards"]
+
+def split_shards(shard_count: int, workers: int) -> list[range]:
+  '''
+  Split the shards in contiguous ranges, as even as possible.
+
+  Parameters
+  ----------
+  shard_count: `int`
+      The total of shards.
+  workers: `int`
+      The number of workers, at most one per shard.
+  return: `list[range]`
+      The shards of each worker.
+  '''
+  workers = max(1, min(workers, shard_count))
+  size, extra = divmod(shard_count, workers)
+  ranges, first = [], 0
+
+  for index in range(workers):
+    last = first + size + (index < extra)
+    ranges.append(range(first, last))
+    first = last
+
+  return ranges
+
+
+class Worker:
+  '''
+  A bot process with a range of the shards.
+
+  Parameters
+  ----------
+  index: `int`
+      The id of the worker.
+  shards: `range`
+      Its shards.
+  '''
+  def __init__(self, index: int, shards: range):
+    self.index = index
+    self.id = str(index)
+    self.shards = shards
+    self.process: asyncio.subprocess.Process = None
+    self.started_at = 0.0
+    self.heartbeat_at = 0.0
+    self.stats: dict = {}
+    self.restarts = 0
+    self.failures = 0
+
+  def environment(self, shard_count: int, hub: str) -> dict[str, str]:
+    '''
+    The environment of the process: the variables of the launcher and its shards.
+    '''
+    return os.environ | {
+      "AUTO_SHARD": "true",
+      "SHARD_COUNT": str(shard_count),
+      "SHARD_IDS": f"{self.shards.start}-{self.shards.stop - 1}",
+      "CLUSTER_WORKER_ID": self.id,
+      "CLUSTER_HUB": hub,
+      "METRICS_PORT": str(METRICS_PORT + 1 + self.index if METRICS_PORT else 0),
+      "LOG_FILE": f"discord.worker{self.index}.log",
+    }
+
+  @property
+  def state(self) -> str:
+    ''' `stopped`, `starting` until the first heartbeat, `running` or `stale`. '''
+    if self.process is None or self.process.returncode is not None:
+      return "stopped"
+    if not self.heartbeat_at:
+      return "starting"
+    if time.monotonic() - self.heartbeat_at > CLUSTER_HEARTBEAT_TIMEOUT:
+      return "stale"
+    return "running"
+
+  def unresponsive(self, bus_up_since: float | None) -> bool:
+    '''
+    True if the worker stopped sending heartbeats, or never sent one in its
+    grace period, while the bus was up. The heartbeats missed while the bus was
+    down say nothing about the worker, so its deadline counts from when the bus
+    came back.
+
+    Parameters
+    ----------
+    bus_up_since: `float` | `None`
+        The `time.monotonic` when the bus connected, `None` if it is down.
+    '''
+    if bus_up_since is None:
+      return False
+
+    if not self.heartbeat_at:
+      since, timeout = max(self.started_at, bus_up_since), CLUSTER_STARTUP_GRACE
+    else:
+      since, timeout = max(self.heartbeat_at, bus_up_since), CLUSTER_HEARTBEAT_TIMEOUT
+
+    return time.monotonic() - since > timeout
+
+  def health(self) -> dict:
+    ''' The health of the worker, for `/health`. '''
+    now = time.monotonic()
+    return {
+      "worker": self.id,
+      "pid": self.process.pid if self.process else None,
+      "shards": [self.shards.start, self.shards.stop - 1],
+      "state": self.state,
+      "restarts": self.restarts,
+      "uptime": round(now - self.started_at, 1) if self.state != "stopped" else 0,
+      "heartbeat_age": round(now - self.heartbeat_at, 1) if self.heartbeat_at else None,
+      "stats": self.stats,
+    }
+
+
+class ClusterLauncher:
+  '''
+  Starts and supervises the workers, and aggregates their heartbeats.
+
+  Parameters
+  ----------
+  ranges: `list[range]`
+      The shards of each worker.
+  shard_count: `int`
+      The total of shards.
+  script: `str`
+      The entry point of a worker.
+  '''
+  def __init__(self, ranges: list[range], shard_count: int, script: str = "main.py"):
+    self.workers = {str(index): Worker(index, shards) for index, shards in enumerate(ranges)}
+    self.shard_count = shard_count
+    self.script = script
+    self.hub = ClusterHub(self.on_message)
+    self.hub_address = f"{CLUSTER_HOST}:{CLUSTER_HUB_PORT}"
+    self.bus = create_bus("launcher", "")
+    self._runner: web.AppRunner = None
+    self._stopping = False
+
+  @property
+  def bus_up_since(self) -> float | None:
+    ''' When the channel of the workers came up, `None` while it is down. '''
+    return self.bus.up_since if self.bus is not None else self.hub.up_since
+
+  def on_message(self, message: dict):
+    '''
+    Keep the heartbeats of the workers.
+    '''
+    worker = self.workers.get(message.get("worker"))
+
+    if worker is not None and message["topic"] == "stats":
+      worker.heartbeat_at = time.monotonic()
+      worker.stats = message["data"]
+
+  # region supervision
+  async def spawn(self, worker: Worker):
+    '''
+    Start the process of a worker.
+    This is an asynchronous function and should be called with 'await'.
+    '''
+    worker.process = await asyncio.create_subprocess_exec(
+      sys.executable, self.script,
+      env=worker.environment(self.shard_count, self.hub_address),
+    )
+    worker.started_at = time.monotonic()
+    worker.heartbeat_at = 0.0
+    worker.stats = {}
+    logger.info(
+      "Worker %s started (pid %s): shards %s-%s",
+      worker.id, worker.process.pid, worker.shards.start, worker.shards.stop - 1
+    )
+
+  async def supervise(self, worker: Worker):
+    '''
+    Run a worker until the launcher stops, restarting it when it exits or stops
+    sending heartbeats while the bus is up, an outage of the bus doesn't restart
+    the workers. The wait before a restart doubles with each failure in a
+    row, and is reset once the worker has run for a while.
+    This is an asynchronous function and should be called with 'await'.
+    '''
+    while not self._stopping:
+      await self.spawn(worker)
+
+      while True:
+        try:
+          await asyncio.wait_for(worker.process.wait(), CLUSTER_HEARTBEAT_INTERVAL)
+          break
+        except asyncio.TimeoutError:
+          if worker.unresponsive(self.bus_up_since):
+            logger.error("Worker %s is unresponsive, killing it", worker.id)
+            worker.process.kill()
+
+      if self._stopping:
+        return
+
+      uptime = time.monotonic() - worker.started_at
+      worker.failures = 0 if uptime > CLUSTER_STABLE_SECONDS else worker.failures + 1
+      delay = min(CLUSTER_RESTART_DELAY * 2 ** max(worker.failures - 1, 0), CLUSTER_MAX_RESTART_DELAY)
+      worker.restarts += 1
+
+      logger.warning(
+        "Worker %s exited with %s after %.0fs, restarting in %.0fs",
+        worker.id, worker.process.returncode, uptime, delay
+      )
+      await asyncio.sleep(delay)
+
+  async def stop_workers(self):
+    '''
+    Ask the workers to close, and kill the ones that don't in time.
+    This is an asynchronous function and should be called with 'await'.
+    '''
+    self._stopping = True
+    running = [
+      worker.process for worker in self.workers.values()
+      if worker.process is not None and worker.process.returncode is None
+    ]
+
+    for process in running:
+      process.terminate()
+
+    try:
+      await asyncio.wait_for(asyncio.gather(*(process.wait() for process in running)), CLUSTER_STOP_TIMEOUT)
+    except asyncio.TimeoutError:
+      for process in running:
+        if process.returncode is None:
+          process.kill()
+  # endregion
+
+  # region health
+  def health(self) -> dict:
+    '''
+    The health of every worker and the totals of the cluster.
+
+    return: `dict`
+    '''
+    workers = [worker.health() for worker in self.workers.values()]
+    reporting = [worker["stats"] for worker in workers if worker["stats"]]
+    return {
+      "healthy": all(worker["state"] == "running" for worker in workers),
+      "shard_count": self.shard_count,
+      "workers": workers,
+      "totals": {
+        "guilds": sum(stats["guilds"] for stats in reporting),
+        "users": sum(stats["users"] for stats in reporting),
+        "event_rate": sum(shard["event_rate"] for stats in reporting for shard in stats["shards"]),
+        "restarts": sum(worker["restarts"] for worker in workers),
+      },
+    }
+
+  async def handle_health(self, request: web.Request) -> web.Response:
+    '''
+    Serve the health of the cluster, with a 503 if a worker isn't running.
+    '''
+    health = self.health()
+    return web.json_response(health, status=200 if health["healthy"] else 503)
+
+  async def log_health(self):
+    '''
+    Log a summary of the cluster at a fixed interval.
+    This is an asynchronous function and should be called with 'await'.
+    '''
+    while True:
+      await asyncio.sleep(CLUSTER_HEALTH_LOG_INTERVAL)
+
+      lines = [
+        summarize_worker(worker.id, worker.stats) if worker.stats else f"worker {worker.id}: {worker.state}"
+        for worker in self.workers.values()
+      ]
+      logger.info("Cluster health:\n%s", "\n".join(lines))
+  # endregion
+
+  # region run
+  async def start(self):
+    '''
+    Start the channel of the workers and the health endpoint.
+    This is an asynchronous function and should be called with 'await'.
+    '''
+    if self.bus is not None:
+      self.bus.subscribe("stats", self.on_message)
+      await self.bus.start()
+    else:
+      await self.hub.start(CLUSTER_HOST, CLUSTER_HUB_PORT)
+      logger.info("Cluster hub on %s", self.hub_address)
+
+    if CLUSTER_HEALTH_PORT:
+      app = web.Application()
+      app.router.add_get("/health", self.handle_health)
+      self._runner = web.AppRunner(app, access_log=None)
+      await self._runner.setup()
+      await web.TCPSite(self._runner, CLUSTER_HOST, CLUSTER_HEALTH_PORT).start()
+      logger.info("Cluster health served on http://%s:%s/health", CLUSTER_HOST, CLUSTER_HEALTH_PORT)
+
+  async def run(self):
+    '''
+    Run the cluster until it is cancelled, then stop the workers.
+    This is an asynchronous function and should be called with 'await'.
+    '''
+    await self.start()
+    tasks = [asyncio.create_task(self.supervise(worker)) for worker in self.workers.values()]
+    tasks.append(asyncio.create_task(self.log_health()))
+
+    try:
+      await asyncio.gather(*tasks)
+    finally:
+      for task in tasks:
+        task.cancel()
+
+      await self.stop_workers()
+      logger.info("Cluster stopped: %s", json.dumps(self.health()["totals"]))
+      await self.close()
+
+  async def close(self):
+    '''
+    Stop the channel and the health endpoint.
+    This is an asynchronous function and should be called with 'await'.
+    '''
+    if self.bus is not None:
+      await self.bus.close()
+    await self.hub.close()
+
+    if self._runner is not None:
+      await self._runner.cleanup()
+      self._runner = None
+  # endregion
+
+async def launch(workers: int, shards: int | None, script: str):
+  '''
+  Split the shards between the workers and run them.
+  This is an asynchronous function and should be called with 'await'.
+  '''
+  shard_count = shards or SHARD_COUNT or await recommended_shards(BOT_TOKEN)
+  ranges = split_shards(shard_count, workers)
+  logger.info("Cluster: %s shards on %s workers", shard_count, len(ranges))
+
+  # Stop the workers on SIGTERM too, like on an interruption
+  asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+  await ClusterLauncher(ranges, shard_count, script).run()
+
+def main():
+  '''
+  Parse the arguments and run the cluster until it is interrupted.
+  '''
+  parser = argparse.ArgumentParser(description="Run the bot on several processes.")
+  parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of processes")
+  parser.add_argument("--shards", type=int, default=None, help="total of shards, default SHARD_COUNT or Discord's")
+  parser.add_argument("--script", default="main.py", help="entry point of a worker")
+  args = parser.parse_args()
+
+  try:
+    asyncio.run(launch(args.workers, args.shards, args.script))
+  except KeyboardInterrupt:
+    pass
+
+
+if __name__ == "__main__":
+  main()
@@ -1,12 +1,24 @@
 '''
 This module contains the commands that only the administrator can use.
 '''
+import io
+
 import discord
 from discord.ext import commands
-from discord import Interaction
+from discord import Interaction, SlashOption
 
-from embeds.common_embeds import create_clear_embed
+from embeds.common_embeds import (
+  create_blocking_embed,
+  create_clear_embed,
+  create_profile_embed,
+  create_stats_embed,
+)
 from utils.apikeys import TEST_SERVER_ID
+from utils.cluster import cluster_node
+from utils.const import PROFILE_MAX_SECONDS, PROFILE_TOP_FUNCTIONS, WATCHDOG_TOP_SITES
+from utils.loop_monitor import blocking_watchdog
+from utils.profiler import profiler
+from utils.metrics import summarize
 
 from utils.logger_config import logger
 
@@ -41,13 +53,89 @@ class Admin(commands.Cog):
     try:
       await channel.purge(limit=amount)
       await channel.send(embed=embed, delete_after=5)
-      logger.info(f"{amount} messages were deleted!")
+      logger.info("%s messages were deleted!", amount)
     except Exception as e:
-      logger.error(f"Failed to clear messages. Error: {e}")
+      logger.error("Failed to clear messages. Error: %s", e)
       await channel.send(f"Failed to clear messages. Error: {e}", delete_after=5)
       return
   # endregion
 
+  # region stats only administrator
+  @discord.slash_command(
+    name="stats",
+    description="Shows the latency, upstream, cache and cluster metrics of the bot",
+    guild_ids=TEST_SERVER_ID,
+    default_member_permissions=discord.Permissions(administrator=True),
+    dm_permission=False
+  )
+  async def stats(self, interaction: Interaction):
+    '''Shows a summary of the metrics of the bot, only to the administrator.
+    '''
+    embed = create_stats_embed(summary=summarize() | cluster_node.summarize())
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+  # endregion
+
+  # region blocking calls only administrator
+  @discord.slash_command(
+    name="blocking",
+    description="Shows the calls that blocked the bot the longest",
+    guild_ids=TEST_SERVER_ID,
+    default_member_permissions=discord.Permissions(administrator=True),
+    dm_permission=False
+  )
+  async def blocking(self, interaction: Interaction):
+    '''Shows the top blocking sites caught by the event loop watchdog, only to the administrator.
+    '''
+    embed = create_blocking_embed(sites=blocking_watchdog.top(WATCHDOG_TOP_SITES))
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+  # endregion
+
+  # region profile only administrator
+  @discord.slash_command(
+    name="profile",
+    description="Profiles the bot for some seconds",
+    guild_ids=TEST_SERVER_ID,
+    default_member_permissions=discord.Permissions(administrator=True),
+    dm_permission=False
+  )
+  async def profile(
+    self,
+    interaction: Interaction,
+    seconds: int = SlashOption(
+      description="The seconds to profile",
+      min_value=1,
+      max_value=PROFILE_MAX_SECONDS,
+      default=10
+    )
+  ):
+    '''Samples the stacks of the bot while it keeps running, and sends the functions
+    with the most time and the collapsed stacks for a flamegraph.
+
+    Parameters
+    ----------
+    seconds : `int`
+        The seconds to profile.
+    '''
+    if profiler.running:
+      await interaction.response.send_message("A profile is already running.", ephemeral=True)
+      return
+
+    await interaction.response.defer(ephemeral=True)
+    logger.info("Profiling the bot for %s seconds...", seconds)
+
+    result = await profiler.profile(seconds)
+
+    embed = create_profile_embed(
+      seconds=result.seconds,
+      samples=result.samples,
+      busy_samples=result.busy_samples,
+      top=result.top(PROFILE_TOP_FUNCTIONS)
+    )
+    file = discord.File(io.BytesIO(result.collapsed().encode("utf-8")), filename="profile.collapsed")
+
+    await interaction.followup.send(embed=embed, file=file, ephemeral=True)
+  # endregion
+
 def setup(bot):
   '''
   Add the Admin cog to the bot.
@@ -3,9 +3,14 @@ This file contains the code for the reactions cog.
 '''
 import discord
 from discord.ext import commands
+from discord import Interaction
 
-from utils.const import WORDS_TO_REACT
+from utils.apikeys import TEST_SERVER_ID
+from utils.log_context import sampled
 from utils.logger_config import logger
+from utils.metrics import registry
+from utils.reaction_dispatcher import ReactionDispatcher
+from utils.trigger_store import TriggerStore
 
 class Reactions (commands.Cog):
     '''
@@ -13,25 +18,106 @@ class Reactions (commands.Cog):
     '''
     def __init__ (self, bot):
         self.bot = bot
+        self.trigger_store = TriggerStore()
+        self.dispatcher = ReactionDispatcher()
+        registry.add_collector("reactions", self.dispatcher.collect_metrics)
+
+    def cog_unload(self):
+        '''
+        Cancel the reactions being sent when the cog is unloaded.
+        '''
+        registry.remove_collector("reactions")
+        self.dispatcher.close()
 
     # region Commands
     @commands.Cog.listener()
     async def on_message (self, message: discord.Message):
         '''
-        This function is called whenever a message is sent in a channel 
+        This function is called whenever a message is sent in a channel
         that the bot has access to.
         '''
         if message.author == self.bot.user:
             return
 
-        # Baldwin IV of Jerusalem Reaction
-        if message.content.lower() in [word for word in WORDS_TO_REACT]:
-            await message.add_reaction('✋🏻')
-            await message.add_reaction('😔')
-            await message.channel.send("https://media1.tenor.com/m/mBywuwFuhvMAAAAd/king-baldwin.gif")
-            logger.info(f"Added reactions to message from {message.author.name}")
+        guild_id = message.guild.id if message.guild else None
+        trigger = self.trigger_store.get_matcher(guild_id).match(message.content)
+
+        # Baldwin IV of Jerusalem Reaction, within the channel and user cooldowns
+        # The matches are frequent, only a sample of them is logged (`LOG_SAMPLE_RATES`)
+        if trigger is not None and self.dispatcher.dispatch(message) and sampled("on_message"):
+            logger.info(
+                "Added reactions to message from %s", message.author.name,
+                extra={"trigger": trigger, "channel_id": message.channel.id}
+            )
         # endregion
 
+    # region triggers
+    @discord.slash_command(
+        name="triggers",
+        description="Manage the words the bot reacts to",
+        guild_ids=TEST_SERVER_ID,
+        default_member_permissions=discord.Permissions(administrator=True),
+        dm_permission=False
+    )
+    async def triggers(self, interaction: Interaction):
+        '''
+        The group of the trigger commands.
+        '''
+
+    @triggers.subcommand(name="add", description="Add a word the bot reacts to")
+    async def triggers_add(self, interaction: Interaction, word: str, substring: bool = False):
+        '''
+        Add a trigger to the guild. It applies to the next message.
+
+        Parameters
+        ----------
+        word: `str`
+            The word the bot reacts to.
+        substring: `bool`
+            True to react when the word is anywhere in the message,
+            False to react only when it is the whole message. Default is False.
+        '''
+        added = await self.trigger_store.add_trigger(interaction.guild_id, word, substring)
+
+        if not added:
+            await interaction.send(f"`{word}` is already a trigger.", ephemeral=True)
+            return
+
+        logger.info("Trigger %s added to guild %s", word, interaction.guild_id)
+        await interaction.send(f"`{word}` added.", ephemeral=True)
+
+    @triggers.subcommand(name="remove", description="Remove a word the bot reacts to")
+    async def triggers_remove(self, interaction: Interaction, word: str):
+        '''
+        Remove a trigger from the guild. It applies to the next message.
+
+        Parameters
+        ----------
+        word: `str`
+            The word to remove.
+        '''
+        removed = await self.trigger_store.remove_trigger(interaction.guild_id, word)
+
+        if not removed:
+            await interaction.send(f"`{word}` is not a trigger.", ephemeral=True)
+            return
+
+        logger.info("Trigger %s removed from guild %s", word, interaction.guild_id)
+        await interaction.send(f"`{word}` removed.", ephemeral=True)
+
+    @triggers.subcommand(name="list", description="List the words the bot reacts to")
+    async def triggers_list(self, interaction: Interaction):
+        '''
+        List the triggers of the guild.
+        '''
+        triggers = self.trigger_store.get_triggers(interaction.guild_id)
+
+        exact = ", ".join(f"`{word}`" for word in triggers["exact"]) or " - "
+        substring = ", ".join(f"`{word}`" for word in triggers["substring"]) or " - "
+
+        await interaction.send(f"Exact: {exact}\nSubstring: {substring}", ephemeral=True)
+    # endregion
+
 def setup (bot):
     '''
     This function sets up the reactions cog.
@@ -1,18 +1,19 @@
 '''
 This cog contains a commands to interact with the Spotify API.
 '''
+import functools
+
 import discord
 from discord.ext import commands
 from discord import Interaction
 
 from utils.apikeys import TEST_SERVER_ID, YOUR_USER_ID
-from embeds.spotify_embeds import (
-  create_playlist_created_embed,
-  create_playlists_embed,
-)
-from services.spotifyclient import SpotifyClient
+from embeds.spotify_embeds import create_playlist_created_embed
+from services.async_spotifyclient import AsyncSpotifyClient
 from utils.logger_config import logger
 from ui.spotify_pagination_view import SpotifyPaginationView
+from ui.spotify_page_sources import SpotifyOffsetPageSource
+from utils.const import SPOTIFY_MAX_PAGE_SIZE
 
 # region is authorized user
 # this can be simplified by using the `commands.check` decorator directly
@@ -38,7 +39,13 @@ class Spotify(commands.Cog):
   '''
   def __init__(self, bot):
     self.bot = bot
-    self.spotify_client = SpotifyClient()
+    self.spotify_client = AsyncSpotifyClient()
+
+  def cog_unload(self):
+    '''
+    Stop the Spotify thread pool when the cog is unloaded.
+    '''
+    self.spotify_client.close()
 
   # region top_tracks
   @discord.slash_command(
@@ -59,7 +66,7 @@ class Spotify(commands.Cog):
     logger.info("Getting top tracks...")
     await interaction.response.defer()
 
-    top_tracks = self.spotify_client.get_user_top_tracks(limit)
+    top_tracks = await self.spotify_client.get_user_top_tracks(limit)
 
     if not top_tracks:
       await interaction.followup.send("No top tracks found.", ephemeral=True)
@@ -75,7 +82,7 @@ class Spotify(commands.Cog):
       logger.info("Top tracks sent.")
     except Exception as e:
       await interaction.followup.send("Failed to get top tracks.", ephemeral=True)
-      logger.error(f"Error: {e}")
+      logger.error("Error: %s", e)
   # endregion
 
   # region recommendations
@@ -97,7 +104,7 @@ class Spotify(commands.Cog):
     logger.info("Getting recommendations...")
     await interaction.response.defer()
 
-    recommendations = self.spotify_client.get_recommendations(limit)
+    recommendations = await self.spotify_client.get_recommendations(limit)
 
     if not recommendations:
       await interaction.followup.send("No recommendations found.", ephemeral=True)
@@ -113,7 +120,7 @@ class Spotify(commands.Cog):
       logger.info("Recommendations sent.")
     except Exception as e:
       await interaction.followup.send("Failed to get recommendations.", ephemeral=True)
-      logger.error(f"Error: {e}")
+      logger.error("Error: %s", e)
   # endregion
 
   # region my_playlists
@@ -124,32 +131,35 @@ class Spotify(commands.Cog):
   )
   async def myplaylists(self, interaction: Interaction, limit:int = 5):
     '''
-    Display the admin user's playlists.
+    Display the admin user's playlists. The pages are requested as the user browses them.
 
     Parameters:
     -----------
     limit: `int`
-      The number of playlists to get. Default is 5.
+      The number of playlists of each page. Default is 5.
     '''
     logger.info("Getting my playlists...")
     await interaction.response.defer()
 
-    playlists = self.spotify_client.get_current_user_playlists(limit)
+    source = SpotifyOffsetPageSource(
+      self.spotify_client.get_current_user_playlists_page,
+      per_page=min(max(limit, 1), SPOTIFY_MAX_PAGE_SIZE)
+    )
 
-    if not playlists:
+    if not await source.prepare():
       await interaction.followup.send("No playlists found.")
       return
     
     try:
       spotify_pagination_view = SpotifyPaginationView(
-        data=playlists,
+        source=source,
         is_recommendation=None
       ) 
       await spotify_pagination_view.send_view_and_embed(interaction)
       logger.info("My playlists sent.")
     except Exception as e:
       await interaction.followup.send("Failed to get playlists.", ephemeral=True)
-      logger.error(f"Error: {e}")
+      logger.error("Error: %s", e)
   # endregion
 
   # region playlists
@@ -160,27 +170,43 @@ class Spotify(commands.Cog):
   )
   async def playlists(self, interaction: Interaction, user:str, limit:int = 5):
     '''
-    Display the playlists of the user.
+    Display the playlists of the user. The pages are requested as the user browses them.
 
     Parameters:
     -----------
     user: `str`
       The user to get the playlists from.
     limit: `int`
-      The number of playlists to get. Default is 5.
+      The number of playlists of each page. Default is 5.
     '''
-    logger.info(f"Getting {user}'s playlists...")
+    logger.info("Getting %s's playlists...", user)
     await interaction.response.defer()
 
-    playlists = self.spotify_client.get_playlist_from_user_id(user, limit)
+    owner = await self.spotify_client.get_users_profile(user)
 
-    if not playlists:
+    if owner is None:
       await interaction.followup.send("No playlists found.", ephemeral=True)
       return
-    
-    embed = create_playlists_embed(playlists)
 
-    await interaction.followup.send(embed=embed)
+    source = SpotifyOffsetPageSource(
+      functools.partial(self.spotify_client.get_user_playlists_page, user, owner=owner),
+      per_page=min(max(limit, 1), SPOTIFY_MAX_PAGE_SIZE)
+    )
+
+    if not await source.prepare():
+      await interaction.followup.send("No playlists found.", ephemeral=True)
+      return
+    
+    try:
+      spotify_pagination_view = SpotifyPaginationView(
+        source=source,
+        is_recommendation=None
+      )
+      await spotify_pagination_view.send_view_and_embed(interaction)
+      logger.info("%s's playlists sent.", user)
+    except Exception as e:
+      await interaction.followup.send("Failed to get playlists.", ephemeral=True)
+      logger.error("Error: %s", e)
   # endregion
 
   # region create_playlists
@@ -210,7 +236,7 @@ class Spotify(commands.Cog):
     logger.info("Creating playlist...")
     await interaction.response.defer()
 
-    playlist_url = self.spotify_client.create_playlist()
+    playlist_url = await self.spotify_client.create_playlist(name, description)
 
     embed = create_playlist_created_embed(
       playlist_url=playlist_url,
@@ -8,6 +8,7 @@ from discord.ext import commands
 from discord import Interaction
 
 from utils.apikeys import TEST_SERVER_ID
+from utils.assets import assets
 from embeds.common_embeds import (
   create_avatar_embed,
   create_commands_embed,
@@ -22,6 +23,9 @@ from services.rocket_league import get_rocket_league_stats_data
 from services.weather import get_weather_data
 from ui.books_dropdown import BooksDropdown
 from ui.rocketleague_playlists_dropdown import RLPlaylistsDropdown
+from ui.traced_view import TracedView
+from utils.interactions import respond
+from utils.sharding import describe_shards, shard_monitor
 
 from utils.logger_config import logger
 
@@ -42,16 +46,14 @@ class Utilities(commands.Cog):
     ''' 
     Displays all the commands available
     '''
-    await interaction.response.defer()
-
-    file = discord.File("images/blade-runner-rachael1.gif", filename="blade-runner-rachael1.gif")
+    await respond(interaction, self.commands_message())
+    await assets.record("blade-runner-rachael1", interaction)
 
+  async def commands_message(self) -> dict:
+    ''' The message of `/commands`, the GIF is only uploaded the first time. '''
     embed = create_commands_embed(image = self.bot.user.display_avatar)
 
-    await interaction.followup.send(
-      file=file,
-      embed=embed
-    )
+    return assets.attach("blade-runner-rachael1", embed)
   # endregion
 
   # region ping
@@ -65,11 +67,13 @@ class Utilities(commands.Cog):
     This function is called when the user sends the `/ping` command.
     It sends a message to the user with the latency of the bot.
     '''
-    logger.info(f"Received ping request from {interaction.user.name}")
+    logger.info("Received ping request from %s", interaction.user.name)
     latency = f"{round(self.bot.latency *1000)}ms"
-    
-    await interaction.send(f"Pong! {latency}")
-    logger.info(f"Sent pong request from {interaction.user.name} with latency {latency}")
+    shard_id = interaction.guild.shard_id if interaction.guild else 0
+    shards = describe_shards(shard_monitor.stats(), current=shard_id)
+
+    await interaction.send("\n".join([f"Pong! {latency}", *shards]))
+    logger.info("Sent pong request from %s with latency %s", interaction.user.name, latency)
   # endregion
 
 
@@ -83,11 +87,11 @@ class Utilities(commands.Cog):
     '''
     Displays the avatar of an user.
     '''
-    await interaction.response.defer()
-
-    embed = create_avatar_embed(user=user)
+    await respond(interaction, self.avatar_message(user))
 
-    await interaction.followup.send(embed=embed)
+  async def avatar_message(self, user: discord.Member) -> dict:
+    ''' The message of `/avatar`. '''
+    return {"embed": create_avatar_embed(user=user)}
   # endregion
 
   # region eeorigins
@@ -100,11 +104,11 @@ class Utilities(commands.Cog):
     '''
     Gives you the guide to make Origins EE
     '''
-    await interaction.response.defer()
+    await respond(interaction, self.eeorigins_message())
 
-    embed = create_eeorigins_embed()
-
-    await interaction.followup.send(embed=embed)
+  async def eeorigins_message(self) -> dict:
+    ''' The message of `/eeorigins`. '''
+    return {"embed": create_eeorigins_embed()}
   # endregion
 
   # region weather information
@@ -121,21 +125,20 @@ class Utilities(commands.Cog):
     city: 'str'
         The name of the city to get the weather data from.
     '''
-    await interaction.response.defer()
+    await respond(interaction, self.weather_message(city))
 
-    weather_data = await get_weather_data(city)
+  async def weather_message(self, city: str) -> dict:
+    ''' The message of `/weather`, ready at once when the weather is cached. '''
+    weather_data = await get_weather_data(city, coalesce=True)
 
     if weather_data is None:
       embed = create_error_embed(
         title="Error 🤖",
         description="An error occurred while fetching the weather data."
       )
-      await interaction.followup.send(embed=embed)
-      return
-
-    embed = create_weather_embed(weather_data=weather_data)
+      return {"embed": embed}
 
-    await interaction.followup.send(embed=embed)
+    return {"embed": create_weather_embed(weather_data=weather_data)}
   # endregion
 
   # region rocket league stats
@@ -150,24 +153,25 @@ class Utilities(commands.Cog):
     nametag: str
         The name of the player to get the stats from.
     '''
-    await interaction.response.defer()
+    await respond(interaction, self.rlrank_message(nametag))
 
-    player = await get_rocket_league_stats_data(nametag=nametag)
+  async def rlrank_message(self, nametag: str) -> dict:
+    ''' The message of `/rlrank`, ready at once when the player is cached. '''
+    player = await get_rocket_league_stats_data(nametag=nametag, coalesce=True)
 
     if player is None:
       embed = create_error_embed(
         title="That player doesn't exist! 👻",
         description=f"Player with nametag {nametag} not found."
       )
-      await interaction.followup.send(embed=embed)
-      return
+      return {"embed": embed}
 
-    view = discord.ui.View()
+    view = TracedView()
     view.add_item(RLPlaylistsDropdown(playlists=player.playlists, player=player))
 
     embed = create_base_rl_embed(player=player)
 
-    await interaction.followup.send(view=view, embed=embed)
+    return {"view": view, "embed": embed}
   # endregion
 
   # region books
@@ -184,24 +188,25 @@ class Utilities(commands.Cog):
     query: str
       The text to search for in the books.
     """
-    await interaction.response.defer()
+    await respond(interaction, self.books_message(query))
 
-    books = await get_books(query)
+  async def books_message(self, query: str) -> dict:
+    ''' The message of `/books`, ready at once when the search is cached. '''
+    books = await get_books(query, coalesce=True)
 
     if not books:
       embed = create_error_embed(
         title="No Books Found 📚",
         description="No books found for your query."
       )
-      await interaction.followup.send(embed=embed)
-      return
+      return {"embed": embed}
 
-    view = discord.ui.View()
+    view = TracedView()
     view.add_item(BooksDropdown(books=books))
 
     embed = create_base_book_embed()
 
-    await interaction.followup.send(view=view, embed=embed)
+    return {"view": view, "embed": embed}
   # endregion
 
 def setup(bot):
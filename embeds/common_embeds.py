@@ -185,3 +185,89 @@ def create_clear_embed(amount: int):
 
   return embed
 
+
+def create_stats_embed(summary: dict[str, list[str]]):
+  '''
+  Create an embed with the summary of the bot metrics.
+
+  Parameters
+  ----------
+  summary: `dict`
+    The lines of each section, from :func:`utils.metrics.summarize`.
+  return: :class:`Embed`
+    The embed with the metrics.
+  '''
+  embed = discord.Embed(
+    title="Bot Stats",
+    description="Since the bot started. The full metrics are on the local exporter.",
+    color=discord.Color.blurple()
+  )
+
+  for section, lines in summary.items():
+    # The value of a field is limited to 1024 characters
+    value = "\n".join(lines)[:1024] if lines else "No data yet"
+    embed.add_field(name=f"`{section}:`", value=value, inline=False)
+
+  return embed
+
+def create_blocking_embed(sites: list):
+  '''
+  Create an embed with the places of the code that blocked the event loop.
+
+  Parameters
+  ----------
+  sites: `list[BlockingSite]`
+    The sites, from the one that blocked the loop the longest.
+  return: :class:`Embed`
+    The embed with the blocking sites.
+  '''
+  embed = discord.Embed(
+    title="Blocking Calls",
+    description="The calls that blocked the event loop the longest since the bot started."
+      if sites else "The event loop hasn't been blocked.",
+    color=discord.Color.orange()
+  )
+
+  for position, site in enumerate(sites, start=1):
+    embed.add_field(
+      name=f"`{position}.` {site.seconds:.2f}s in {site.blocks} blocks",
+      value=f"`{site.name[:1000]}`",
+      inline=False
+    )
+
+  return embed
+
+def create_profile_embed(seconds: float, samples: int, busy_samples: int, top: list):
+  '''
+  Create an embed with the functions where the bot spent the most time.
+
+  Parameters
+  ----------
+  seconds: `float`
+    The seconds the profiler ran.
+  samples: `int`
+    The number of times the threads were sampled.
+  busy_samples: `int`
+    The number of stack samples of threads that weren't waiting.
+  top: `list[tuple[str, int, int]]`
+    The functions with their cumulative and own samples.
+  return: :class:`Embed`
+    The embed with the profile.
+  '''
+  embed = discord.Embed(
+    title="Profile",
+    description=f"{samples} samples in {seconds:.1f}s, {busy_samples} of busy threads. "
+      "The collapsed stacks are attached for a flamegraph.",
+    color=discord.Color.blurple()
+  )
+
+  lines = [
+    f"`{cumulative:>5} {own:>5}` {function[-80:]}" for function, cumulative, own in top
+  ]
+  embed.add_field(
+    name="`Cumulative · Own · Function:`",
+    value="\n".join(lines)[:1024] if lines else "The bot was idle",
+    inline=False
+  )
+
+  return embed
@@ -1,62 +1,207 @@
 '''
-This module is the main entry point for the bot. It initializes 
+This module is the main entry point for the bot. It initializes
 the bot and loads all the extensions in the cogs folder.
 '''
-import os
+import asyncio
 
 import discord
 from discord.ext import commands
 
-from utils.apikeys import BOT_TOKEN
+from utils.apikeys import (
+  AUTO_SHARD,
+  BOT_TOKEN,
+  CLUSTER_HUB,
+  CLUSTER_WORKER_ID,
+  GATEWAY_PROFILE,
+  SHARD_COUNT,
+  SHARD_IDS,
+)
+from utils.assets import assets
+from utils.cache import close_redis
+from utils.cluster import cluster_node, worker_stats
+from utils.gateway_profile import get_profile
+from utils.http_client import http_client
+from utils.interactions import TimedInteraction
+from utils.log_context import new_correlation_id
 from utils.logger_config import logger
+from utils.loop_monitor import blocking_watchdog, loop_monitor
+from utils.metrics_server import metrics_server
+from utils.sharding import parse_shard_ids, shard_monitor
+from utils.startup import ExtensionLoader, StartupReport
 
 
-intents = discord.Intents.all()
+class RachaelBotMixin:
+  '''
+  What the bot does on one connection or on several shards. It loads the
+  extensions while it logs in, and releases the shared resources of the services
+  when it is closed.
+  '''
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.startup = StartupReport()
+    self.extension_loader = ExtensionLoader(self, self.startup)
+    self.assets_task: asyncio.Task = None
+
+  def get_interaction(self, data, *, cls=TimedInteraction):
+    '''
+    Create the interactions as :class:`TimedInteraction`, to time the commands.
+    '''
+    return super().get_interaction(data, cls=cls)
+
+  async def process_application_commands(self, interaction: TimedInteraction):
+    '''
+    Give each slash invocation a correlation id before running its command.
+    The id is kept by the task of the invocation, so every record logged by the
+    command, the services it calls and the views it creates carries it.
+    The time until the command returns or raises is recorded as its "final" stage.
+    '''
+    new_correlation_id()
+    logger.debug(
+      "Invocation %s from %s",
+      (interaction.data or {}).get("name"), interaction.user
+    )
+    try:
+      await super().process_application_commands(interaction)
+    finally:
+      interaction.record_stage("final")
+
+  async def start(self, token: str, *, reconnect: bool = True):
+    '''
+    Start the metrics exporter, the event loop monitor, its watchdog, the
+    shard monitor and, in a worker of `cluster.py`, the cluster membership.
+    Then log in while the extensions are loaded and connect to Discord, the
+    assets are optimized in the background.
+    '''
+    loop_monitor.start()
+    blocking_watchdog.start()
+    shard_monitor.start(self)
+    await metrics_server.start()
+    if CLUSTER_WORKER_ID:
+      await cluster_node.start(
+        CLUSTER_WORKER_ID, CLUSTER_HUB, lambda: worker_stats(self, shard_monitor.stats())
+      )
+    self.assets_task = asyncio.create_task(self.optimize_assets(), name="assets-optimize")
+    await asyncio.gather(self.login(token), self.extension_loader.load_all())
+    await self.connect(reconnect=reconnect)
 
-# bot = commands.Bot(command_prefix='/', intents=intents)
-bot = commands.Bot(intents=intents)
+  async def optimize_assets(self):
+    '''
+    Make the size-optimized variants of the static assets, recorded as the
+    "assets" phase of the startup.
+    '''
+    await assets.optimize()
+    self.startup.mark("assets")
 
-# region on_ready event
-@bot.event
-async def on_ready():
+  async def on_connect(self):
+    '''
+    Synchronize the slash commands of the loaded extensions.
+    '''
+    self.startup.mark("connect")
+    await super().on_connect()
+
+  # region on_ready event
+  async def on_ready(self):
+    '''
+    This event is called when the bot is ready to start sending requests to Discord.
+    '''
+    await self.change_presence(
+      activity=discord.Activity(
+        type=discord.ActivityType.listening,
+        name="`/`",
+        state=f"Ready to serve {len(self.users)} users!" ,
+      )
+    )
+
+    # The event repeats after the reconnections, the report is logged once
+    if self.startup.mark("ready"):
+      logger.info("Startup report:\n%s", self.startup.render())
+
+    logger.info("%s is ready!", self.user.name)
+    print(f"{self.user.name} is ready!")
+    print("------")
+  # endregion
+
+  async def close(self):
+    '''
+    Leave the cluster, close the shared HTTP session, the shared cache, the
+    metrics exporter and then the connection to Discord.
+    '''
+    self.extension_loader.close()
+    if self.assets_task is not None:
+      self.assets_task.cancel()
+    await cluster_node.close()
+    shard_monitor.stop()
+    blocking_watchdog.stop()
+    loop_monitor.stop()
+    await metrics_server.stop()
+    await http_client.close()
+    await close_redis()
+    await super().close()
+
+
+class RachaelBot(RachaelBotMixin, commands.Bot):
   '''
-  This event is called when the bot is ready to start sending requests to Discord.
+  The bot on one gateway connection.
   '''
-  await bot.change_presence(
-    activity=discord.Activity(
-      type=discord.ActivityType.listening,
-      name="`/`",
-      state=f"Ready to serve {len(bot.users)} users!" ,
-    )
-  )
-  logger.info(f"{bot.user.name} is ready!")
-  print(f"{bot.user.name} is ready!")
-  print("------")
-# endregion
+  async def on_connect(self):
+    '''
+    Count the reconnections, then synchronize the slash commands.
+    '''
+    shard_monitor.connected(self.shard_id or 0)
+    await super().on_connect()
+
+  async def on_resumed(self):
+    shard_monitor.resumed(self.shard_id or 0)
 
-# region load_extensions
-def load_extensions():
-  ''' 
-  Load all the extensions in the cogs folder.
+  async def on_disconnect(self):
+    shard_monitor.disconnected(self.shard_id or 0)
+
+
+class ShardedRachaelBot(RachaelBotMixin, commands.AutoShardedBot):
+  '''
+  The bot on several shards, one gateway connection each.
+  '''
+  async def on_shard_connect(self, shard_id: int):
+    shard_monitor.connected(shard_id)
+
+  async def on_shard_resumed(self, shard_id: int):
+    shard_monitor.resumed(shard_id)
+
+  async def on_shard_disconnect(self, shard_id: int):
+    shard_monitor.disconnected(shard_id)
+
+
+def create_bot(options: dict) -> RachaelBotMixin:
+  '''
+  Create the bot, sharded if `AUTO_SHARD` is set.
 
   Parameters
   ----------
-  None
+  options: `dict`
+      The options of the gateway profile.
+  return: :class:`RachaelBot` | :class:`ShardedRachaelBot`
+  '''
+  if not AUTO_SHARD:
+    return RachaelBot(**options)
+
+  shard_ids = parse_shard_ids(SHARD_IDS)
+  if shard_ids is not None and SHARD_COUNT is None:
+    raise ValueError("SHARD_IDS needs SHARD_COUNT, the total of shards of the bot")
+
+  logger.info("Sharded: shards %s of %s", shard_ids or "all", SHARD_COUNT or "recommended")
+  return ShardedRachaelBot(shard_count=SHARD_COUNT, shard_ids=shard_ids, **options)
+
+
+def main():
+  '''
+  Create the bot and run it until it is closed.
   '''
-  initial_extensions = []
+  profile = get_profile(GATEWAY_PROFILE)
+  logger.info("Gateway profile: %s", profile)
 
-  for filename in os.listdir("./cogs"):
-    if filename.endswith(".py"):
-      initial_extensions.append("cogs." + filename[:-3])
+  bot = create_bot(profile.options())
+  bot.run(BOT_TOKEN)
 
-  if __name__ == "__main__":
-    for extension in initial_extensions:
-      try:
-        bot.load_extension(extension) 
-        logger.debug(f"Loaded extension: {extension}")
-      except Exception as e:
-        logger.error(f"Failed to load extension {extension}. Error: {e}")
-# endregion
 
-load_extensions()
-bot.run(BOT_TOKEN)
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,258 @@
+'''
+This file contains the async facade over :class:`SpotifyClient`.
+
+spotipy makes blocking HTTP requests, so every call runs on a bounded thread pool
+and the event loop keeps serving the gateway and the other commands meanwhile.
+spotipy and requests are imported with the first call, on a worker thread, so
+they don't slow down the startup of the bot.
+'''
+import asyncio
+import contextvars
+import functools
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable
+
+from classes.spotify import Playlist, SpotifyUser, Track
+from utils.const import SPOTIFY_CALL_TIMEOUT, SPOTIFY_MAX_WORKERS
+from utils.logger_config import logger
+
+if TYPE_CHECKING:
+  from services.spotify_token import SpotifyTokenManager
+  from services.spotifyclient import SpotifyClient
+
+
+class AsyncSpotifyClient:
+  '''
+  Runs the methods of a :class:`SpotifyClient` on a thread pool.
+
+  The first call creates the blocking client and waits for the access token,
+  which is then refreshed in the background, so creating the facade never blocks.
+
+  A call that takes longer than `timeout` seconds returns `None`. Cancelling the
+  awaiting command removes the call from the pool if it didn't start yet; a call
+  already running finishes in its thread, bounded by spotipy's request timeout.
+
+  Parameters
+  ----------
+  client: :class:`SpotifyClient`
+    The blocking client. Default is a new one using `token_manager`, created by the first call.
+  token_manager: :class:`SpotifyTokenManager`
+    The manager of the access token. Default is a new one, created by the first call.
+  max_workers: `int`
+    The number of threads running Spotify calls.
+  timeout: `float`
+    The seconds a call is awaited.
+  '''
+  def __init__(
+    self,
+    client: "SpotifyClient" = None,
+    token_manager: "SpotifyTokenManager" = None,
+    max_workers: int = SPOTIFY_MAX_WORKERS,
+    timeout: float = SPOTIFY_CALL_TIMEOUT
+  ):
+    self.token_manager = token_manager
+    self.client = client
+    self.timeout = timeout
+    self._client_lock = asyncio.Lock()
+    self._executor = ThreadPoolExecutor(
+      max_workers=max_workers,
+      thread_name_prefix="spotify"
+    )
+
+  # region get_client
+  async def get_client(self) -> "SpotifyClient":
+    '''
+    Get the blocking client, it is created with the first call.
+    This is an asynchronous function and should be called with 'await'.
+
+    Returns:
+    -------
+    `SpotifyClient`
+    '''
+    if self.client is not None:
+      return self.client
+
+    async with self._client_lock:
+      if self.client is None:
+        # spotipy and requests take a while to import, the event loop doesn't wait for them
+        await asyncio.to_thread(importlib.import_module, "services.spotifyclient")
+
+        from services.spotify_token import SpotifyTokenManager
+        from services.spotifyclient import SpotifyClient
+
+        self.token_manager = self.token_manager or SpotifyTokenManager()
+        self.client = SpotifyClient(auth_manager=self.token_manager)
+        logger.debug("Spotify client created")
+
+    return self.client
+
+  async def _call(self, name: str, *args, **kwargs) -> Any:
+    client = await self.get_client()
+    return await self.run(getattr(client, name), *args, **kwargs)
+  # endregion
+
+  # region run
+  async def run(self, func: Callable, *args, timeout: float = None, **kwargs) -> Any:
+    '''
+    Run a blocking function on the thread pool.
+    This is an asynchronous function and should be called with 'await'.
+
+    Parameters:
+    ----------
+    func: `Callable`
+      The blocking function.
+    timeout: `float`
+      The seconds to wait for the result. Default is the client's timeout.
+
+    Returns:
+    -------
+    `Any` or `None`
+      The result of the function, or None if it timed out.
+    '''
+    timeout = timeout or self.timeout
+    await self.get_client()
+
+    try:
+      await asyncio.wait_for(self.token_manager.wait_ready(), timeout)
+    except asyncio.TimeoutError:
+      logger.error("Spotify token not ready, %s skipped", func.__name__)
+      return None
+
+    loop = asyncio.get_running_loop()
+    # The worker thread logs with the correlation id of the caller
+    context = contextvars.copy_context()
+    future = loop.run_in_executor(self._executor, functools.partial(context.run, func, *args, **kwargs))
+
+    try:
+      return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+      logger.error("Spotify call %s timed out", func.__name__)
+      return None
+  # endregion
+
+  # region tracks
+  async def get_user_top_tracks(
+    self,
+    limit: int = 5,
+    time_range: str = "medium_term"
+  ) -> tuple[Track, ...]:
+    '''
+    Async version of :meth:`SpotifyClient.get_user_top_tracks`.
+    '''
+    return await self._call("get_user_top_tracks", limit, time_range)
+
+  async def get_recommendations(
+    self,
+    limit: int = 5,
+    time_range: str = "medium_term"
+  ) -> tuple[Track, ...]:
+    '''
+    Async version of :meth:`SpotifyClient.get_recommendations`.
+    '''
+    return await self._call("get_recommendations", limit, time_range)
+  # endregion
+
+  # region playlists
+  async def create_playlist(
+    self,
+    name="My recommended playlist",
+    description="A playlist with recommended songs by Rachael Nexus-7",
+  ) -> str:
+    '''
+    Create a playlist in the user's Spotify account based on the recommendations and
+    top user's tracks.
+
+    The playlist is created while the recommendations are fetched, then the
+    tracks are deduplicated and added in chunks, and the url is taken from
+    the create response.
+
+    Parameters:
+    ----------
+    name: `str`
+      The name of the playlist.
+    description: `str`
+      The description of the playlist.
+
+    Returns:
+    -------
+    `str` or `None`
+      The url of the created playlist.
+    '''
+    # Both branches need the user id, SpotifyClient requests it only once
+    playlist, recommendations = await asyncio.gather(
+      self._call("create_empty_playlist", name, description),
+      self.get_recommendations(),
+    )
+
+    if not playlist:
+      return None
+
+    # Cached by get_recommendations
+    top_tracks = await self.get_user_top_tracks()
+
+    await self.add_tracks_to_playlist(
+      playlist['id'],
+      [*(recommendations or ()), *(top_tracks or ())]
+    )
+
+    return playlist['external_urls']['spotify']
+
+  async def add_tracks_to_playlist(self, playlist_id: str, tracks: list) -> None:
+    '''
+    Async version of :meth:`SpotifyClient.add_tracks_to_playlist`.
+    '''
+    return await self._call("add_tracks_to_playlist", playlist_id, tracks)
+
+  async def get_current_user_playlists(self, limit: int = 5) -> list[Playlist]:
+    '''
+    Async version of :meth:`SpotifyClient.get_current_user_playlists`.
+    '''
+    return await self._call("get_current_user_playlists", limit)
+
+  async def get_current_user_playlists_page(
+    self,
+    limit: int = 5,
+    offset: int = 0
+  ) -> tuple[list[Playlist], int]:
+    '''
+    Async version of :meth:`SpotifyClient.get_current_user_playlists_page`.
+    '''
+    return await self._call("get_current_user_playlists_page", limit, offset)
+
+  async def get_playlist_from_user_id(self, user_id: str, limit: int = 5) -> list[Playlist]:
+    '''
+    Async version of :meth:`SpotifyClient.get_playlist_from_user_id`.
+    '''
+    return await self._call("get_playlist_from_user_id", user_id, limit)
+
+  async def get_user_playlists_page(
+    self,
+    user_id: str,
+    limit: int = 5,
+    offset: int = 0,
+    owner: SpotifyUser = None
+  ) -> tuple[list[Playlist], int]:
+    '''
+    Async version of :meth:`SpotifyClient.get_user_playlists_page`.
+    '''
+    return await self._call("get_user_playlists_page", user_id, limit, offset, owner)
+  # endregion
+
+  # region users
+  async def get_users_profile(self, user_id: str) -> SpotifyUser:
+    '''
+    Async version of :meth:`SpotifyClient.get_users_profile`.
+    '''
+    return await self._call("get_users_profile", user_id)
+  # endregion
+
+  # region close
+  def close(self):
+    '''
+    Stop the token refresh and the thread pool. The calls that didn't start yet are cancelled.
+    '''
+    if self.token_manager is not None:
+      self.token_manager.close()
+    self._executor.shutdown(wait=False, cancel_futures=True)
+  # endregion
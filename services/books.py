@@ -2,15 +2,23 @@
 This file contains the functions to get the books from the Google Books API.
 '''
 from typing import List
-import logging
+import asyncio
 import aiohttp
 from utils.logger_config import logger
 from utils.apikeys import GOOGLE_BOOKS_ENDPOINT
+from utils.cache import TieredCache, normalize_key
+from utils.const import BOOKS_CACHE_SIZE, BOOKS_CACHE_TTL
+from utils.http_client import http_client
+from utils.singleflight import SingleFlight
 
 from classes.Book import Book
 
+# Books found by normalized query
+books_cache = TieredCache("books", maxsize=BOOKS_CACHE_SIZE, ttl=BOOKS_CACHE_TTL, types=(Book,))
+books_flight = SingleFlight("books")
+
 # region get_books - get books from google books api
-async def fetch_books(query:str):
+async def fetch_books(query:str, session: aiohttp.ClientSession = None):
   '''
   Asynchronously fetch the books from the Google Books API from a query string.
   This is an asynchronous function and should be called with 'await'.
@@ -19,35 +27,67 @@ async def fetch_books(query:str):
   ----------
   query: `str`
       The query string to search for the books.
+  session: :class:`aiohttp.ClientSession`
+      The session to use for the request. Default is the shared session.
   
   return: `dict` or `None`
   '''
+  session = session or http_client.session
   try:
-    async with aiohttp.ClientSession() as session:
-      async with session.get(GOOGLE_BOOKS_ENDPOINT+query) as response:
-        response.raise_for_status()
-        return await response.json()
-  except aiohttp.ClientError as err:
+    async with session.get(GOOGLE_BOOKS_ENDPOINT+query) as response:
+      response.raise_for_status()
+      return await response.json()
+  except (aiohttp.ClientError, asyncio.TimeoutError) as err:
     # logger.exception("An error occurred while fetching the book data:")
-    logger.error(f"Book: {query}, Error: {err}")
+    logger.error("Book: %s, Error: %s", query, err)
     return None
 
-async def get_books(query: str):
+async def get_books(query: str, session: aiohttp.ClientSession = None, coalesce: bool = False):
   '''Asynchronously get the books from the Google Books API from a query string
   This is an asynchronous function and should be called with 'await'.
+  The results are cached by normalized query for `BOOKS_CACHE_TTL` seconds.
 
   Parameters
   ----------
   query: `str`
       The query string to search for the books.
+  session: :class:`aiohttp.ClientSession`
+      The session to use for the request. Default is the shared session.
+  coalesce: `bool`
+      If True, concurrent calls for the same query share one request. Default is False.
   
+  return: `List[Book]` or `None`
+  '''
+  key = normalize_key(query)
+
+  cached = await books_cache.get(key)
+  if cached is not None:
+    return cached
+
+  if coalesce:
+    return await books_flight.do(key, _load_books, query, key, session)
+
+  return await _load_books(query, key, session)
+
+async def _load_books(query: str, key: str, session: aiohttp.ClientSession = None):
+  '''Fetch the books of a query, build the :class:`Book` objects and cache them.
+
+  Parameters
+  ----------
+  query: `str`
+      The query string to search for the books.
+  key: `str`
+      The cache key of the query.
+  session: :class:`aiohttp.ClientSession`
+      The session to use for the request.
+
   return: `List[Book]` or `None`
   '''
   # Log the query
   logger.info("Get books from Google Books API with query: %s", query)
 
   # Get the books from the Google Books API
-  data = await fetch_books(query)
+  data = await fetch_books(query, session)
 
   if data is None:
     return None
@@ -63,12 +103,13 @@ async def get_books(query: str):
     volume_info = item.get("volumeInfo", {})
 
     if not volume_info:
-      logging.error("No volumeInfo in item %s", item)
+      logger.error("No volumeInfo in item %s", item)
       continue
 
     temp_book = Book.from_dict(item, volume_info)
     books.append(temp_book)
 
-  logger.info("Books found: %s", books)
+  logger.info("Books found: %s", len(books))
+  await books_cache.set(key, books)
   return books
 # endregion
@@ -2,22 +2,33 @@
 This module contains the methods to fetch and process 
 Rocket League player data from the Rocket League API.
 '''
+import asyncio
 import aiohttp
 
 from utils.apikeys import ROCKET_LEAGUE_ENDPOINT
+from utils.cache import TieredCache
+from utils.const import RL_CACHE_SIZE, RL_CACHE_TTL
+from utils.http_client import http_client
+from utils.singleflight import SingleFlight
 from classes.rocket_league import Playlist, RocketLeaguePlayer
 
 from utils.logger_config import logger
 
-async def fetch_player_data(nametag:str):
+# Players by case-insensitive nametag
+player_cache = TieredCache(
+  "rocket_league", maxsize=RL_CACHE_SIZE, ttl=RL_CACHE_TTL, types=(RocketLeaguePlayer, Playlist)
+)
+player_flight = SingleFlight("rocket_league")
+
+async def fetch_player_data(nametag:str, session: aiohttp.ClientSession = None):
   ''' Fetch the player data from the Rocket League API
 
   Parameters
   ----------
   nametag : `str`
       The name of the player to get the stats from.
-  headers : `dict`
-      The headers to use for the request.
+  session : :class:`aiohttp.ClientSession`
+      The session to use for the request. Default is the shared session.
   
   Returns
   -------
@@ -29,13 +40,13 @@ async def fetch_player_data(nametag:str):
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "+
     "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36"
   }
+  session = session or http_client.session
   try:
-    async with aiohttp.ClientSession() as session:
-      async with session.get(ROCKET_LEAGUE_ENDPOINT+nametag, headers=headers) as response:
-        response.raise_for_status()
-        return await response.json()
-  except aiohttp.ClientError as err:
-    logger.error(f"An error occurred while fetching the player data: {err}")
+    async with session.get(ROCKET_LEAGUE_ENDPOINT+nametag, headers=headers) as response:
+      response.raise_for_status()
+      return await response.json()
+  except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+    logger.error("An error occurred while fetching the player data: %s", err)
     print("An error occurred while fetching the player data:")
     print(f"Player: {nametag}, Error: {err}")
   return None
@@ -68,23 +79,71 @@ def is_playlist_type(playlist):
   '''
   return playlist.get("type", {}) == "playlist"
 
-async def get_rocket_league_stats_data(nametag:str):
+async def get_rocket_league_stats_data(
+  nametag:str,
+  session: aiohttp.ClientSession = None,
+  coalesce: bool = False
+):
   ''' Get statistics from a Rocket League player
 
-  This methods makes a request and transform the data into a :class:`RocketLeaguePlayer` object
+  This methods makes a request and transform the data into a :class:`RocketLeaguePlayer` object.
+  The players are cached by nametag for `RL_CACHE_TTL` seconds.
+
+  Parameters
+  ----------
+  nametag: str
+      The name of the player to get the stats from.
+  session: :class:`aiohttp.ClientSession`
+      The session to use for the request. Default is the shared session.
+  coalesce: bool
+      If True, concurrent calls for the same nametag share one request. Default is False.
+  return: :class:`RocketLeaguePlayer`
+  '''
+  key = nametag.strip().casefold()
+
+  cached = await player_cache.get(key)
+  if cached is not None:
+    return cached
+
+  if coalesce:
+    return await player_flight.do(key, _load_player, nametag, key, session)
+
+  return await _load_player(nametag, key, session)
+
+async def _load_player(nametag:str, key:str, session: aiohttp.ClientSession = None):
+  ''' Fetch a player, build the :class:`RocketLeaguePlayer` and cache it.
 
   Parameters
   ----------
   nametag: str
       The name of the player to get the stats from.
+  key: str
+      The cache key of the player.
+  session: :class:`aiohttp.ClientSession`
+      The session to use for the request.
   return: :class:`RocketLeaguePlayer`
   '''
   # Retrieve player data from the Rocket League API
-  data = await fetch_player_data(nametag)
+  data = await fetch_player_data(nametag, session)
   # If no data is returned, exit the function
   if data is None:
     return None
 
+  player = parse_player_data(data)
+  await player_cache.set(key, player)
+
+  # Return the constructed RocketLeaguePlayer object
+  return player
+
+def parse_player_data(data: dict) -> RocketLeaguePlayer:
+  ''' Build a :class:`RocketLeaguePlayer` from the response of the Rocket League API
+
+  Parameters
+  ----------
+  data: dict
+      The player data from the Rocket League API.
+  return: :class:`RocketLeaguePlayer`
+  '''
   # Extract all playlists from the retrieved player data
   playlists = data.get("data", {}).get("segments", [])
 
@@ -104,8 +163,6 @@ async def get_rocket_league_stats_data(nametag:str):
 
   # Construct a RocketLeaguePlayer object using the retrieved data,
   # playlist data, and lifetime playlist
-  player =  RocketLeaguePlayer.from_data(data, playlists_data, lifetime_playlist)
+  return RocketLeaguePlayer.from_data(data, playlists_data, lifetime_playlist)
 
-  # Return the constructed RocketLeaguePlayer object
-  return player
    
\ No newline at end of file
@@ -0,0 +1,170 @@
+'''
+This file contains the manager of the Spotify access token.
+
+The token is kept in memory and refreshed in the background a few minutes before
+it expires, so the commands never wait on an OAuth request after the first one.
+'''
+import asyncio
+import time
+
+from spotipy.oauth2 import SpotifyOAuth, SpotifyOauthError
+
+from utils.apikeys import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET
+from utils.const import (
+  SPOTIFY_REDIRECT_URI,
+  SPOTIFY_SCOPE,
+  SPOTIFY_TOKEN_REFRESH_MARGIN,
+  SPOTIFY_TOKEN_RETRY_DELAY,
+)
+from utils.logger_config import logger
+
+
+class SpotifyTokenManager:
+  '''
+  Keeps a valid Spotify access token in memory.
+
+  It is used as the `auth_manager` of `spotipy.Spotify`: spotipy reads the token
+  with :meth:`get_access_token` from its threads, while the event loop refreshes
+  it before it expires. Nothing is requested until :meth:`wait_ready` is awaited,
+  so creating the manager never blocks.
+
+  Parameters:
+  ----------
+  oauth: `SpotifyOAuth`
+    The OAuth flow used to get and refresh the token. Default is the bot's app.
+  refresh_margin: `float`
+    The seconds before the expiration to refresh the token.
+  '''
+  def __init__(
+    self,
+    oauth: SpotifyOAuth = None,
+    refresh_margin: float = SPOTIFY_TOKEN_REFRESH_MARGIN
+  ):
+    self.oauth = oauth or SpotifyOAuth(
+      client_id=SPOTIFY_CLIENT_ID,
+      client_secret=SPOTIFY_CLIENT_SECRET,
+      redirect_uri=SPOTIFY_REDIRECT_URI,
+      scope=SPOTIFY_SCOPE,
+    )
+    self.refresh_margin = refresh_margin
+    self._token_info: dict = None
+    self._ready = asyncio.Event()
+    self._lock = asyncio.Lock()
+    self._task: asyncio.Task = None
+
+  # region get_access_token
+  def get_access_token(self, as_dict: bool = False):
+    '''
+    Get the current token. Called by spotipy before every request.
+
+    Parameters:
+    ----------
+    as_dict: `bool`
+      True to get the whole token info instead of the access token.
+
+    Returns:
+    -------
+    `str` or `dict`
+      The access token or the token info.
+    '''
+    token_info = self._token_info
+
+    if token_info is None:
+      raise SpotifyOauthError("The Spotify token is not ready yet")
+
+    return token_info if as_dict else token_info["access_token"]
+  # endregion
+
+  # region wait_ready
+  async def wait_ready(self):
+    '''
+    Start the background refresh if needed and wait until there is a token.
+    This is an asynchronous function and should be called with 'await'.
+    '''
+    self.start()
+    await self._ready.wait()
+  # endregion
+
+  # region start and close
+  def start(self):
+    '''
+    Start the background refresh task, if it isn't running.
+    It must be called from the event loop.
+    '''
+    if self._task is None or self._task.done():
+      self._task = asyncio.create_task(self._refresh_loop(), name="spotify-token-refresh")
+
+  def close(self):
+    '''
+    Stop the background refresh task.
+    '''
+    if self._task is not None:
+      self._task.cancel()
+      self._task = None
+  # endregion
+
+  # region refresh
+  async def refresh(self, force: bool = False) -> dict:
+    '''
+    Get a new token on a worker thread. Concurrent calls are serialized, and a
+    call that waited for another refresh reuses its token.
+    This is an asynchronous function and should be called with 'await'.
+
+    Parameters:
+    ----------
+    force: `bool`
+      True to refresh the token even if it isn't close to expire.
+
+    Returns:
+    -------
+    `dict`
+      The token info.
+    '''
+    async with self._lock:
+      if not force and self._seconds_to_refresh() > 0:
+        return self._token_info
+
+      loop = asyncio.get_running_loop()
+      self._token_info = await loop.run_in_executor(None, self._fetch_token, force)
+      self._ready.set()
+
+      logger.info("Spotify token refreshed")
+      return self._token_info
+
+  def _fetch_token(self, force: bool) -> dict:
+    # Blocking, it runs on a worker thread
+    token_info = self.oauth.get_cached_token()
+
+    if token_info is None:
+      # First run: spotipy asks for the authorization on the console
+      logger.debug("OAuth: %s", self.oauth.get_authorize_url())
+      self.oauth.get_access_token(as_dict=False)
+      return self.oauth.get_cached_token()
+
+    if force or self.oauth.is_token_expired(token_info):
+      return self.oauth.refresh_access_token(token_info["refresh_token"])
+
+    return token_info
+
+  def _seconds_to_refresh(self) -> float:
+    if self._token_info is None:
+      return 0
+
+    return self._token_info["expires_at"] - self.refresh_margin - time.time()
+
+  async def _refresh_loop(self):
+    force = False
+
+    while True:
+      try:
+        await self.refresh(force=force)
+        delay = max(self._seconds_to_refresh(), 0)
+        force = True
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:
+        logger.error("Failed to refresh the Spotify token: %s", e)
+        delay = SPOTIFY_TOKEN_RETRY_DELAY
+
+      await asyncio.sleep(delay)
+  # endregion
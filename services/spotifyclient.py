@@ -1,145 +1,188 @@
 '''
 This file contains the methods interact with the Spotify API.
 '''
+import threading
+import requests
 import spotipy
 
 from typing import List
 from spotipy import Spotify
-from spotipy.oauth2 import SpotifyOAuth
 from spotipy import SpotifyException
 from utils.logger_config import logger
+from utils.metrics import cache_requests, record_requests_response
 
-from utils.apikeys import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET
 from classes.spotify import SpotifyUser, Track, Playlist
-from utils.const import SPOTIFY_REDIRECT_URI, SPOTIFY_SCOPE
+from services.spotify_token import SpotifyTokenManager
+from utils.cache import TTLCache
+from utils.const import (
+  SPOTIFY_CACHE_SIZE,
+  SPOTIFY_CACHE_TTL,
+  SPOTIFY_MAX_ITEMS_PER_REQUEST,
+  SPOTIFY_REQUESTS_TIMEOUT,
+)
 
 
 class SpotifyClient:
   '''
   A class used to interact with the Spotify API.
+
+  The top tracks and recommendations are immutable tuples kept in a shared
+  cache, so concurrent commands can use the same instance safely.
   '''
-  def __init__(self):
-    try:
-      self.sp:Spotify = self.create_spotify_object()
-    except spotipy.SpotifyException as e:
-      raise spotipy.SpotifyException(
-        msg=f"Failed to create Spotify object: {e}",
-        http_status=e.http_status,
-        code=e.code
-      )
+  def __init__(self, auth_manager: SpotifyTokenManager = None):
+    self.sp:Spotify = self.create_spotify_object(auth_manager or SpotifyTokenManager())
 
-    self.top_tracks:List[Track] = []
-    self.recommendations:List[Track] = []
+    self._user:SpotifyUser = None
+    self._user_lock = threading.Lock()
+    # (kind, user, limit, time range) -> Tuple[Track]
+    self._results = TTLCache(maxsize=SPOTIFY_CACHE_SIZE, ttl=SPOTIFY_CACHE_TTL)
 
   # region create_spotify_object
-  def create_spotify_object(self):
+  def create_spotify_object(self, auth_manager: SpotifyTokenManager):
     '''
     Create the Spotify object to interact with the Spotify API.
+    The token is read from the manager on every request, so this doesn't
+    make any request.
+
+    Parameters:
+    ----------
+    auth_manager: `SpotifyTokenManager`
+      The manager of the access token.
 
     Returns:
     -------
     `spotipy.Spotify`
       The Spotify object to interact with the Spotify API.
     '''
-
-    # Create the spotify oauth object
-    oauth = SpotifyOAuth(
-      client_id=SPOTIFY_CLIENT_ID,
-      client_secret=SPOTIFY_CLIENT_SECRET,
-      redirect_uri=SPOTIFY_REDIRECT_URI,
-      scope=SPOTIFY_SCOPE,
+    # Records the status, latency and bytes of every request in the metrics
+    session = requests.Session()
+    session.hooks["response"].append(record_requests_response)
+
+    return spotipy.Spotify(
+      auth_manager=auth_manager,
+      requests_session=session,
+      requests_timeout=SPOTIFY_REQUESTS_TIMEOUT
     )
+  # endregion
+
+  # region current_user
+  def current_user(self) -> SpotifyUser:
+    '''
+    Get the profile of the authorized user. It is requested once and then reused.
+    This method can raise a SpotifyException.
 
-    
-    logger.debug(f"OAuth: {oauth.get_authorize_url()}")
+    Returns:
+    -------
+    `SpotifyUser`
+      The profile of the user.
+    '''
+    # Concurrent calls wait for the first request instead of repeating it
+    with self._user_lock:
+      if self._user is None:
+        self._user = SpotifyUser.from_dict(self.sp.me())
 
-    if oauth.is_token_expired(oauth.get_cached_token()):
-      oauth.refresh_access_token(oauth.get_cached_token()['refresh_token'])
+    return self._user
 
-    # Get the token
-    token = oauth.get_access_token(as_dict=False)
+  def current_user_id(self) -> str:
+    '''
+    Get the id of the authorized user. This method can raise a SpotifyException.
 
-    # Create the Spotify object with the token and return it
-    return spotipy.Spotify(auth=token)
+    Returns:
+    -------
+    `str`
+      The id of the user.
+    '''
+    return self.current_user().user_id
   # endregion
 
   # region get_user_top_tracks
-  def get_user_top_tracks(self, limit:int = 5) -> list[Track]:
+  def get_user_top_tracks(self, limit:int = 5, time_range:str = "medium_term") -> tuple[Track, ...]:
     '''
     Get the user's top tracks from the Spotify API.
-    This method set the top_tracks attribute with the top tracks.
+    The results are cached by user, limit and time range for `SPOTIFY_CACHE_TTL` seconds.
 
     Parameters:
     ----------
     limit: `int`
       The number of top tracks to get. Default is 5.
+    time_range: `str`
+      The period of the top tracks: "short_term", "medium_term" or "long_term".
+      Default is "medium_term".
     Returns:
     -------
-    `list`: `List[Track]` or `[]`
+    `tuple`: `Tuple[Track]` or `()`
       The top tracks from the Spotify API.
     '''
     # If the Spotify object is not created, return None
     if not self.sp:
       return None
 
-    self.clear_top_tracks()
-
     try:
-      tracks = self.sp.current_user_top_tracks(limit=limit)["items"]
+      key = ("top_tracks", self.current_user_id(), limit, time_range)
+
+      top_tracks = self._results.get(key)
+      cache_requests.inc(cache="spotify", tier="l1", result="miss" if top_tracks is None else "hit")
+      if top_tracks is not None:
+        return top_tracks
 
-      for track in tracks:
-        temp_track = Track.from_dict(data = track)
-        self.top_tracks.append(temp_track)
+      tracks = self.sp.current_user_top_tracks(limit=limit, time_range=time_range)["items"]
+      top_tracks = tuple(Track.from_dict(data = track) for track in tracks)
 
     except spotipy.SpotifyException as e:
-      logger.error(f"Failed to get top tracks: {e}")
-      self.clear_top_tracks()
+      logger.error("Failed to get top tracks: %s", e)
+      return ()
 
-    logger.info(f"Top tracks: {self.top_tracks}")
-    return self.top_tracks
+    self._results.set(key, top_tracks)
+
+    logger.info("Top tracks: %s found", len(top_tracks))
+    return top_tracks
   # endregion
 
   # region get_recommendations
-  def get_recommendations(self, limit:int = 5) -> list[Track]:
+  def get_recommendations(self, limit:int = 5, time_range:str = "medium_term") -> tuple[Track, ...]:
     '''
-    Get recommendations from the Spotify API.
-    This method set the recommendations attribute with the recommendations.
+    Get recommendations from the Spotify API, based on the cached top tracks.
+    The results are cached by user, limit and time range for `SPOTIFY_CACHE_TTL` seconds.
 
     Parameters:
     ----------
     limit: `int`
       The number of recommendations to get. Default is 5.
+    time_range: `str`
+      The period of the top tracks used as seeds. Default is "medium_term".
     Returns:
     -------
-    `list`: `dict` or `None`
+    `tuple`: `Tuple[Track]` or `()`
       The recommendations from the Spotify API.
-      Or None if there was an error.
+      Or an empty tuple if there was an error.
     '''
     if not self.sp:
       return None
 
-    self.clear_recommendations()
+    top_tracks = self.get_user_top_tracks(time_range=time_range)
+
+    if not top_tracks:
+      return ()
+
+    key = ("recommendations", self.current_user_id(), limit, time_range)
 
-    if self.top_tracks == []:
-      try:
-        self.top_tracks = self.get_user_top_tracks()
-      except spotipy.SpotifyException as e:
-        logger.error(f"Failed to get top tracks: {e}")
-        print(f"Failed to get top tracks: {e}")
-        self.clear_top_tracks()
+    recommendations = self._results.get(key)
+    cache_requests.inc(cache="spotify", tier="l1", result="miss" if recommendations is None else "hit")
+    if recommendations is not None:
+      return recommendations
 
     # Get seeds to get recommendations
     seed_tracks = []
     seed_artists = []
     try:
-      seed_genres = self.sp.artist(self.top_tracks[0].artists[0]['id'])['genres']
+      seed_genres = self.sp.artist(top_tracks[0].artists[0]['id'])['genres']
 
     except spotipy.SpotifyException as e:
-      logger.error(f"Failed to get seed genres: {e}")
+      logger.error("Failed to get seed genres: %s", e)
       print(f"Failed to get seed genres: {e}")
       seed_genres = []
 
-    for track in self.top_tracks:
+    for track in top_tracks:
       seed_artists.append(track.artists[0]['id'])
       seed_tracks.append(track.track_id)
 
@@ -153,16 +196,15 @@ class SpotifyClient:
       )['tracks']
 
       # Convert the recommendations to Track objects
-      for track in new_recommendations:
-        temp_track = Track.from_dict(data = track)
-        self.recommendations.append(temp_track)
+      recommendations = tuple(Track.from_dict(data = track) for track in new_recommendations)
 
     except spotipy.SpotifyException as e:
-      logger.error(f"Failed to get recommendations: {e}")
+      logger.error("Failed to get recommendations: %s", e)
       print(f"Failed to get recommendations: {e}")
-      self.clear_recommendations()
+      return ()
 
-    return self.recommendations
+    self._results.set(key, recommendations)
+    return recommendations
   # endregion
 
   # region create_playlist
@@ -172,7 +214,8 @@ class SpotifyClient:
     ) -> str:
     '''
     Create a playlist in the user's Spotify account based on the recommendations and
-    top user's tracks.
+    top user's tracks. :meth:`AsyncSpotifyClient.create_playlist` runs the same
+    steps concurrently.
 
     Parameters:
     ----------
@@ -189,42 +232,54 @@ class SpotifyClient:
     if not self.sp:
       return None
 
-    # Create the playlist and get the id of it
+    playlist = self.create_empty_playlist(name, description)
+
+    if not playlist:
+      return None
+
+    # Get the recommendations (in process, the top tracks too), both are cached
+    recommendations = self.get_recommendations()
+    top_tracks = self.get_user_top_tracks()
+
+    self.add_tracks_to_playlist(playlist['id'], [*recommendations, *top_tracks])
+
+    return playlist['external_urls']['spotify']
+  # endregion
+
+  # region create_empty_playlist
+  def create_empty_playlist(self, name: str, description: str) -> dict:
+    '''
+    Create an empty public playlist in the user's Spotify account.
+
+    Parameters:
+    ----------
+    name: `str`
+      The name of the playlist.
+    description: `str`
+      The description of the playlist.
+
+    Returns:
+    -------
+    `dict` or `None`
+      The created playlist, with its `id` and `external_urls`.
+    '''
     try:
-      playlist_id = self.sp.user_playlist_create(
-        user=self.sp.me()['id'],
+      return self.sp.user_playlist_create(
+        user=self.current_user_id(),
         name=name,
         description=description,
         public=True
-      )['id']
+      )
     except spotipy.SpotifyException as e:
-      logger.error(f"Failed to create playlist: {e}")
+      logger.error("Failed to create playlist: %s", e)
       print(f"Failed to create playlist: {e}")
       return None
-
-    # If there isn't recommendations, get them (in process, get the top tracks too)
-    if not self.recommendations:
-      try:
-        self.get_recommendations()
-      except spotipy.SpotifyException as e:
-        logger.error("Error getting recommendations: {e}")
-        print(f"Failed to get recommendations: {e}")
-        self.clear_recommendations()
-
-    #  Use the helper method to add tracks to the playlist
-    try:
-      self.add_tracks_to_playlist(playlist_id, self.recommendations)
-      self.add_tracks_to_playlist(playlist_id, self.top_tracks)
-    except spotipy.SpotifyException as e:
-      logger.error(f"Failed to add tracks to playlist: {e}")
-      print(f"Failed to add tracks to playlist: {e}")
-
-    return self.sp.playlist(playlist_id=playlist_id)['external_urls']['spotify']
   # endregion
 
   # region add_tracks_to_playlist
   def add_tracks_to_playlist(self, playlist_id: str, tracks: list) -> None:
     '''Add a list of tracks to a playlist.
+    Repeated tracks are added once, in chunks of the most items the API accepts.
 
     Parameters:
     ----------
@@ -233,29 +288,20 @@ class SpotifyClient:
     tracks: `list`
       The list of tracks to add to the playlist.
     '''
-    track_ids = [track.track_id for track in tracks]
+    # Remove the repeated tracks, keeping the order
+    track_ids = list(dict.fromkeys(track.track_id for track in tracks))
 
     try:
-      self.sp.playlist_add_items(playlist_id, track_ids)
+      for start in range(0, len(track_ids), SPOTIFY_MAX_ITEMS_PER_REQUEST):
+        self.sp.playlist_add_items(
+          playlist_id,
+          track_ids[start:start + SPOTIFY_MAX_ITEMS_PER_REQUEST]
+        )
     except spotipy.SpotifyException as e:
-      logger.error(f"Failed to add tracks to playlist: {e}")
+      logger.error("Failed to add tracks to playlist: %s", e)
       print(f"Failed to add tracks to playlist: {e}")
   # endregion
 
-  # region clear_recommendations and clear_top_tracks
-  def clear_recommendations(self):
-    '''
-    Clear the recommendations attribute.
-    '''
-    self.recommendations = []
-
-  def clear_top_tracks(self):
-    '''
-    Clear the top_tracks attribute.
-    '''
-    self.top_tracks = []
-  # endregion
-
   # region get_current_user_playlists
   def get_current_user_playlists(self, limit: int = 5) -> list:
     '''
@@ -274,25 +320,45 @@ class SpotifyClient:
     if not self.sp:
       return None
 
+    playlists, _ = self.get_current_user_playlists_page(limit)
+    return playlists
+
+  def get_current_user_playlists_page(self, limit: int = 5, offset: int = 0) -> tuple[list, int]:
+    '''
+    Get one page of the user's playlists.
+
+    Parameters:
+    ----------
+    limit: `int`
+      The number of playlists of the page, at most 50. Default is 5.
+    offset: `int`
+      The index of the first playlist of the page. Default is 0.
+
+    Returns:
+    -------
+    `tuple`: (`List[Playlist]`, `int`)
+      The playlists of the page and the total number of playlists of the user.
+      ([], 0) if there was an error.
+    '''
     try:
-      owner = SpotifyUser.from_dict(self.sp.me())
+      owner = self.current_user()
+      page = self.sp.current_user_playlists(limit=limit, offset=offset)
 
       playlists:List[Playlist] = [
-        Playlist.from_dict(item, owner) for item in
-        self.sp.current_user_playlists(limit=limit)['items']
+        Playlist.from_dict(item, owner) for item in page['items']
       ]
-      return playlists
+      return playlists, page['total']
 
     except spotipy.SpotifyException as e:
-      logger.error(f"Failed to get playlists: {e}")
+      logger.error("Failed to get playlists: %s", e)
       print(f"Failed to get playlists: {e}")
-      return []
+      return [], 0
   # endregion
 
   # region get_playlist_from_user_id
   def get_playlist_from_user_id(self, user_id: str, limit: int = 5) -> list:
     '''
-    Get the user's playlists. This method can raise a SpotifyException.
+    Get the user's playlists.
 
     Parameters:
     ----------
@@ -306,24 +372,52 @@ class SpotifyClient:
     `list` or `[]`
       The user's playlists.
     '''
-    try:
-      owner = SpotifyUser.from_dict(self.sp.user(user_id))
-    except SpotifyException as e:
-      logger.error(f"Failed to get user: {e}")
-      print(f"Failed to get user: {e}")
-      return []
+    playlists, _ = self.get_user_playlists_page(user_id, limit)
+    return playlists
+
+  def get_user_playlists_page(
+    self,
+    user_id: str,
+    limit: int = 5,
+    offset: int = 0,
+    owner: SpotifyUser = None
+  ) -> tuple[list, int]:
+    '''
+    Get one page of the playlists of a user.
+
+    Parameters:
+    ----------
+    user_id: `str`
+      The id of the user.
+    limit: `int`
+      The number of playlists of the page, at most 50. Default is 5.
+    offset: `int`
+      The index of the first playlist of the page. Default is 0.
+    owner: `SpotifyUser`
+      The profile of the user, if it is known. Default is requesting it.
+
+    Returns:
+    -------
+    `tuple`: (`List[Playlist]`, `int`)
+      The playlists of the page and the total number of playlists of the user.
+      ([], 0) if there was an error.
+    '''
+    owner = owner or self.get_users_profile(user_id)
+
+    if owner is None:
+      return [], 0
 
     try:
+      page = self.sp.user_playlists(user_id, limit=limit, offset=offset)
+
       playlists:List[Playlist] = [
-        Playlist.from_dict(item, owner) for item in
-        self.sp.user_playlists(user_id,limit)['items']
+        Playlist.from_dict(item, owner) for item in page['items']
       ]
-      return playlists
+      return playlists, page['total']
     except SpotifyException as e:
-      logger.error(f"Failed to create playlist: {e}")
+      logger.error("Failed to get playlists: %s", e)
       print (f"Failed to get playlists: {e}")
-      return []
-
+      return [], 0
   # endregion
 
   # region get_users_profile
@@ -345,7 +439,7 @@ class SpotifyClient:
       user = SpotifyUser.from_dict(self.sp.user(user_id))
       return user
     except spotipy.SpotifyException as e:
-      logger.error(f"Failed to get user's profile: {e}")
+      logger.error("Failed to get user's profile: %s", e)
       print(f"Failed to get user's profile: {e}")
       return None
   # endregion
@@ -1,22 +1,63 @@
 '''
 This module contains the functions to get the weather data from the OpenWeatherMap API.
 '''
+import asyncio
 import aiohttp
 
 from classes.Weather import WeatherData
 
 from utils.apikeys import WEATHER_ENDPOINT, WEATHER_TOKEN
+from utils.cache import TieredCache, normalize_key
+from utils.const import WEATHER_CACHE_SIZE, WEATHER_CACHE_TTL
+from utils.http_client import http_client
+from utils.singleflight import SingleFlight
 
-async def get_weather_data(city:str):
-  '''Get the weather data from the OpenWeatherMap API
+# Parsed weather data by normalized city name
+weather_cache = TieredCache(
+  "weather", maxsize=WEATHER_CACHE_SIZE, ttl=WEATHER_CACHE_TTL, types=(WeatherData,)
+)
+weather_flight = SingleFlight("weather")
+
+async def get_weather_data(city:str, session: aiohttp.ClientSession = None, coalesce: bool = False):
+  '''Get the weather data from the OpenWeatherMap API.
+  The results are cached by normalized city name for `WEATHER_CACHE_TTL` seconds.
 
   Parameters
   ----------
   city: str
       The name of the city to get the weather data from.
+  session: :class:`aiohttp.ClientSession`
+      The session to use for the request. Default is the shared session.
+  coalesce: bool
+      If True, concurrent calls for the same city share one request. Default is False.
   return: :class:`WeatherData` | `None`
       The weather data from the OpenWeatherMap API.
   '''
+  key = normalize_key(city)
+
+  cached = await weather_cache.get(key)
+  if cached is not None:
+    return cached
+
+  if coalesce:
+    return await weather_flight.do(key, _load_weather_data, city, key, session)
+
+  return await _load_weather_data(city, key, session)
+
+async def _load_weather_data(city:str, key:str, session: aiohttp.ClientSession = None):
+  '''Fetch the weather data of a city, parse it and cache it.
+
+  Parameters
+  ----------
+  city: str
+      The name of the city to get the weather data from.
+  key: str
+      The cache key of the city.
+  session: :class:`aiohttp.ClientSession`
+      The session to use for the request.
+  return: :class:`WeatherData` | `None`
+  '''
+
   # Set the parameters for the request
   weather_params = {
       "q": city,
@@ -24,19 +65,20 @@ async def get_weather_data(city:str):
       "units": 'metric'
   }
 
+  session = session or http_client.session
   try:
-    async with aiohttp.ClientSession() as session:
-      async with session.get(WEATHER_ENDPOINT, params=weather_params) as response:
-        response.raise_for_status()  # Raise an exception for 4XX or 5XX errors
-        data = await response.json()
+    async with session.get(WEATHER_ENDPOINT, params=weather_params) as response:
+      response.raise_for_status()  # Raise an exception for 4XX or 5XX errors
+      data = await response.json()
 
-        if data is None:
-          return None
+      if data is None:
+        return None
 
-        # Create a WeatherData object with the fetched data
-        weather_data = WeatherData.from_dict(data)
+      # Create a WeatherData object with the fetched data
+      weather_data = WeatherData.from_dict(data)
+      await weather_cache.set(key, weather_data)
 
-        return weather_data
+      return weather_data
 
-  except aiohttp.ClientError:
+  except (aiohttp.ClientError, asyncio.TimeoutError):
     return None
@@ -0,0 +1,195 @@
+'''
+This file contains the page sources used by the SpotifyPaginationView.
+
+A page source returns the items of a page on demand, so the view doesn't need
+to hold the whole list in memory.
+'''
+import asyncio
+import math
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Sequence
+
+from utils.const import SPOTIFY_PAGE_WINDOW
+from utils.logger_config import logger
+
+
+class ListPageSource:
+  ''' A page source over a list that is already in memory.
+
+  Attributes:
+  -----------
+  items: `Sequence`
+    The items to paginate.
+  per_page: `int`
+    The number of items of each page.
+  '''
+  def __init__(self, items: Sequence, per_page: int = 5):
+    self.items = items
+    self.per_page = per_page
+
+  @property
+  def total(self) -> int:
+    ''' The total number of items. '''
+    return len(self.items)
+
+  @property
+  def page_count(self) -> int:
+    ''' The number of pages. '''
+    return math.ceil(self.total / self.per_page)
+
+  async def prepare(self) -> int:
+    '''
+    Nothing to load, the items are in memory.
+
+    Returns:
+    --------
+    `int`
+      The total number of items.
+    '''
+    return self.total
+
+  async def get_page(self, page: int) -> List:
+    '''
+    Get the items of a page.
+
+    Parameters:
+    -----------
+    page: `int`
+      The number of the page, starting at 1.
+    '''
+    last_item = page * self.per_page
+    return list(self.items[last_item - self.per_page:last_item])
+
+  def close(self):
+    ''' Nothing to release. '''
+
+
+class SpotifyOffsetPageSource:
+  ''' A page source that requests the Spotify offset pages when they are needed.
+
+  The page after the requested one is prefetched in the background, and only
+  the `window` most recently used pages are kept in memory. The number of pages
+  comes from the `total` of the API response.
+
+  Attributes:
+  -----------
+  fetch_page: `Callable[[int, int], Awaitable[tuple[list, int]]]`
+    A coroutine function that receives `limit` and `offset` and returns the
+    items of the page and the total number of items.
+  per_page: `int`
+    The number of items of each page, at most 50.
+  window: `int`
+    The number of pages kept in memory.
+  '''
+  def __init__(
+    self,
+    fetch_page: Callable[[int, int], Awaitable[tuple[list, int]]],
+    per_page: int = 5,
+    window: int = SPOTIFY_PAGE_WINDOW
+  ):
+    self.fetch_page = fetch_page
+    self.per_page = per_page
+    self.window = window
+    self.total = 0
+    # page -> items, ordered from the least to the most recently used
+    self._pages: OrderedDict[int, List] = OrderedDict()
+    self._tasks: dict[int, asyncio.Task] = {}
+
+  @property
+  def page_count(self) -> int:
+    ''' The number of pages, from the total of the last response. '''
+    return math.ceil(self.total / self.per_page)
+
+  # region prepare
+  async def prepare(self) -> int:
+    '''
+    Load the first page, to know the total number of items.
+
+    Returns:
+    --------
+    `int`
+      The total number of items.
+    '''
+    await self._load(1)
+    return self.total
+  # endregion
+
+  # region get_page
+  async def get_page(self, page: int) -> List:
+    '''
+    Get the items of a page and prefetch the next one.
+
+    Parameters:
+    -----------
+    page: `int`
+      The number of the page, starting at 1.
+    '''
+    items = await self._load(page)
+    self.prefetch(page + 1)
+    return items
+
+  def prefetch(self, page: int):
+    '''
+    Start loading a page in the background, if it isn't loaded or loading.
+
+    Parameters:
+    -----------
+    page: `int`
+      The number of the page, starting at 1.
+    '''
+    if 1 <= page <= self.page_count and page not in self._pages and page not in self._tasks:
+      self._start(page)
+  # endregion
+
+  # region close
+  def close(self):
+    '''
+    Cancel the pending requests and release the pages.
+    '''
+    for task in self._tasks.values():
+      task.cancel()
+
+    self._tasks.clear()
+    self._pages.clear()
+  # endregion
+
+  # region loading
+  async def _load(self, page: int) -> List:
+    if page in self._pages:
+      self._pages.move_to_end(page)
+      return self._pages[page]
+
+    task = self._tasks.get(page) or self._start(page)
+    return await asyncio.shield(task)
+
+  def _start(self, page: int) -> asyncio.Task:
+    task = asyncio.create_task(self._fetch(page))
+    self._tasks[page] = task
+    task.add_done_callback(lambda done: self._on_fetched(page, done))
+    return task
+
+  def _on_fetched(self, page: int, task: asyncio.Task):
+    self._tasks.pop(page, None)
+
+    # Retrieve the error of the prefetches nobody awaited
+    if not task.cancelled() and task.exception() is not None:
+      logger.error("Failed to load page %s: %s", page, task.exception())
+
+  async def _fetch(self, page: int) -> List:
+    result = await self.fetch_page(self.per_page, (page - 1) * self.per_page)
+
+    # The client returns None when the request timed out
+    if result is None:
+      return []
+
+    items, self.total = result
+
+    if items:
+      self._pages[page] = items
+      self._pages.move_to_end(page)
+
+      while len(self._pages) > self.window:
+        self._pages.popitem(last=False)
+
+    return items
+  # endregion
@@ -2,80 +2,202 @@
 This file contains the SpotifyPaginationView class.
 '''
 
-import math
+import asyncio
+from collections import OrderedDict
+
 import discord
 
 from typing import List
 from discord import Embed, Interaction, Button
-from discord.ui import View
 from classes.spotify import Playlist, Track
+from embeds.common_embeds import create_error_embed
 from embeds.spotify_embeds import create_playlists_embed, create_tracks_embed
+from ui.spotify_page_sources import ListPageSource, SpotifyOffsetPageSource
+from ui.traced_view import TracedView
+from utils.const import SPOTIFY_EMBED_CACHE_SIZE
 
-class SpotifyPaginationView(View):
+class SpotifyPaginationView(TracedView):
   ''' A class used to represent the SpotifyPaginationView. 
   
   Attributes:
   -----------
   data: `List[Track]` or `List[Playlist]`
-    The data to display.
+    The data to display, if it is already in memory.
   is_recommendation: `bool` or `None`
     True if the data is `recommendation`, false if the dat is `top tracks`.
     None if the data is `playlist`.
+  source: `ListPageSource` or `SpotifyOffsetPageSource`
+    The pages to display, used instead of `data` to load them on demand.
+
+  The embed of each page is rendered once, and the neighbouring pages are
+  rendered ahead. Clicks that arrive while the message is being edited only
+  move the current page; the next edit sends the latest one.
   '''
   def __init__(
     self,
-    data: List[Track] | List[Playlist],
-    is_recommendation: bool | None = False
+    data: List[Track] | List[Playlist] = None,
+    is_recommendation: bool | None = False,
+    source: ListPageSource | SpotifyOffsetPageSource = None
   ):
     super().__init__(timeout=180)
-    self.data = data
-    self.sep = 5
+    self.source = source or ListPageSource(data)
     self.current_page = 1
+    # The page on the message, the current page goes back to it if a page fails
+    self._shown_page = 1
     self.interaction = None
     self.is_recommendation = is_recommendation
+    # page -> embed, ordered from the least to the most recently used
+    self._embeds: OrderedDict[int, Embed] = OrderedDict()
+    self._prerender_tasks: set[asyncio.Task] = set()
+    self._is_updating = False
+    self._is_outdated = False
+    self._clicked: Interaction | None = None
 
   # region send_view_and_embed
   async def send_view_and_embed(self, interaction: Interaction):
     '''
-    Save the current message to edit it later, and send the view to the interaction.
+    Send the first page with the view to the interaction, and save the message
+    to edit it later. If the first page can't be loaded, an error is sent instead.
 
     Parameters:
     -----------
     interaction: `Interaction`
       The interaction object.
     '''
-    # Send the view, save the message to edit it later
-    self.interaction = await interaction.send(view=self)
+    embed = await self.render_page(self.current_page)
+
+    if embed is None:
+      self.stop()
+      self.source.close()
+      await interaction.send(
+        embed=create_error_embed("Spotify", "The page couldn't be loaded, try again later.")
+      )
+      return
+
+    self.update_buttons()
+
+    # Send the page and the view at once, save the message to edit it later
+    self.interaction = await interaction.send(embed=embed, view=self)
 
-    await self.update_message(self.data[:self.sep])
+    self.prerender_pages(self.current_page + 1)
+  # endregion
+
+  # region on_timeout
+  async def on_timeout(self):
+    '''
+    Release the pages when the buttons stop working.
+    '''
+    for task in self._prerender_tasks:
+      task.cancel()
+
+    self._embeds.clear()
+    self.source.close()
   # endregion
 
   #region update_message
-  async def update_message(self, data):
+  async def update_message(self, interaction: Interaction):
     '''
-    Update the message with the new data.
+    Update the message with the current page.
+
+    If an edit is already in progress, the page is sent when it finishes, so
+    rapid clicks result in one edit with the latest page. If the page can't be
+    loaded, the current page goes back to the one on the message and the user
+    is told.
 
     Parameters:
     -----------
-    data: `List[Track]` or `List[Playlist]`
-      The data to update the message with.    
+    interaction: `Interaction`
+      The interaction of the button clicked.
     '''
-    # Update the buttons based on the current page
-    self.update_buttons()
+    self._clicked = interaction
+    self._is_outdated = True
+
+    if self._is_updating:
+      return
+
+    self._is_updating = True
+    try:
+      while self._is_outdated:
+        self._is_outdated = False
+        page = self.current_page
+
+        embed = await self.render_page(page)
+
+        # The page couldn't be loaded, keep the previous embed. A newer click
+        # is sent by the next iteration, otherwise go back to the page shown
+        if embed is None:
+          if not self._is_outdated:
+            self.current_page = self._shown_page
+            await self._clicked.followup.send("The page couldn't be loaded, try again later.", ephemeral=True)
+          continue
 
-    embed: Embed = None
+        # Update the buttons based on the current page
+        self.update_buttons()
+
+        # Update the previous embed with the new data
+        await self.interaction.edit(embed=embed, view=self)
+        self._shown_page = page
+
+        self.prerender_pages(page - 1, page + 1)
+    finally:
+      self._is_updating = False
+  # endregion
+
+  # region render_page
+  async def render_page(self, page: int) -> Embed | None:
+    '''
+    Get the embed of a page, rendering it the first time.
+
+    Parameters:
+    -----------
+    page: `int`
+      The number of the page.
+
+    Returns:
+    --------
+    `Embed` or `None`
+      The embed of the page, or None if the page couldn't be loaded.
+    '''
+    embed = self._embeds.get(page)
+
+    if embed is not None:
+      self._embeds.move_to_end(page)
+      return embed
+
+    data = await self.source.get_page(page)
+
+    if not data:
+      return None
 
     if isinstance(data[0], Track):
       embed = create_tracks_embed(
         tracks=data,
         is_recommendation=self.is_recommendation,
-        page=self.current_page
+        page=page
       )
     else:
-      embed = create_playlists_embed(playlists=data, page=self.current_page)
-    
-    # Update the previous embed with the new data
-    await self.interaction.edit(embed=embed, view=self)
+      embed = create_playlists_embed(playlists=data, page=page)
+
+    self._embeds[page] = embed
+    while len(self._embeds) > SPOTIFY_EMBED_CACHE_SIZE:
+      self._embeds.popitem(last=False)
+
+    return embed
+
+  def prerender_pages(self, *pages: int):
+    '''
+    Render pages in the background, so the next clicks find them ready.
+
+    Parameters:
+    -----------
+    pages: `int`
+      The numbers of the pages. The ones out of range or rendered are skipped.
+    '''
+    for page in pages:
+      if 1 <= page <= self.source.page_count and page not in self._embeds:
+        task = asyncio.create_task(self.render_page(page))
+        self._prerender_tasks.add(task)
+        task.add_done_callback(self._prerender_tasks.discard)
   # endregion
 
   # region update_buttons
@@ -97,9 +219,9 @@ class SpotifyPaginationView(View):
   
   def update_buttons(self):
     '''Update the buttons based on the current page.'''
-    is_more_data = len(self.data) <= self.sep
+    is_more_data = self.source.page_count <= 1
     is_first_page = self.current_page == 1
-    is_last_page = self.current_page == math.ceil(len(self.data) / self.sep)
+    is_last_page = self.current_page >= self.source.page_count
 
     self.update_button(
       self.first_page_button,
@@ -127,28 +249,6 @@ class SpotifyPaginationView(View):
     )
   # endregion
 
-  # region get_current_page_data
-  def get_current_page_data(self):
-    '''
-    Get the current page data.
-
-    Returns:
-    --------
-    `List[Track]` or `List[Playlist]`
-      The current page data.
-    '''
-    # Get the first and last item based on the current page
-    last_item = self.current_page * self.sep
-    first_item = last_item - self.sep
-
-    # If the current page is the last page, set the first and last item
-    if self.current_page == math.ceil(len(self.data) / self.sep):
-      first_item = self.current_page * self.sep - self.sep
-      last_item = len(self.data)
-    
-    return self.data[first_item:last_item]
-  # endregion
-
   # region buttons
   @discord.ui.button(label="🤛🏻", style=discord.ButtonStyle.green)
   async def first_page_button(
@@ -158,7 +258,7 @@ class SpotifyPaginationView(View):
   ):
     await interaction.response.defer()
     self.current_page = 1
-    await self.update_message(self.get_current_page_data())
+    await self.update_message(interaction)
 
   @discord.ui.button(label="👈🏻", style=discord.ButtonStyle.blurple)
   async def prev_button(
@@ -167,8 +267,8 @@ class SpotifyPaginationView(View):
     interaction: Interaction
   ):
     await interaction.response.defer()
-    self.current_page -= 1
-    await self.update_message(self.get_current_page_data())
+    self.current_page = max(self.current_page - 1, 1)
+    await self.update_message(interaction)
 
   @discord.ui.button(label="👉🏻", style=discord.ButtonStyle.blurple)
   async def next_button(
@@ -177,8 +277,8 @@ class SpotifyPaginationView(View):
     interaction: Interaction
   ):
     await interaction.response.defer()
-    self.current_page += 1
-    await self.update_message(self.get_current_page_data())
+    self.current_page = min(self.current_page + 1, self.source.page_count)
+    await self.update_message(interaction)
 
   @discord.ui.button(label="🤜🏻", style=discord.ButtonStyle.green)
   async def last_page_button(
@@ -187,6 +287,7 @@ class SpotifyPaginationView(View):
     interaction:discord.Interaction
   ):
     await interaction.response.defer()
-    self.current_page = math.ceil(len(self.data) / self.sep)
-    await self.update_message(self.get_current_page_data())
+    # The number of pages comes from the API total, nothing else is loaded
+    self.current_page = self.source.page_count
+    await self.update_message(interaction)
   # endregion
@@ -0,0 +1,23 @@
+'''
+This module contains the base view that keeps the correlation id of its command.
+'''
+from discord import Interaction
+from discord.ui import View
+
+from utils.log_context import get_correlation_id, set_correlation_id
+
+
+class TracedView(View):
+  '''
+  A view whose callbacks log with the correlation id of the command that created it.
+
+  The clicks are dispatched in new tasks without the id, so it is captured when
+  the view is created and set again before each callback.
+  '''
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.correlation_id = get_correlation_id()
+
+  async def interaction_check(self, interaction: Interaction) -> bool:
+    set_correlation_id(self.correlation_id)
+    return await super().interaction_check(interaction)
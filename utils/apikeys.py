@@ -24,8 +24,45 @@ WEATHER_ENDPOINT = os.getenv('WEATHER_ENDPOINT')
 ROCKET_LEAGUE_ENDPOINT = os.getenv('ROCKET_LEAGUE_ENDPOINT')
 GOOGLE_BOOKS_ENDPOINT = os.getenv('GOOGLE_BOOKS_ENDPOINT')
 
+# Redis, used as the shared cache between bot processes.
+# `memory://` uses an in-process fake, leave it empty to disable the shared cache
+REDIS_URL = os.getenv('REDIS_URL')
+
+# The folder of the state the bot saves, like the triggers of each guild
+DATA_DIR = os.getenv('DATA_DIR', 'data')
+
+# Logging: the level of the bot's logger, the levels of other loggers
+# (`discord.gateway=WARNING,discord.http=INFO`), the rotation (`size` or `time`)
+# and the file, each worker of a cluster has its own
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG')
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+LOG_ROTATION = os.getenv('LOG_ROTATION', 'size')
+LOG_FILE = os.getenv('LOG_FILE', 'discord.log')
+# The format of the log file (`text` or `json`) and the sample rates of the
+# high-volume events (`on_message=0.01`)
+LOG_MODE = os.getenv('LOG_MODE', 'text')
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')
+
 # Spotify API
 SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
 SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
 # Discord id of the user who is authorized to use the Spotify commands
 YOUR_USER_ID = os.getenv('YOUR_USER_ID')
+
+# Port of the local metrics exporter (Prometheus text format), 0 to disable it
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# The intents and the cache of the bot: `minimal`, `balanced` or `full` (see utils/gateway_profile.py)
+GATEWAY_PROFILE = os.getenv('GATEWAY_PROFILE', 'minimal')
+
+# Sharding: `AUTO_SHARD=true` runs the bot as an AutoShardedBot. SHARD_COUNT is the
+# total of shards (empty for Discord's recommendation) and SHARD_IDS the shards
+# of this process (`0-3,8`, empty for all of them)
+AUTO_SHARD = os.getenv('AUTO_SHARD', 'false').strip().lower() in ('1', 'true', 'yes')
+SHARD_COUNT = int(os.getenv('SHARD_COUNT') or 0) or None
+SHARD_IDS = os.getenv('SHARD_IDS', '')
+
+# Cluster: set by `cluster.py` for each worker, the id of the worker and the
+# address of the launcher's hub (`127.0.0.1:9200`). Empty when the bot runs alone
+CLUSTER_WORKER_ID = os.getenv('CLUSTER_WORKER_ID', '')
+CLUSTER_HUB = os.getenv('CLUSTER_HUB', '')
@@ -0,0 +1,272 @@
+'''
+This module contains the static assets of the bot, the images in `images/`.
+
+Each asset is uploaded once: the first message attaches the file and its CDN URL
+is recorded, the next ones only put the URL in their embed. Discord signs the CDN
+URLs with an expiry (the `ex` parameter), the asset is uploaded again when it
+gets close.
+
+At startup the GIFs are scaled down to the width of an embed image and saved
+with Pillow's optimizer in `images/optimized/`, when Pillow is installed. A
+variant is only used if it is smaller, and the bytes saved are logged and
+exported. The variants are kept for the next startups, until the image changes.
+'''
+import asyncio
+import os
+import time
+from urllib.parse import parse_qs, urlparse
+
+import discord
+
+try:
+  from PIL import Image, ImageSequence
+except ImportError: # The optimized variants are optional
+  Image = None
+
+from utils.const import ASSET_MAX_WIDTH, ASSET_URL_MARGIN, ASSET_URL_TTL, ASSET_VARIANTS_DIR, ASSETS_DIR
+from utils.logger_config import logger
+from utils.metrics import asset_bytes_saved, asset_uploads
+
+def parse_expiry(url: str) -> float:
+  '''
+  Get when a CDN URL expires.
+
+  Parameters
+  ----------
+  url: `str`
+      The URL of an attachment, with its `ex` parameter (a hexadecimal timestamp).
+  return: `float`
+      The unix time of the expiry, :data:`ASSET_URL_TTL` from now if the URL has none.
+  '''
+  expiry = parse_qs(urlparse(url).query).get("ex")
+
+  try:
+    return float(int(expiry[0], 16))
+  except (TypeError, ValueError):
+    return time.time() + ASSET_URL_TTL
+
+
+class StaticAsset:
+  '''
+  An image sent by the bot.
+
+  Attributes
+  ----------
+  name: `str`
+      The name of the asset, the name of its file without extension.
+  path: `str`
+      The original file.
+  variant: `str` | `None`
+      The size-optimized file, `None` until it is made or if it isn't smaller.
+  url: `str` | `None`
+      The CDN URL of the last upload.
+  expires_at: `float`
+      The unix time when the URL expires.
+  '''
+  __slots__ = ("name", "path", "variant", "url", "expires_at")
+
+  def __init__(self, name: str, path: str):
+    self.name = name
+    self.path = path
+    self.variant: str | None = None
+    self.url: str | None = None
+    self.expires_at = 0.0
+
+  @property
+  def filename(self) -> str:
+    ''' The name of the attachment. '''
+    return os.path.basename(self.path)
+
+  @property
+  def source(self) -> str:
+    ''' The file uploaded, the variant if there is one. '''
+    return self.variant or self.path
+
+  def valid_url(self) -> str | None:
+    '''
+    Get the CDN URL, `None` if there is none or it is about to expire.
+    '''
+    if self.url is not None and time.time() < self.expires_at - ASSET_URL_MARGIN:
+      return self.url
+
+    return None
+
+
+class AssetManager:
+  '''
+  The static assets of the bot, by name.
+
+  Parameters
+  ----------
+  directory: `str`
+      The folder of the assets.
+  variants_directory: `str`
+      The folder of the size-optimized variants.
+  max_width: `int`
+      The width of the variants, in pixels.
+  '''
+  def __init__(
+    self,
+    directory: str = ASSETS_DIR,
+    variants_directory: str = ASSET_VARIANTS_DIR,
+    max_width: int = ASSET_MAX_WIDTH
+  ):
+    self.directory = directory
+    self.variants_directory = variants_directory
+    self.max_width = max_width
+    self.assets: dict[str, StaticAsset] = {}
+
+    if os.path.isdir(directory):
+      for filename in sorted(os.listdir(directory)):
+        name, extension = os.path.splitext(filename)
+        if extension.lower() in (".gif", ".png", ".jpg", ".jpeg", ".webp"):
+          self.assets[name] = StaticAsset(name, os.path.join(directory, filename))
+
+  def get(self, name: str) -> StaticAsset:
+    '''
+    Get an asset by name. Raises `KeyError` if there is no such asset.
+    '''
+    return self.assets[name]
+
+  # region messages
+  def attach(self, name: str, embed: discord.Embed) -> dict:
+    '''
+    Set an asset as the image of an embed.
+
+    Parameters
+    ----------
+    name: `str`
+        The name of the asset.
+    embed: :class:`discord.Embed`
+        The embed of the message.
+    return: `dict`
+        The keyword arguments of the message: the embed, and the file if the
+        asset has to be uploaded.
+    '''
+    asset = self.get(name)
+    url = asset.valid_url()
+
+    if url is not None:
+      embed.set_image(url=url)
+      return {"embed": embed}
+
+    embed.set_image(url=f"attachment://{asset.filename}")
+    return {"embed": embed, "file": discord.File(asset.source, filename=asset.filename)}
+
+  async def record(self, name: str, interaction: discord.Interaction):
+    '''
+    Record the CDN URL of an asset uploaded by the response of an interaction,
+    if there is no valid URL yet. It fetches the message, only after an upload.
+    This is an asynchronous function and should be called with 'await'.
+    '''
+    asset = self.get(name)
+    if asset.valid_url() is not None:
+      return
+
+    try:
+      message = await interaction.original_message()
+    except discord.HTTPException as e:
+      logger.warning("Failed to fetch the upload of the asset %s: %s", name, e)
+      return
+
+    for attachment in message.attachments:
+      if attachment.filename == asset.filename:
+        asset.url = attachment.url
+        asset.expires_at = parse_expiry(attachment.url)
+        asset_uploads.inc(asset=name)
+        logger.info("Asset %s uploaded, its URL is reused until %s", name, time.ctime(asset.expires_at))
+        return
+  # endregion
+
+  # region variants
+  async def optimize(self) -> int:
+    '''
+    Make the size-optimized variants of the GIFs in a thread, if Pillow is installed.
+    This is an asynchronous function and should be called with 'await'.
+
+    return: `int`
+        The bytes saved by the variants.
+    '''
+    if Image is None:
+      logger.info("Pillow isn't installed, the assets are sent as they are")
+      return 0
+
+    saved = await asyncio.to_thread(self._optimize_all)
+    logger.info("Asset variants saved %.1f MiB", saved / 1024 / 1024)
+    return saved
+
+  def _optimize_all(self) -> int:
+    os.makedirs(self.variants_directory, exist_ok=True)
+    saved = 0
+
+    for asset in self.assets.values():
+      if not asset.path.lower().endswith(".gif"):
+        continue
+
+      try:
+        saved += self._optimize(asset)
+      except (OSError, ValueError) as e:
+        logger.warning("Failed to optimize the asset %s: %s", asset.name, e)
+
+    return saved
+
+  def _optimize(self, asset: StaticAsset) -> int:
+    variant = os.path.join(self.variants_directory, asset.filename)
+
+    # The variant of a previous startup is kept while the image doesn't change
+    if not os.path.exists(variant) or os.path.getmtime(variant) < os.path.getmtime(asset.path):
+      transcode_gif(asset.path, variant, self.max_width)
+
+    size, variant_size = os.path.getsize(asset.path), os.path.getsize(variant)
+    saved = max(size - variant_size, 0)
+
+    if saved:
+      asset.variant = variant
+
+    asset_bytes_saved.set(saved, asset=asset.name)
+    logger.debug("Asset %s: %s bytes, variant %s bytes", asset.name, size, variant_size)
+    return saved
+  # endregion
+
+def transcode_gif(source: str, destination: str, max_width: int):
+  '''
+  Save a GIF scaled down to a width, with Pillow's optimizer.
+
+  Parameters
+  ----------
+  source: `str`
+      The original GIF.
+  destination: `str`
+      The file of the variant.
+  max_width: `int`
+      The width of the variant, narrower GIFs keep their size.
+  '''
+  # Write a temporary file and replace the old one, so a crash can't leave half
+  # a variant that would look newer and smaller than the image
+  temp_path = f"{destination}.tmp"
+
+  with Image.open(source) as image:
+    scale = min(max_width / image.width, 1)
+    size = (max(round(image.width * scale), 1), max(round(image.height * scale), 1))
+    frames, durations = [], []
+
+    for frame in ImageSequence.Iterator(image):
+      durations.append(frame.info.get("duration", image.info.get("duration", 100)))
+      frame = frame.convert("RGBA")
+      frames.append(frame.resize(size, Image.LANCZOS) if scale < 1 else frame)
+
+    frames[0].save(
+      temp_path,
+      format="GIF",
+      save_all=True,
+      append_images=frames[1:],
+      optimize=True,
+      duration=durations,
+      loop=image.info.get("loop", 0),
+      disposal=2,
+    )
+
+  os.replace(temp_path, destination)
+
+# The assets of the bot, optimized from `main.py`
+assets = AssetManager()
@@ -0,0 +1,494 @@
+'''
+This module contains the caches used by the services.
+
+- :class:`TTLCache`: a bounded in-memory cache.
+- :class:`TieredCache`: an in-memory cache (L1) in front of Redis (L2), so the
+  results fetched by one bot process are reused by the others. The entries it
+  stores again or deletes are announced to the invalidation listeners once L2 is
+  updated, so the other processes of a cluster drop their copy from L1 and read
+  the new value from L2.
+'''
+import asyncio
+import json
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+try:
+  import redis.asyncio as aioredis
+  from redis.exceptions import RedisError
+except ImportError: # The shared cache is optional
+  aioredis = None
+
+  class RedisError(Exception):
+    ''' Placeholder used when `redis` is not installed. '''
+
+from utils.apikeys import REDIS_URL
+from utils.const import CACHE_COMPRESS_MIN_SIZE
+from utils.logger_config import logger
+from utils.metrics import cache_requests
+
+_MISSING = object()
+
+class TTLCache:
+  '''
+  A bounded cache with LRU eviction where every entry expires after `ttl` seconds.
+  It is safe to use from worker threads.
+
+  Parameters
+  ----------
+  maxsize: `int`
+      The maximum number of entries. The least recently used entry is evicted
+      when a new one doesn't fit.
+  ttl: `float`
+      The seconds an entry is valid after being stored.
+  '''
+  def __init__(self, maxsize: int, ttl: float):
+    if maxsize <= 0:
+      raise ValueError("maxsize must be greater than 0")
+
+    self.maxsize = maxsize
+    self.ttl = ttl
+    # key -> (expires_at, value), ordered from the least to the most recently used
+    self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self._data)
+
+  def __contains__(self, key: Hashable):
+    return self.get(key, _MISSING) is not _MISSING
+
+  # region get
+  def get(self, key: Hashable, default: Any = None) -> Any:
+    '''
+    Get the value of a key, or `default` if it is missing or expired.
+
+    Parameters
+    ----------
+    key: `Hashable`
+        The key of the entry.
+    default: `Any`
+        The value returned on a miss.
+    '''
+    with self._lock:
+      entry = self._data.get(key)
+
+      if entry is None:
+        return default
+
+      expires_at, value = entry
+      if expires_at <= time.monotonic():
+        del self._data[key]
+        return default
+
+      self._data.move_to_end(key)
+      return value
+  # endregion
+
+  # region set
+  def set(self, key: Hashable, value: Any, ttl: float | None = None):
+    '''
+    Store a value, evicting the least recently used entry if the cache is full.
+
+    Parameters
+    ----------
+    key: `Hashable`
+        The key of the entry.
+    value: `Any`
+        The value to store.
+    ttl: `float` or `None`
+        The seconds the entry is valid. Default is the cache's ttl.
+    '''
+    ttl = self.ttl if ttl is None else ttl
+
+    with self._lock:
+      self._data[key] = (time.monotonic() + ttl, value)
+      self._data.move_to_end(key)
+
+      while len(self._data) > self.maxsize:
+        self._data.popitem(last=False)
+  # endregion
+
+  # region delete and clear
+  def delete(self, key: Hashable):
+    '''
+    Remove a key from the cache, if it exists.
+    '''
+    with self._lock:
+      self._data.pop(key, None)
+
+  def clear(self):
+    '''
+    Remove all the entries.
+    '''
+    with self._lock:
+      self._data.clear()
+  # endregion
+
+# region normalize_key
+def normalize_key(text: str) -> str:
+  '''
+  Normalize a free text key, so `"  Córdoba"`, `"cordoba"` and `"CORDOBA "` are the same entry.
+  Accents are removed, the case is folded and the whitespace is collapsed.
+
+  Parameters
+  ----------
+  text: `str`
+      The text to normalize.
+  return: `str`
+  '''
+  decomposed = unicodedata.normalize("NFKD", text)
+  without_accents = "".join(char for char in decomposed if not unicodedata.combining(char))
+  return " ".join(without_accents.casefold().split())
+# endregion
+
+# region serialization
+# The first byte of a stored value tells if the rest is compressed
+_RAW = b"\x00"
+_COMPRESSED = b"\x01"
+# The key that holds the type of an object in the stored JSON
+_TYPE_KEY = "__type__"
+
+def type_name(cls: type) -> str:
+  ''' The name of a class in the stored values, with its module. '''
+  return f"{cls.__module__}.{cls.__qualname__}"
+
+def serialize(value: Any, types: dict[str, type] = None) -> bytes:
+  '''
+  Serialize a value to store it in Redis, as JSON. Values bigger than
+  `CACHE_COMPRESS_MIN_SIZE` bytes are compressed.
+
+  The objects are stored as their attributes and their type, only the types of
+  the cache are accepted. Unlike pickle, reading a value can't run code, even if
+  someone else writes to the Redis instance.
+
+  Parameters
+  ----------
+  value: `Any`
+      The value to serialize: JSON values and objects of the types.
+  types: `dict[str, type]`
+      The classes of the objects, by :func:`type_name`.
+  return: `bytes`
+  '''
+  types = types or {}
+
+  def encode_object(obj: Any) -> dict:
+    name = type_name(type(obj))
+
+    if types.get(name) is not type(obj):
+      raise TypeError(f"{name} can't be stored in the shared cache")
+
+    return {_TYPE_KEY: name, **vars(obj)}
+
+  data = json.dumps(value, default=encode_object, separators=(",", ":")).encode("utf-8")
+
+  if len(data) >= CACHE_COMPRESS_MIN_SIZE:
+    return _COMPRESSED + zlib.compress(data)
+
+  return _RAW + data
+
+def deserialize(data: bytes, types: dict[str, type] = None) -> Any:
+  '''
+  Deserialize a value created by :func:`serialize`. Raises `ValueError` if the
+  value is corrupt or has an unknown type, like a value of another version of the bot.
+
+  Parameters
+  ----------
+  data: `bytes`
+      The stored value.
+  types: `dict[str, type]`
+      The classes of the objects, by :func:`type_name`.
+  return: `Any`
+  '''
+  types = types or {}
+  flag, payload = data[:1], data[1:]
+
+  def decode_object(attributes: dict) -> Any:
+    if _TYPE_KEY not in attributes:
+      return attributes
+
+    cls = types.get(attributes.pop(_TYPE_KEY))
+    if cls is None:
+      raise ValueError("Unknown type in the shared cache")
+
+    # The attributes are restored as they were, without the constructor
+    obj = cls.__new__(cls)
+    obj.__dict__.update(attributes)
+    return obj
+
+  if flag == _COMPRESSED:
+    try:
+      payload = zlib.decompress(payload)
+    except zlib.error as err:
+      raise ValueError(f"Corrupt compressed value: {err}") from err
+  elif flag != _RAW:
+    raise ValueError("Unknown value format")
+
+  return json.loads(payload, object_hook=decode_object)
+# endregion
+
+# region InMemoryRedis
+class InMemoryRedis:
+  '''
+  A fake of the few `redis.asyncio.Redis` methods used by :class:`TieredCache`.
+  It is used with `REDIS_URL=memory://` to run without a Redis server.
+  '''
+  def __init__(self):
+    # key -> (expires_at or None, value)
+    self._data: dict[str, tuple[float | None, bytes]] = {}
+
+  async def get(self, name: str) -> bytes | None:
+    ''' Get the value of a key, or `None` if it is missing or expired. '''
+    entry = self._data.get(name)
+
+    if entry is None:
+      return None
+
+    expires_at, value = entry
+    if expires_at is not None and expires_at <= time.monotonic():
+      del self._data[name]
+      return None
+
+    return value
+
+  async def set(self, name: str, value: bytes, px: int | None = None):
+    ''' Store a value, `px` is the time to live in milliseconds. '''
+    expires_at = time.monotonic() + px / 1000 if px else None
+    self._data[name] = (expires_at, value)
+    return True
+
+  async def delete(self, *names: str) -> int:
+    ''' Remove the keys, returns the number of removed keys. '''
+    return sum(self._data.pop(name, None) is not None for name in names)
+
+  async def aclose(self):
+    ''' Remove all the keys. '''
+    self._data.clear()
+# endregion
+
+# region shared redis client
+_redis = None
+
+def get_redis():
+  '''
+  Get the Redis client shared by the caches, created from `REDIS_URL` on first use.
+
+  return: `redis.asyncio.Redis`, :class:`InMemoryRedis` or `None`
+      `None` if the shared cache is disabled or `redis` is not installed.
+  '''
+  global _redis
+
+  if _redis is None and REDIS_URL:
+    if REDIS_URL.startswith("memory://"):
+      _redis = InMemoryRedis()
+    elif aioredis is None:
+      logger.warning("REDIS_URL is set but redis is not installed, the shared cache is disabled")
+    else:
+      _redis = aioredis.from_url(REDIS_URL)
+
+  return _redis
+
+async def close_redis():
+  '''
+  Close the shared Redis client.
+  This is an asynchronous function and should be called with 'await'.
+  '''
+  global _redis
+
+  if _redis is not None:
+    await _redis.aclose()
+
+  _redis = None
+# endregion
+
+# region invalidation
+# namespace -> cache, to apply the deletions made by other bot processes
+_caches: dict[str, "TieredCache"] = {}
+_invalidation_listeners: list[Callable[[str, Hashable], Awaitable[None]]] = []
+
+def add_invalidation_listener(listener: Callable[[str, Hashable], Awaitable[None]]):
+  '''
+  Await a listener with the namespace and the key of every entry stored or
+  deleted by a :class:`TieredCache`, to tell the other bot processes.
+  '''
+  _invalidation_listeners.append(listener)
+
+def remove_invalidation_listener(listener: Callable[[str, Hashable], Awaitable[None]]):
+  '''
+  Stop calling a listener added with :func:`add_invalidation_listener`.
+  '''
+  if listener in _invalidation_listeners:
+    _invalidation_listeners.remove(listener)
+
+def invalidate_local(namespace: str, key: Hashable) -> bool:
+  '''
+  Drop an entry from the L1 of this process only, because another process deleted it.
+
+  Parameters
+  ----------
+  namespace: `str`
+      The namespace of the cache.
+  key: `Hashable`
+      The key of the entry.
+  return: `bool`
+      False if there is no cache with that namespace.
+  '''
+  cache = _caches.get(namespace)
+
+  if cache is None:
+    return False
+
+  cache.local.delete(key)
+  return True
+# endregion
+
+# region TieredCache
+class TieredCache:
+  '''
+  An in-memory :class:`TTLCache` (L1) in front of Redis (L2).
+
+  Values are looked up in L1 first, then in L2. A hit in L2 is copied to L1.
+  If Redis fails the cache keeps working with L1 only.
+
+  Parameters
+  ----------
+  namespace: `str`
+      The prefix of the Redis keys, so different caches don't collide.
+  maxsize: `int`
+      The maximum number of entries kept in memory.
+  ttl: `float`
+      The seconds an entry is valid.
+  redis: `redis.asyncio.Redis` or :class:`InMemoryRedis` or `None`
+      The L2 client. Default is the shared client from :func:`get_redis`.
+  types: `tuple[type, ...]`
+      The classes of the objects stored in L2, see :func:`serialize`.
+  '''
+  def __init__(self, namespace: str, maxsize: int, ttl: float, redis=None, types: tuple[type, ...] = ()):
+    self.namespace = namespace
+    self.ttl = ttl
+    self.types = {type_name(cls): cls for cls in types}
+    self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+    self._redis = redis
+    _caches[namespace] = self
+
+  @property
+  def redis(self):
+    ''' The L2 client, or `None` if the shared cache is disabled. '''
+    return self._redis if self._redis is not None else get_redis()
+
+  async def _invalidate_others(self, key: Hashable):
+    for listener in _invalidation_listeners:
+      try:
+        await listener(self.namespace, key)
+      except Exception as err:
+        logger.warning("Invalidation of %s:%s not sent: %s", self.namespace, key, err)
+
+  def _redis_key(self, key: Hashable) -> str:
+    return f"{self.namespace}:{key}"
+
+  # region get
+  async def get(self, key: Hashable, default: Any = None) -> Any:
+    '''
+    Get the value of a key from L1 or L2, or `default` on a miss.
+    This is an asynchronous function and should be called with 'await'.
+
+    Parameters
+    ----------
+    key: `Hashable`
+        The key of the entry.
+    default: `Any`
+        The value returned on a miss.
+    '''
+    value = self.local.get(key, _MISSING)
+    if value is not _MISSING:
+      cache_requests.inc(cache=self.namespace, tier="l1", result="hit")
+      return value
+
+    cache_requests.inc(cache=self.namespace, tier="l1", result="miss")
+
+    redis = self.redis
+    if redis is None:
+      return default
+
+    try:
+      data = await redis.get(self._redis_key(key))
+    except (RedisError, OSError, asyncio.TimeoutError) as err:
+      logger.warning("Shared cache %s unavailable: %s", self.namespace, err)
+      cache_requests.inc(cache=self.namespace, tier="l2", result="error")
+      return default
+
+    if data is None:
+      cache_requests.inc(cache=self.namespace, tier="l2", result="miss")
+      return default
+
+    try:
+      value = deserialize(data, self.types)
+    except ValueError as err:
+      # A corrupt entry, or one of another version of the bot, is a miss
+      logger.warning("Unreadable entry %s:%s removed from the shared cache: %s", self.namespace, key, err)
+      cache_requests.inc(cache=self.namespace, tier="l2", result="error")
+      await self._delete_l2(key)
+      return default
+
+    cache_requests.inc(cache=self.namespace, tier="l2", result="hit")
+    self.local.set(key, value)
+    return value
+  # endregion
+
+  # region set
+  async def set(self, key: Hashable, value: Any, ttl: float | None = None):
+    '''
+    Store a value in L1 and L2, then tell the invalidation listeners, since the
+    other processes may have an older value in their L1.
+    This is an asynchronous function and should be called with 'await'.
+
+    Parameters
+    ----------
+    key: `Hashable`
+        The key of the entry.
+    value: `Any`
+        The value to store.
+    ttl: `float` or `None`
+        The seconds the entry is valid. Default is the cache's ttl.
+    '''
+    ttl = self.ttl if ttl is None else ttl
+    self.local.set(key, value, ttl)
+
+    redis = self.redis
+    if redis is not None:
+      try:
+        await redis.set(self._redis_key(key), serialize(value, self.types), px=int(ttl * 1000))
+      except TypeError as err:
+        logger.error("Entry %s:%s not shared: %s", self.namespace, key, err)
+      except (RedisError, OSError, asyncio.TimeoutError) as err:
+        logger.warning("Shared cache %s unavailable: %s", self.namespace, err)
+
+    await self._invalidate_others(key)
+  # endregion
+
+  # region delete
+  async def delete(self, key: Hashable):
+    '''
+    Remove a key from L1 and L2, then tell the invalidation listeners, so the
+    other processes can't refill their L1 from the old value in L2.
+    This is an asynchronous function and should be called with 'await'.
+    '''
+    self.local.delete(key)
+    await self._delete_l2(key)
+    await self._invalidate_others(key)
+
+  async def _delete_l2(self, key: Hashable):
+    redis = self.redis
+    if redis is None:
+      return
+
+    try:
+      await redis.delete(self._redis_key(key))
+    except (RedisError, OSError, asyncio.TimeoutError) as err:
+      logger.warning("Shared cache %s unavailable: %s", self.namespace, err)
+  # endregion
+# endregion
@@ -0,0 +1,495 @@
+'''
+This module contains the communication between the processes of a cluster.
+
+`cluster.py` starts several bot processes (the workers), each one with a range of
+shards. They exchange small JSON messages on a bus:
+
+- With a Redis server (`REDIS_URL=redis://...`), the bus is a Redis channel.
+- Otherwise it is the hub of the launcher, a local TCP server that relays every
+  line a worker sends to the other workers.
+
+Each message has a topic. A worker sends its health on "stats" at a fixed
+interval, which the launcher and the other workers keep, and the keys stored or
+deleted in its caches on "invalidate", so the others drop their copy from memory
+and read the new value from the shared cache.
+'''
+import asyncio
+import json
+import math
+import os
+import time
+from typing import Callable
+
+from utils.cache import add_invalidation_listener, get_redis, invalidate_local, remove_invalidation_listener
+from utils.const import (
+  CLUSTER_CHANNEL,
+  CLUSTER_HEARTBEAT_INTERVAL,
+  CLUSTER_HEARTBEAT_TIMEOUT,
+  CLUSTER_HUB_MAX_BACKLOG,
+  CLUSTER_RECONNECT_DELAY,
+)
+from utils.logger_config import logger
+
+# region messages
+def encode(topic: str, worker: str, data: dict) -> bytes:
+  ''' A message as one line of JSON. '''
+  return json.dumps({"topic": topic, "worker": worker, "data": data}, separators=(",", ":")).encode() + b"\n"
+
+def decode(line: bytes | str) -> dict | None:
+  ''' A line of JSON as a message, `None` if it isn't one. '''
+  try:
+    message = json.loads(line)
+  except ValueError:
+    return None
+
+  if not isinstance(message, dict) or "topic" not in message:
+    return None
+
+  return message
+
+def finite(value: float | None) -> float | None:
+  ''' The value, or `None` if it isn't a finite number, which JSON can't carry. '''
+  return value if value is not None and math.isfinite(value) else None
+# endregion
+
+# region buses
+class ClusterBus:
+  '''
+  The channel between the workers. The messages of a worker aren't delivered to itself.
+
+  Parameters
+  ----------
+  worker: `str`
+      The id of this worker.
+
+  Attributes
+  ----------
+  up_since: `float` | `None`
+      The `time.monotonic` when the bus connected, `None` while it is down.
+  '''
+  def __init__(self, worker: str):
+    self.worker = worker
+    self.up_since: float | None = None
+    self._handlers: dict[str, list[Callable[[dict], None]]] = {}
+    self._task: asyncio.Task = None
+
+  def subscribe(self, topic: str, handler: Callable[[dict], None]):
+    '''
+    Call a handler with every message of a topic sent by the other workers.
+    '''
+    self._handlers.setdefault(topic, []).append(handler)
+
+  def deliver(self, message: dict):
+    '''
+    Call the handlers of a received message.
+    '''
+    if message.get("worker") == self.worker:
+      return
+
+    for handler in self._handlers.get(message["topic"], ()):
+      try:
+        handler(message)
+      except Exception as e:
+        logger.error("Cluster handler of %s failed: %s", message["topic"], e)
+
+  async def publish(self, topic: str, data: dict):
+    '''
+    Send a message to the other workers. It is dropped if the bus is down.
+    This is an asynchronous function and should be called with 'await'.
+    '''
+    await self._send(encode(topic, self.worker, data))
+
+  async def _send(self, line: bytes):
+    raise NotImplementedError
+
+  async def start(self):
+    '''
+    Start receiving. This is an asynchronous function and should be called with 'await'.
+    '''
+    if self._task is None or self._task.done():
+      self._task = asyncio.create_task(self._run(), name=f"cluster-bus-{self.worker}")
+
+  async def _run(self):
+    raise NotImplementedError
+
+  async def close(self):
+    '''
+    Stop receiving. This is an asynchronous function and should be called with 'await'.
+    '''
+    if self._task is not None:
+      self._task.cancel()
+      self._task = None
+
+
+class HubBus(ClusterBus):
+  '''
+  The bus through the hub of the launcher. It connects again if the hub restarts.
+
+  Parameters
+  ----------
+  worker: `str`
+      The id of this worker.
+  address: `str`
+      The address of the hub, `host:port`.
+  '''
+  def __init__(self, worker: str, address: str):
+    super().__init__(worker)
+    host, _, port = address.rpartition(":")
+    self.host = host or "127.0.0.1"
+    self.port = int(port)
+    self._writer: asyncio.StreamWriter = None
+
+  async def _send(self, line: bytes):
+    if self._writer is None or self._writer.is_closing():
+      logger.debug("Cluster hub not connected, message dropped")
+      return
+
+    self._writer.write(line)
+    await self._writer.drain()
+
+  async def _run(self):
+    while True:
+      try:
+        reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self.up_since = time.monotonic()
+        logger.info("Connected to the cluster hub %s:%s", self.host, self.port)
+
+        while line := await reader.readline():
+          message = decode(line)
+          if message is not None:
+            self.deliver(message)
+      except (OSError, asyncio.IncompleteReadError) as e:
+        logger.warning("Cluster hub unavailable: %s", e)
+      finally:
+        self.up_since = None
+        if self._writer is not None:
+          self._writer.close()
+          self._writer = None
+
+      await asyncio.sleep(CLUSTER_RECONNECT_DELAY)
+
+  async def close(self):
+    await super().close()
+
+    if self._writer is not None:
+      self._writer.close()
+      self._writer = None
+
+
+class RedisBus(ClusterBus):
+  '''
+  The bus on a Redis channel.
+
+  Parameters
+  ----------
+  worker: `str`
+      The id of this worker.
+  redis: `redis.asyncio.Redis`
+      The client, it must support pub/sub.
+  channel: `str`
+      The channel of the cluster.
+  '''
+  def __init__(self, worker: str, redis, channel: str = CLUSTER_CHANNEL):
+    super().__init__(worker)
+    self.redis = redis
+    self.channel = channel
+
+  async def _send(self, line: bytes):
+    try:
+      await self.redis.publish(self.channel, line)
+    except Exception as e:
+      logger.warning("Cluster message not published: %s", e)
+
+  async def _run(self):
+    while True:
+      pubsub = self.redis.pubsub()
+
+      try:
+        await pubsub.subscribe(self.channel)
+        self.up_since = time.monotonic()
+
+        async for item in pubsub.listen():
+          if item.get("type") == "message":
+            message = decode(item["data"])
+            if message is not None:
+              self.deliver(message)
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:
+        logger.warning("Cluster channel unavailable: %s", e)
+      finally:
+        self.up_since = None
+        await pubsub.aclose()
+
+      await asyncio.sleep(CLUSTER_RECONNECT_DELAY)
+
+def create_bus(worker: str, hub: str) -> ClusterBus | None:
+  '''
+  Create the bus of a worker: Redis if the shared cache is a Redis server,
+  otherwise the hub of the launcher.
+
+  Parameters
+  ----------
+  worker: `str`
+      The id of this worker.
+  hub: `str`
+      The address of the launcher's hub, empty if there is none.
+  return: :class:`ClusterBus` | `None`
+      `None` if there is neither.
+  '''
+  redis = get_redis()
+
+  if redis is not None and hasattr(redis, "pubsub"):
+    return RedisBus(worker, redis)
+
+  if hub:
+    return HubBus(worker, hub)
+
+  return None
+# endregion
+
+# region hub
+class ClusterHub:
+  '''
+  The local TCP server of the launcher that relays the lines of each worker to
+  the others. A worker that doesn't read its lines misses the next ones, so the
+  relay never waits for it.
+
+  Parameters
+  ----------
+  on_message: `Callable`
+      Called with every message, the launcher reads the heartbeats from it.
+
+  Attributes
+  ----------
+  up_since: `float` | `None`
+      The `time.monotonic` when the hub started listening, `None` while it doesn't.
+  '''
+  def __init__(self, on_message: Callable[[dict], None]):
+    self.on_message = on_message
+    self.up_since: float | None = None
+    self._writers: set[asyncio.StreamWriter] = set()
+    self._connections: set[asyncio.Task] = set()
+    self._server: asyncio.AbstractServer = None
+
+  async def start(self, host: str, port: int):
+    '''
+    Start listening. This is an asynchronous function and should be called with 'await'.
+    '''
+    self._server = await asyncio.start_server(self._handle, host, port)
+    self.up_since = time.monotonic()
+
+  async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    self._connections.add(asyncio.current_task())
+    self._writers.add(writer)
+
+    try:
+      while line := await reader.readline():
+        message = decode(line)
+        if message is None:
+          continue
+
+        self.on_message(message)
+
+        for other in self._writers:
+          if other is writer or other.is_closing():
+            continue
+
+          if other.transport.get_write_buffer_size() > CLUSTER_HUB_MAX_BACKLOG:
+            logger.warning("Cluster worker behind on the hub, %s dropped", message["topic"])
+            continue
+
+          other.write(line)
+    except (OSError, asyncio.IncompleteReadError):
+      pass
+    finally:
+      self._writers.discard(writer)
+      self._connections.discard(asyncio.current_task())
+      writer.close()
+
+  async def close(self):
+    '''
+    Stop listening, disconnect the workers and wait for their connections to end.
+    This is an asynchronous function and should be called with 'await'.
+    '''
+    self.up_since = None
+
+    if self._server is not None:
+      self._server.close()
+
+    for writer in self._writers:
+      writer.close()
+
+    await asyncio.gather(*self._connections, return_exceptions=True)
+
+    if self._server is not None:
+      await self._server.wait_closed()
+      self._server = None
+# endregion
+
+# region node
+class ClusterNode:
+  '''
+  The membership of a worker in the cluster: it sends its heartbeats, keeps the
+  last heartbeat of the others and applies their cache invalidations.
+
+  Parameters
+  ----------
+  interval: `float`
+      The seconds between the heartbeats.
+  '''
+  def __init__(self, interval: float = CLUSTER_HEARTBEAT_INTERVAL):
+    self.interval = interval
+    self.bus: ClusterBus | None = None
+    # worker id -> (time.monotonic of the heartbeat, stats)
+    self.peers: dict[str, tuple[float, dict]] = {}
+    self._collect_stats: Callable[[], dict] = None
+    self._task: asyncio.Task = None
+
+  @property
+  def running(self) -> bool:
+    ''' True if the worker is part of a cluster. '''
+    return self.bus is not None
+
+  async def start(self, worker: str, hub: str, collect_stats: Callable[[], dict]):
+    '''
+    Join the cluster, if there is a bus.
+    This is an asynchronous function and should be called with 'await'.
+
+    Parameters
+    ----------
+    worker: `str`
+        The id of this worker.
+    hub: `str`
+        The address of the launcher's hub.
+    collect_stats: `Callable`
+        Returns the health of this worker, sent in each heartbeat.
+    '''
+    self.bus = create_bus(worker, hub)
+
+    if self.bus is None:
+      logger.warning("Cluster worker %s has no bus, it runs alone", worker)
+      return
+
+    self._collect_stats = collect_stats
+    self.bus.subscribe("stats", self._on_stats)
+    self.bus.subscribe("invalidate", self._on_invalidate)
+    add_invalidation_listener(self._send_invalidation)
+
+    await self.bus.start()
+    self._task = asyncio.create_task(self._heartbeat(), name="cluster-heartbeat")
+    logger.info("Cluster worker %s joined through %s", worker, type(self.bus).__name__)
+
+  async def close(self):
+    '''
+    Leave the cluster. This is an asynchronous function and should be called with 'await'.
+    '''
+    if self._task is not None:
+      self._task.cancel()
+      self._task = None
+
+    if self.bus is not None:
+      remove_invalidation_listener(self._send_invalidation)
+      await self.bus.close()
+      self.bus = None
+
+  # region messages
+  async def _heartbeat(self):
+    while True:
+      try:
+        stats = self._collect_stats()
+        self.peers[self.bus.worker] = (time.monotonic(), stats)
+        await self.bus.publish("stats", stats)
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:
+        logger.error("Cluster heartbeat failed: %s", e)
+
+      await asyncio.sleep(self.interval)
+
+  def _on_stats(self, message: dict):
+    self.peers[message["worker"]] = (time.monotonic(), message["data"])
+
+  def _on_invalidate(self, message: dict):
+    data = message["data"]
+    invalidate_local(data["cache"], data["key"])
+
+  async def _send_invalidation(self, namespace: str, key):
+    # Only the keys that survive JSON, the caches of the services use strings
+    if isinstance(key, (str, int)):
+      await self.bus.publish("invalidate", {"cache": namespace, "key": key})
+  # endregion
+
+  # region summary
+  def workers(self, timeout: float = CLUSTER_HEARTBEAT_TIMEOUT) -> dict[str, dict]:
+    '''
+    Get the last heartbeat of every worker, this one included, without the
+    workers that stopped sending them.
+
+    return: `dict[str, dict]`
+    '''
+    now = time.monotonic()
+    return {
+      worker: stats for worker, (received_at, stats) in sorted(self.peers.items())
+      if now - received_at <= timeout
+    }
+
+  def summarize(self) -> dict[str, list[str]]:
+    '''
+    Summarize the cluster in short lines, for the `/stats` command.
+
+    return: `dict`
+        The lines of the "Cluster" section, empty if the worker runs alone.
+    '''
+    if not self.running:
+      return {}
+
+    workers = self.workers()
+    lines = [summarize_worker(worker, stats) for worker, stats in workers.items()]
+    lines.append(
+      f"total: {len(workers)} workers · {sum(len(stats['shards']) for stats in workers.values())} shards · "
+      f"{sum(stats['guilds'] for stats in workers.values()):,} guilds"
+    )
+    return {"Cluster": lines}
+  # endregion
+
+def summarize_worker(worker: str, stats: dict) -> str:
+  ''' A worker's heartbeat in one line. '''
+  shard_ids = [shard["id"] for shard in stats["shards"]]
+  shards = f"shards {min(shard_ids)}-{max(shard_ids)}" if shard_ids else "no shards"
+  rate = sum(shard["event_rate"] for shard in stats["shards"])
+  state = "ready" if stats["ready"] else "starting"
+  return f"worker {worker} (pid {stats['pid']}): {shards} · {stats['guilds']:,} guilds · {rate:.1f} events/s · {state}"
+
+def worker_stats(bot, shards: list) -> dict:
+  '''
+  The health of this worker, sent in its heartbeats.
+
+  Parameters
+  ----------
+  bot: :class:`discord.Client`
+      The bot of the worker.
+  shards: `list[ShardStats]`
+      The shards of the worker, from the shard monitor.
+  return: `dict`
+  '''
+  return {
+    "pid": os.getpid(),
+    "ready": bot.is_ready(),
+    "guilds": len(bot.guilds),
+    "users": len(bot.users),
+    "shards": [
+      {
+        "id": shard.shard_id,
+        "latency": finite(shard.latency),
+        "event_rate": shard.event_rate,
+        "events": shard.events,
+        "reconnects": shard.reconnects,
+      }
+      for shard in shards
+    ],
+  }
+# endregion
+
+# The membership of this process in the cluster, started from `main.py`
+cluster_node = ClusterNode()
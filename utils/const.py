@@ -11,6 +11,9 @@ Rocket League:
 
 YouTube:
 - (No constants defined yet)
+
+HTTP client:
+- HTTP_*: The limits and timeouts of the shared aiohttp session.
 '''
 # region books
 MOTIVATIONAL_QUOTES = [
@@ -54,6 +57,17 @@ NOOBIES = [
 SPOTIFY_LOGO = "https://cdn.iconscout.com/icon/free/png-256/spotify-11-432546.png"
 SPOTIFY_SCOPE = "user-top-read user-library-read playlist-modify-public playlist-modify-private"
 SPOTIFY_REDIRECT_URI = "http://localhost:8888"
+SPOTIFY_MAX_WORKERS = 4 # Threads running the blocking spotipy calls
+SPOTIFY_CALL_TIMEOUT = 30 # Seconds a command waits for a Spotify call
+SPOTIFY_REQUESTS_TIMEOUT = 10 # Seconds for each HTTP request made by spotipy
+SPOTIFY_TOKEN_REFRESH_MARGIN = 300 # Seconds before the expiration to refresh the token
+SPOTIFY_TOKEN_RETRY_DELAY = 30 # Seconds to wait before retrying a failed refresh
+SPOTIFY_CACHE_SIZE = 64 # Top tracks and recommendations results kept in memory
+SPOTIFY_CACHE_TTL = 600 # Seconds, the top tracks change slowly
+SPOTIFY_MAX_ITEMS_PER_REQUEST = 100 # Tracks the API accepts in one playlist insertion
+SPOTIFY_MAX_PAGE_SIZE = 25 # Items per page of a paginated view, the fields an embed accepts
+SPOTIFY_PAGE_WINDOW = 5 # Pages of a paginated view kept in memory
+SPOTIFY_EMBED_CACHE_SIZE = 10 # Rendered page embeds kept by a paginated view
 # endregion
 
 # region reactions
@@ -64,4 +78,109 @@ WORDS_TO_REACT = [
   "minecraft",
   "cerrando, dale?"
 ]
-# endregion
\ No newline at end of file
+TRIGGERS_FILE = "triggers.json" # The triggers configured for each guild, in `DATA_DIR`
+REACTION_EMOJIS = ('✋🏻', '😔')
+REACTION_GIF = "https://media1.tenor.com/m/mBywuwFuhvMAAAAd/king-baldwin.gif"
+REACTION_CHANNEL_COOLDOWN = 10 # Seconds between reactions in the same channel
+REACTION_USER_COOLDOWN = 30 # Seconds between reactions to the same user
+REACTION_MAX_PENDING = 50 # Reactions being sent at the same time, the rest are dropped
+COOLDOWN_MAX_ENTRIES = 10_000 # Ids tracked by a cooldown before pruning the expired ones
+# endregion
+
+# region http client
+HTTP_CONNECTION_LIMIT = 100 # Total connections kept by the shared connector
+HTTP_CONNECTION_LIMIT_PER_HOST = 10 # Connections per upstream host
+HTTP_DNS_CACHE_TTL = 300 # Seconds to keep the resolved DNS entries
+HTTP_KEEPALIVE_TIMEOUT = 30 # Seconds to keep an idle connection open
+HTTP_TOTAL_TIMEOUT = 10 # Seconds for the whole request
+HTTP_CONNECT_TIMEOUT = 5 # Seconds to get a connection from the pool and connect
+# endregion
+
+# region weather cache
+WEATHER_CACHE_SIZE = 256 # Cities kept in memory
+WEATHER_CACHE_TTL = 600 # Seconds, OpenWeather refreshes its data every few minutes
+# endregion
+
+# region shared cache
+BOOKS_CACHE_SIZE = 256 # Queries kept in memory
+BOOKS_CACHE_TTL = 3600 # Seconds, the Google Books results rarely change
+RL_CACHE_SIZE = 256 # Players kept in memory
+RL_CACHE_TTL = 120 # Seconds, the ranks change after every match
+CACHE_COMPRESS_MIN_SIZE = 512 # Bytes, smaller values are stored without compression
+# endregion
+
+# region logging
+LOG_FORMAT = "%(asctime)s:%(levelname)s:%(name)s:[%(correlation_id)s] %(message)s"
+LOG_MAX_BYTES = 10 * 1024 * 1024 # Size of the log file before rotating it
+LOG_ROTATE_WHEN = "midnight" # When to rotate the log file with the time rotation
+LOG_BACKUP_COUNT = 7 # Compressed old log files kept
+# The library's gateway and http logs are very verbose at DEBUG
+DEFAULT_LOG_LEVELS = {
+  "discord.gateway": "INFO",
+  "discord.http": "INFO",
+  "discord.client": "INFO",
+  "discord.state": "INFO",
+}
+# endregion
+
+# region metrics
+METRICS_HOST = "127.0.0.1" # The exporter only listens locally
+# Seconds, the upper bounds of the latency buckets
+METRICS_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+METRICS_LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+LOOP_LAG_INTERVAL = 0.5 # Seconds between the event loop lag measures
+WATCHDOG_THRESHOLD = 0.25 # Seconds of lag from which the loop is considered blocked
+WATCHDOG_CHECK_INTERVAL = 0.05 # Seconds between the watchdog's checks and samples
+WATCHDOG_MAX_SITES = 200 # Blocking sites kept by the watchdog
+WATCHDOG_LOGGED_FRAMES = 15 # Innermost frames logged for each blocked period
+WATCHDOG_TOP_SITES = 10 # Blocking sites shown by `/blocking`
+PROFILE_SAMPLE_INTERVAL = 0.005 # Seconds between the samples of `/profile`
+PROFILE_MAX_SECONDS = 60 # The longest `/profile`
+PROFILE_TOP_FUNCTIONS = 15 # Functions shown by `/profile`
+# endregion
+
+# region responses
+# Seconds from receiving a slash command to answer it in one request. Past it the
+# command defers and sends a followup, Discord closes the interaction after 3 seconds
+RESPONSE_DEADLINE = 0.5
+# endregion
+
+# region assets
+ASSETS_DIR = "images" # The static images, each one is an asset named after its file
+ASSET_VARIANTS_DIR = "images/optimized" # The size-optimized variants made at startup
+ASSET_MAX_WIDTH = 400 # Pixels, the width of an embed image, wider assets are scaled down
+ASSET_URL_MARGIN = 600 # Seconds before the expiry of a CDN URL to upload the asset again
+ASSET_URL_TTL = 12 * 60 * 60 # Seconds a CDN URL without expiry is reused
+# endregion
+
+# region startup
+EXTENSIONS_PACKAGE = "cogs" # The package whose modules are loaded as extensions
+EXTENSION_IMPORT_TIMEOUT = 10 # Seconds the connection waits for the import of an extension
+# endregion
+
+# region gateway profiles
+BALANCED_PROFILE_MAX_MESSAGES = 100 # Messages cached by the `balanced` profile
+FULL_PROFILE_MAX_MESSAGES = 1000 # Messages cached by the `full` profile, the library's default
+# endregion
+
+# region sharding
+SHARD_SAMPLE_INTERVAL = 5 # Seconds between the samples of the shards' connections
+PING_MAX_SHARDS = 20 # Shards listed by `/ping`, the rest are summarized
+# endregion
+
+# region cluster
+CLUSTER_HOST = "127.0.0.1" # The hub and the health endpoint of the launcher only listen locally
+CLUSTER_HUB_PORT = 9200 # Port of the launcher's hub, used when there is no Redis
+CLUSTER_HEALTH_PORT = 9199 # Port of the launcher's `/health`, 0 to disable it
+CLUSTER_CHANNEL = "rachael:cluster" # Redis channel of the cluster messages
+CLUSTER_HEARTBEAT_INTERVAL = 5 # Seconds between the heartbeats of a worker
+CLUSTER_HEARTBEAT_TIMEOUT = 30 # Seconds without heartbeats before a worker is restarted
+CLUSTER_STARTUP_GRACE = 120 # Seconds a new worker has to send its first heartbeat
+CLUSTER_RESTART_DELAY = 1 # Seconds before restarting a worker, doubled on each failure in a row
+CLUSTER_MAX_RESTART_DELAY = 60 # The longest wait before restarting a worker
+CLUSTER_STABLE_SECONDS = 300 # Seconds a worker has to run to reset its restart delay
+CLUSTER_RECONNECT_DELAY = 2 # Seconds before a worker connects again to the hub
+CLUSTER_HUB_MAX_BACKLOG = 1024 * 1024 # Bytes waiting for a worker before the hub drops its messages
+CLUSTER_HEALTH_LOG_INTERVAL = 60 # Seconds between the health summaries logged by the launcher
+CLUSTER_STOP_TIMEOUT = 15 # Seconds the workers have to close before they are killed
+# endregion
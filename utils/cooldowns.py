@@ -0,0 +1,87 @@
+'''
+This module contains the cooldowns used to rate limit the bot's own actions.
+'''
+import time
+
+from utils.const import COOLDOWN_MAX_ENTRIES
+
+
+class CooldownTracker:
+  '''
+  The last time an action was done for each id (channel, user...).
+
+  Only one integer (milliseconds) is stored per id, and the expired entries
+  are pruned when there are more than `max_entries`.
+
+  Parameters
+  ----------
+  period: `float`
+      The seconds an id must wait between actions.
+  max_entries: `int`
+      The number of ids tracked before pruning the expired ones.
+  '''
+  __slots__ = ("period_ms", "max_entries", "_last")
+
+  def __init__(self, period: float, max_entries: int = COOLDOWN_MAX_ENTRIES):
+    self.period_ms = int(period * 1000)
+    self.max_entries = max_entries
+    # id -> monotonic milliseconds of the last action
+    self._last: dict[int, int] = {}
+
+  def __len__(self):
+    return len(self._last)
+
+  @staticmethod
+  def now() -> int:
+    ''' The current monotonic time in milliseconds. '''
+    return time.monotonic_ns() // 1_000_000
+
+  # region is_ready and record
+  def is_ready(self, key: int, now: int = None) -> bool:
+    '''
+    Check if the cooldown of an id is over.
+
+    Parameters
+    ----------
+    key: `int`
+        The id.
+    now: `int`
+        The current time from :meth:`now`. Default is the current time.
+    return: `bool`
+    '''
+    last = self._last.get(key)
+    return last is None or (self.now() if now is None else now) - last >= self.period_ms
+
+  def record(self, key: int, now: int = None):
+    '''
+    Start the cooldown of an id.
+
+    Parameters
+    ----------
+    key: `int`
+        The id.
+    now: `int`
+        The current time from :meth:`now`. Default is the current time.
+    '''
+    now = self.now() if now is None else now
+    self._last[key] = now
+
+    if len(self._last) > self.max_entries:
+      self.prune(now)
+  # endregion
+
+  # region prune
+  def prune(self, now: int = None):
+    '''
+    Remove the ids whose cooldown is over.
+
+    Parameters
+    ----------
+    now: `int`
+        The current time from :meth:`now`. Default is the current time.
+    '''
+    now = self.now() if now is None else now
+    self._last = {
+      key: last for key, last in self._last.items() if now - last < self.period_ms
+    }
+  # endregion
@@ -0,0 +1,142 @@
+'''
+This module contains the gateway profiles: the intents the bot subscribes to and
+what it keeps in its cache.
+
+The bot only reacts to messages and answers slash commands, so it doesn't need
+the presences, the typing events or the members of the guilds. Every intent is
+an event stream that Discord sends, the library parses and usually caches, so
+the smaller profiles use less memory and less CPU. The profile is chosen with
+`GATEWAY_PROFILE`:
+
+- `minimal`: the guilds and their messages, with their content. No member is
+  cached and no message is kept. The default.
+- `balanced`: the default intents of the library and the message content, the
+  members in voice channels and the last messages.
+- `full`: every intent, every member fetched when the bot connects and the last
+  thousand messages. What the bot used before the profiles.
+'''
+import discord
+
+from utils.const import BALANCED_PROFILE_MAX_MESSAGES, FULL_PROFILE_MAX_MESSAGES
+from utils.logger_config import logger
+
+
+class GatewayProfile:
+  '''
+  The intents and the cache options of the bot.
+
+  Parameters
+  ----------
+  name: `str`
+      The name of the profile.
+  intents: :class:`discord.Intents`
+      The events Discord sends.
+  member_cache_flags: :class:`discord.MemberCacheFlags`
+      The members kept in the cache.
+  chunk_guilds_at_startup: `bool`
+      True to request all the members of every guild when the bot connects.
+      Otherwise they are only requested if a command asks for them.
+  max_messages: `int` | `None`
+      The messages kept in the cache, `None` to keep none.
+  '''
+  def __init__(
+    self,
+    name: str,
+    intents: discord.Intents,
+    member_cache_flags: discord.MemberCacheFlags,
+    chunk_guilds_at_startup: bool,
+    max_messages: int | None
+  ):
+    self.name = name
+    self.intents = intents
+    self.member_cache_flags = member_cache_flags
+    self.chunk_guilds_at_startup = chunk_guilds_at_startup
+    self.max_messages = max_messages
+
+  def options(self) -> dict:
+    '''
+    Get the options of the bot.
+
+    return: `dict`
+        The keyword arguments of :class:`discord.Client`.
+    '''
+    return {
+      "intents": self.intents,
+      "member_cache_flags": self.member_cache_flags,
+      "chunk_guilds_at_startup": self.chunk_guilds_at_startup,
+      "max_messages": self.max_messages,
+    }
+
+  def __repr__(self) -> str:
+    return (
+      f"<GatewayProfile {self.name} intents={self.intents.value} "
+      f"members={self.member_cache_flags.value} chunk={self.chunk_guilds_at_startup} "
+      f"messages={self.max_messages}>"
+    )
+
+# region profiles
+def minimal_profile() -> GatewayProfile:
+  ''' The guilds and their messages, nothing else is cached. '''
+  intents = discord.Intents.none()
+  intents.guilds = True # Resolves `message.guild`, the triggers are per guild
+  intents.guild_messages = True
+  intents.dm_messages = True
+  intents.message_content = True
+
+  return GatewayProfile(
+    "minimal",
+    intents,
+    member_cache_flags=discord.MemberCacheFlags.none(),
+    chunk_guilds_at_startup=False,
+    max_messages=None,
+  )
+
+def balanced_profile() -> GatewayProfile:
+  ''' The default intents of the library and the message content. '''
+  intents = discord.Intents.default()
+  intents.message_content = True
+
+  return GatewayProfile(
+    "balanced",
+    intents,
+    member_cache_flags=discord.MemberCacheFlags.from_intents(intents),
+    chunk_guilds_at_startup=False,
+    max_messages=BALANCED_PROFILE_MAX_MESSAGES,
+  )
+
+def full_profile() -> GatewayProfile:
+  ''' Every intent and every member. '''
+  intents = discord.Intents.all()
+
+  return GatewayProfile(
+    "full",
+    intents,
+    member_cache_flags=discord.MemberCacheFlags.all(),
+    chunk_guilds_at_startup=True,
+    max_messages=FULL_PROFILE_MAX_MESSAGES,
+  )
+
+PROFILES = {
+  "minimal": minimal_profile,
+  "balanced": balanced_profile,
+  "full": full_profile,
+}
+# endregion
+
+def get_profile(name: str) -> GatewayProfile:
+  '''
+  Get a gateway profile by name. An unknown name falls back to `minimal`.
+
+  Parameters
+  ----------
+  name: `str`
+      The name of the profile: `minimal`, `balanced` or `full`.
+  return: :class:`GatewayProfile`
+  '''
+  factory = PROFILES.get(name.strip().lower())
+
+  if factory is None:
+    logger.warning("Unknown gateway profile %r, using minimal", name)
+    factory = minimal_profile
+
+  return factory()
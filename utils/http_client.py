@@ -0,0 +1,103 @@
+'''
+This module contains the HTTP client shared by all the services.
+
+A single `aiohttp.ClientSession` is kept for the lifetime of the bot, so the
+TCP/TLS connections and the DNS lookups are reused between commands instead of
+being created again on every `/books`, `/rlrank` or `/weather`.
+'''
+import aiohttp
+
+from utils.const import (
+  HTTP_CONNECT_TIMEOUT,
+  HTTP_CONNECTION_LIMIT,
+  HTTP_CONNECTION_LIMIT_PER_HOST,
+  HTTP_DNS_CACHE_TTL,
+  HTTP_KEEPALIVE_TIMEOUT,
+  HTTP_TOTAL_TIMEOUT,
+)
+from utils.logger_config import logger
+from utils.metrics import create_trace_config
+
+
+class HttpClient:
+  '''
+  A lazily created, pooled `aiohttp.ClientSession`.
+
+  The session is created the first time it is used (it must be created inside
+  the running event loop) and it is closed with :meth:`close` when the bot shuts down.
+
+  Parameters
+  ----------
+  limit: `int`
+      The total number of connections kept by the connector.
+  limit_per_host: `int`
+      The number of connections kept for each upstream host.
+  dns_cache_ttl: `int`
+      The seconds to keep the resolved DNS entries.
+  keepalive_timeout: `float`
+      The seconds to keep an idle connection open.
+  total_timeout: `float`
+      The seconds allowed for the whole request.
+  connect_timeout: `float`
+      The seconds allowed to get a connection from the pool and connect.
+  '''
+  def __init__(
+    self,
+    limit: int = HTTP_CONNECTION_LIMIT,
+    limit_per_host: int = HTTP_CONNECTION_LIMIT_PER_HOST,
+    dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+    keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT,
+    total_timeout: float = HTTP_TOTAL_TIMEOUT,
+    connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+  ):
+    self.limit = limit
+    self.limit_per_host = limit_per_host
+    self.dns_cache_ttl = dns_cache_ttl
+    self.keepalive_timeout = keepalive_timeout
+    self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout)
+    self._session: aiohttp.ClientSession | None = None
+
+  # region session
+  @property
+  def session(self) -> aiohttp.ClientSession:
+    '''
+    The shared session. It is created on first use, or again if it was closed.
+
+    Returns
+    -------
+    :class:`aiohttp.ClientSession`
+    '''
+    if self._session is None or self._session.closed:
+      connector = aiohttp.TCPConnector(
+        limit=self.limit,
+        limit_per_host=self.limit_per_host,
+        use_dns_cache=True,
+        ttl_dns_cache=self.dns_cache_ttl,
+        keepalive_timeout=self.keepalive_timeout,
+      )
+      self._session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=self.timeout,
+        # Records the status, latency and bytes of every request in the metrics
+        trace_configs=[create_trace_config()],
+      )
+      logger.debug("Created the shared HTTP session")
+
+    return self._session
+  # endregion
+
+  # region close
+  async def close(self):
+    '''
+    Close the shared session and all the pooled connections.
+    This is an asynchronous function and should be called with 'await'.
+    '''
+    if self._session is not None and not self._session.closed:
+      await self._session.close()
+      logger.debug("Closed the shared HTTP session")
+
+    self._session = None
+  # endregion
+
+# The client used by the services, closed from `main.py` when the bot shuts down
+http_client = HttpClient()
@@ -0,0 +1,119 @@
+'''
+This module contains the interaction used by the bot, which times the responses
+of the slash commands.
+
+The bot creates a :class:`TimedInteraction` for every interaction (see
+`RachaelBot.get_interaction`). The time between receiving a slash command and its
+defer or first message is recorded in `command_latency_seconds`; the bot records
+the "final" stage when the command returns.
+
+:func:`respond` answers a command in one request when its message is ready
+before the deadline, and only defers otherwise.
+'''
+import asyncio
+import time
+from typing import Awaitable
+
+from discord import Interaction, InteractionResponse, InteractionType, utils
+
+from utils.const import RESPONSE_DEADLINE
+from utils.metrics import command_latency, command_responses
+
+
+class TimedInteractionResponse(InteractionResponse):
+  '''
+  An interaction response that records when the command first answered.
+  '''
+  __slots__ = ()
+
+  async def defer(self, *args, **kwargs):
+    await super().defer(*args, **kwargs)
+    self._parent.record_stage("defer")
+
+  async def send_message(self, *args, **kwargs):
+    message = await super().send_message(*args, **kwargs)
+    self._parent.record_stage("response")
+    return message
+
+
+class TimedInteraction(Interaction):
+  '''
+  An interaction that knows when it was received.
+
+  Attributes
+  ----------
+  received_at: `float`
+      The `time.perf_counter` when the interaction was created.
+  '''
+  __slots__ = ("received_at",)
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.received_at = time.perf_counter()
+
+  @utils.cached_slot_property("_cs_response")
+  def response(self) -> TimedInteractionResponse:
+    return TimedInteractionResponse(self)
+
+  @property
+  def command_name(self) -> str | None:
+    ''' The name of the slash command, None for the other interactions. '''
+    if self.type != InteractionType.application_command:
+      return None
+
+    return (self.data or {}).get("name")
+
+  def record_stage(self, stage: str):
+    '''
+    Record the seconds since the command was received.
+
+    Parameters
+    ----------
+    stage: `str`
+        "defer", "response" or "final".
+    '''
+    command = self.command_name
+    if command is not None:
+      command_latency.observe(time.perf_counter() - self.received_at, command=command, stage=stage)
+
+
+async def respond(interaction: Interaction, message: Awaitable[dict], deadline: float = RESPONSE_DEADLINE):
+  '''
+  Answer a slash command with its message. If the message is ready before the
+  deadline (a static or cached answer) it is sent as the response, one request
+  to Discord. Otherwise (a cache miss or a slow upstream) the command defers and
+  the message is sent as a followup when it is ready. A message with files is
+  always sent as a followup, Discord closes the interaction if the response
+  doesn't arrive in 3 seconds and an upload can take longer. The path is counted in
+  `command_responses_total`.
+  This is an asynchronous function and should be called with 'await'.
+
+  Parameters
+  ----------
+  interaction: :class:`Interaction`
+      The interaction of the command, not answered yet.
+  message: `Awaitable[dict]`
+      Builds the message, the keyword arguments of `send_message` and `followup.send`
+      (`embed`, `view`, `file`...).
+  deadline: `float`
+      The seconds since the command was received to have the message ready.
+  '''
+  task = asyncio.ensure_future(message)
+  command = getattr(interaction, "command_name", None) or "unknown"
+  received_at = getattr(interaction, "received_at", None)
+  remaining = deadline - (time.perf_counter() - received_at) if received_at is not None else deadline
+
+  try:
+    # A message that doesn't wait for anything is ready on the first iteration
+    await asyncio.wait({task}, timeout=max(remaining, 0))
+
+    if task.done() and not task.result().keys() & {"file", "files"}:
+      await interaction.response.send_message(**task.result())
+      command_responses.inc(command=command, path="fast")
+      return
+
+    await interaction.response.defer()
+    command_responses.inc(command=command, path="deferred")
+    await interaction.followup.send(**await task)
+  finally:
+    task.cancel()
@@ -0,0 +1,101 @@
+'''
+This module contains the context added to the log records.
+
+Each slash command gets a correlation id when it is invoked. The id is kept in a
+context variable, so every record logged while the command runs, in the cogs,
+the services or the views it creates, carries the same id and a single
+invocation can be followed from end to end.
+
+The high-volume events can be sampled with `LOG_SAMPLE_RATES`, so only a
+fraction of them is logged.
+'''
+import contextvars
+import logging
+import random
+import uuid
+
+from utils.apikeys import LOG_SAMPLE_RATES
+
+# The id of the invocation being handled, "-" outside of an invocation
+correlation_id: contextvars.ContextVar[str] = contextvars.ContextVar("correlation_id", default="-")
+
+# region correlation id
+def new_correlation_id() -> str:
+  '''
+  Create a correlation id and set it for the current context.
+
+  return: `str`
+      The new id.
+  '''
+  value = uuid.uuid4().hex[:12]
+  correlation_id.set(value)
+  return value
+
+def set_correlation_id(value: str):
+  '''
+  Set the correlation id of the current context, for example the id of the
+  command that created a view when one of its buttons is clicked.
+
+  Parameters
+  ----------
+  value: `str`
+      The correlation id.
+  '''
+  correlation_id.set(value)
+
+def get_correlation_id() -> str:
+  '''
+  Get the correlation id of the current context.
+
+  return: `str`
+  '''
+  return correlation_id.get()
+
+class CorrelationFilter(logging.Filter):
+  '''
+  Adds the correlation id of the current context to the records.
+  It must run on the thread that logs, before the record is queued.
+  '''
+  def filter(self, record: logging.LogRecord) -> bool:
+    record.correlation_id = correlation_id.get()
+    return True
+# endregion
+
+# region sampling
+def parse_rates(rates: str) -> dict[str, float]:
+  '''
+  Parse the sample rates from `event=rate` pairs separated by commas.
+
+  Parameters
+  ----------
+  rates: `str`
+      For example "on_message=0.01", to log one of every hundred matches.
+  return: `dict`
+  '''
+  parsed = {}
+
+  for pair in rates.split(","):
+    event, _, rate = pair.partition("=")
+    try:
+      parsed[event.strip()] = min(max(float(rate), 0.0), 1.0)
+    except ValueError:
+      continue
+
+  return parsed
+
+sample_rates = parse_rates(LOG_SAMPLE_RATES)
+
+def sampled(event: str) -> bool:
+  '''
+  Decide if an occurrence of a high-volume event is logged.
+  The events without a configured rate are always logged.
+
+  Parameters
+  ----------
+  event: `str`
+      The name of the event, for example "on_message".
+  return: `bool`
+  '''
+  rate = sample_rates.get(event, 1.0)
+  return rate >= 1.0 or random.random() < rate
+# endregion
@@ -1,20 +1,200 @@
 '''
-This file contains the settings for the logging. It creates a logger for each level.
+This file contains the settings for the logging.
+
+The loggers only put the records in a queue; a background thread writes them to
+the log file, so the event loop never waits on the disk. The log file is rotated
+by size or time (`LOG_ROTATION`) and the old files are compressed. The level of
+each logger can be set with `LOG_LEVELS`, to quiet the library's gateway logs
+separately from the bot's own logs.
+
+A record below the level costs no string formatting. The message and the
+traceback of a queued record are rendered by the code that logs, so the record
+shows the arguments as they were, and the rest of the line is formatted by the
+listener thread. With
+`LOG_MODE=json` each record is written as a JSON line with its correlation id
+(see `utils.log_context`) and the fields passed with `extra`.
 '''
+import atexit
+import copy
+import gzip
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
+
+from utils.apikeys import LOG_FILE, LOG_LEVEL, LOG_LEVELS, LOG_MODE, LOG_ROTATION
+from utils.const import (
+  DEFAULT_LOG_LEVELS,
+  LOG_BACKUP_COUNT,
+  LOG_FORMAT,
+  LOG_MAX_BYTES,
+  LOG_ROTATE_WHEN,
+)
+from utils.log_context import CorrelationFilter
+
+# region formatters
+# The attributes of every record, the others come from `extra`
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "correlation_id"}
+
+class JsonFormatter(logging.Formatter):
+  '''
+  Formats the records as JSON lines.
+  '''
+  def format(self, record: logging.LogRecord) -> str:
+    entry = {
+      "time": self.formatTime(record),
+      "level": record.levelname,
+      "logger": record.name,
+      "correlation_id": getattr(record, "correlation_id", "-"),
+      "message": record.getMessage(),
+    }
+
+    for key, value in vars(record).items():
+      if key not in RECORD_ATTRIBUTES and not key.startswith("_"):
+        entry[key] = value
+
+    if record.exc_text or record.exc_info:
+      entry["exception"] = record.exc_text or self.formatException(record.exc_info)
+
+    return json.dumps(entry, ensure_ascii=False, default=str)
+
+def create_formatter(mode: str = LOG_MODE) -> logging.Formatter:
+  '''
+  Create the formatter of the log file.
+
+  Parameters
+  ----------
+  mode: `str`
+      "json" to write JSON lines, "text" to write `LOG_FORMAT` lines.
+  return: :class:`logging.Formatter`
+  '''
+  if mode == "json":
+    return JsonFormatter()
+
+  return logging.Formatter(LOG_FORMAT, defaults={"correlation_id": "-"})
+# endregion
+
+# region queue
+class LazyQueueHandler(logging.handlers.QueueHandler):
+  '''
+  Queues the records with their message and traceback rendered, and leaves the
+  rest of the formatting (time, level, JSON) to the listener thread.
+
+  The arguments could change before the listener writes the record, and a queued
+  exception would keep the frames of its traceback alive. The default handler
+  formats the whole line before queuing it, with its own formatter.
+  '''
+  _exception_formatter = logging.Formatter()
+
+  def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+    record = copy.copy(record)
+    record.msg = record.getMessage()
+    record.args = None
+
+    if record.exc_info:
+      record.exc_text = record.exc_text or self._exception_formatter.formatException(record.exc_info)
+      record.exc_info = None
+
+    return record
+# endregion
+
+# region rotation
+def compressed_namer(name: str) -> str:
+  '''
+  Name of a rotated log file, `discord.log.1` is saved as `discord.log.1.gz`.
+  '''
+  return name + ".gz"
+
+def compress_rotator(source: str, dest: str):
+  '''
+  Compress the rotated log file.
+  '''
+  with open(source, "rb") as file_in, gzip.open(dest, "wb") as file_out:
+    shutil.copyfileobj(file_in, file_out)
+  os.remove(source)
+
+def create_file_handler(rotation: str = LOG_ROTATION) -> logging.Handler:
+  '''
+  Create the handler that writes the log file.
+
+  Parameters
+  ----------
+  rotation: `str`
+      "size" to rotate every `LOG_MAX_BYTES`, "time" to rotate at `LOG_ROTATE_WHEN`.
+  return: :class:`logging.Handler`
+  '''
+  if rotation == "time":
+    handler = logging.handlers.TimedRotatingFileHandler(
+      filename=LOG_FILE,
+      when=LOG_ROTATE_WHEN,
+      backupCount=LOG_BACKUP_COUNT,
+      encoding='utf-8'
+    )
+  else:
+    handler = logging.handlers.RotatingFileHandler(
+      filename=LOG_FILE,
+      maxBytes=LOG_MAX_BYTES,
+      backupCount=LOG_BACKUP_COUNT,
+      encoding='utf-8'
+    )
+
+  handler.namer = compressed_namer
+  handler.rotator = compress_rotator
+  handler.setFormatter(create_formatter())
+  return handler
+# endregion
+
+# region levels
+def parse_levels(levels: str) -> dict[str, str]:
+  '''
+  Parse the levels of the loggers from `name=LEVEL` pairs separated by commas.
+
+  Parameters
+  ----------
+  levels: `str`
+      For example "discord.gateway=WARNING,discord.http=INFO".
+  return: `dict`
+  '''
+  parsed = {}
+
+  for pair in levels.split(","):
+    name, _, level = pair.partition("=")
+    if name.strip() and level.strip():
+      parsed[name.strip()] = level.strip().upper()
+
+  return parsed
+# endregion
 
 # Create a logger
 logger = logging.getLogger('discord')
-logger.setLevel(logging.DEBUG)  # Set the lowest level to register all
+logger.setLevel(LOG_LEVEL.upper())
 
-handler = logging.FileHandler(
-    filename='discord.log',
-    encoding='utf-8',
-    mode='w'
-)
+for logger_name, logger_level in {**DEFAULT_LOG_LEVELS, **parse_levels(LOG_LEVELS)}.items():
+  logging.getLogger(logger_name).setLevel(logger_level)
 
-handler.setFormatter(
-    logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s')
-)
+# The records go through the queue to the thread of the listener
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+queue_handler = LazyQueueHandler(log_queue)
+# The correlation id is read on the thread that logs
+queue_handler.addFilter(CorrelationFilter())
+logger.addHandler(queue_handler)
+
+listener = logging.handlers.QueueListener(log_queue, create_file_handler(), respect_handler_level=True)
+listener.start()
+_listening = True
+
+# region stop_logging
+def stop_logging():
+  '''
+  Write the queued records and stop the listener thread. It can be called more than once.
+  '''
+  global _listening
+
+  if _listening:
+    _listening = False
+    listener.stop()
 
-logger.addHandler(handler)
+atexit.register(stop_logging)
+# endregion
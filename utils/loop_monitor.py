@@ -0,0 +1,269 @@
+'''
+This module contains the monitor of the event loop lag and the watchdog of the
+blocking calls.
+
+A task sleeps for a fixed interval and measures how much later than expected it
+wakes up. The difference is the time the loop spent running other callbacks, a
+blocking call in a command shows up as a spike.
+
+The watchdog runs on its own thread. While the loop is late by more than a
+threshold, it samples the stack of the loop's thread, logs the frames of each
+blocked period once and adds the sampled time to the blocking site, the library
+call and the bot function that made it (`spotipy/client.py:_get in
+cogs/spotify.py:toptracks`). The sites that blocked the loop the longest can be
+queried with `/blocking`.
+'''
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+
+from utils.const import (
+  LOOP_LAG_INTERVAL,
+  WATCHDOG_CHECK_INTERVAL,
+  WATCHDOG_LOGGED_FRAMES,
+  WATCHDOG_MAX_SITES,
+  WATCHDOG_THRESHOLD,
+)
+from utils.logger_config import logger
+from utils.metrics import loop_blocked, loop_lag
+
+# The root of the bot's code, to tell its frames from the libraries' frames
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LoopLagMonitor:
+  '''
+  Measures the event loop lag in the background.
+
+  Parameters
+  ----------
+  interval: `float`
+      The seconds between the measures.
+
+  Attributes
+  ----------
+  last_lag: `float`
+      The seconds of the last measure.
+  expected: `float` or `None`
+      The `time.perf_counter` when the task should wake up next, None when it
+      isn't running. The watchdog compares it with the current time.
+  thread_id: `int` or `None`
+      The id of the thread that runs the event loop.
+  '''
+  def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+    self.interval = interval
+    self.last_lag = 0.0
+    self.expected: float | None = None
+    self.thread_id: int | None = None
+    self._task: asyncio.Task = None
+
+  # region start and stop
+  def start(self):
+    '''
+    Start measuring, if it isn't running. It must be called from the event loop.
+    '''
+    if self._task is None or self._task.done():
+      self.thread_id = threading.get_ident()
+      self._task = asyncio.create_task(self._run(), name="loop-lag-monitor")
+
+  def stop(self):
+    '''
+    Stop measuring.
+    '''
+    if self._task is not None:
+      self._task.cancel()
+      self._task = None
+
+    self.expected = None
+  # endregion
+
+  async def _run(self):
+    while True:
+      self.expected = time.perf_counter() + self.interval
+      await asyncio.sleep(self.interval)
+      self.last_lag = max(time.perf_counter() - self.expected, 0.0)
+      loop_lag.observe(self.last_lag)
+
+
+class BlockingSite:
+  '''
+  A place of the code that blocked the event loop.
+
+  Attributes
+  ----------
+  name: `str`
+      The library call and the bot function, for example
+      `spotipy/client.py:_get in cogs/spotify.py:toptracks`.
+  blocks: `int`
+      The number of blocked periods where it was sampled.
+  seconds: `float`
+      The estimated seconds it blocked the loop.
+  last_seen: `float`
+      The `time.time` of the last sample.
+  '''
+  def __init__(self, name: str):
+    self.name = name
+    self.blocks = 0
+    self.seconds = 0.0
+    self.last_seen = 0.0
+
+
+class BlockingWatchdog:
+  '''
+  Samples the stack of the event loop's thread while the loop is blocked.
+
+  Parameters
+  ----------
+  monitor: :class:`LoopLagMonitor`
+      The monitor whose lag is watched.
+  threshold: `float`
+      The seconds of lag from which the loop is considered blocked.
+  check_interval: `float`
+      The seconds between the checks, and between the samples while blocked.
+  max_sites: `int`
+      The number of sites kept. The site with the least time is dropped.
+  '''
+  def __init__(
+    self,
+    monitor: LoopLagMonitor,
+    threshold: float = WATCHDOG_THRESHOLD,
+    check_interval: float = WATCHDOG_CHECK_INTERVAL,
+    max_sites: int = WATCHDOG_MAX_SITES
+  ):
+    self.monitor = monitor
+    self.threshold = threshold
+    self.check_interval = check_interval
+    self.max_sites = max_sites
+    self.sites: dict[str, BlockingSite] = {}
+    self._lock = threading.Lock()
+    self._stop = threading.Event()
+    self._thread: threading.Thread | None = None
+
+  # region start and stop
+  def start(self):
+    '''
+    Start the watchdog thread, if it isn't running.
+    '''
+    if self._thread is not None and self._thread.is_alive():
+      return
+
+    self._stop.clear()
+    self._thread = threading.Thread(target=self._run, name="loop-watchdog", daemon=True)
+    self._thread.start()
+
+  def stop(self):
+    '''
+    Stop the watchdog thread.
+    '''
+    self._stop.set()
+
+    if self._thread is not None:
+      self._thread.join(timeout=1)
+      self._thread = None
+  # endregion
+
+  # region top
+  def top(self, limit: int = 10) -> list[BlockingSite]:
+    '''
+    Get the sites that blocked the loop the longest.
+
+    Parameters
+    ----------
+    limit: `int`
+        The number of sites.
+    return: `list[BlockingSite]`
+    '''
+    with self._lock:
+      return sorted(self.sites.values(), key=lambda site: site.seconds, reverse=True)[:limit]
+  # endregion
+
+  # region sampling
+  def _run(self):
+    # The blocked period being sampled, identified by the expected wake up of the monitor
+    blocked_period = None
+
+    while not self._stop.wait(self.check_interval):
+      expected = self.monitor.expected
+      if expected is None or self.monitor.thread_id is None:
+        continue
+
+      lag = time.perf_counter() - expected
+      if lag < self.threshold:
+        continue
+
+      frame = sys._current_frames().get(self.monitor.thread_id)
+      if frame is None:
+        continue
+
+      stack = traceback.extract_stack(frame)
+      del frame
+
+      is_new = blocked_period != expected
+      blocked_period = expected
+      # The first sample of a period also counts the lag before it was caught
+      site = self._record(describe_site(stack), is_new, lag if is_new else self.check_interval)
+
+      if is_new:
+        loop_blocked.inc()
+        logger.warning(
+          "Event loop blocked for %.3fs at %s\n%s",
+          lag, site.name, "".join(traceback.format_list(stack[-WATCHDOG_LOGGED_FRAMES:])).rstrip()
+        )
+
+  def _record(self, name: str, is_new: bool, seconds: float) -> BlockingSite:
+    with self._lock:
+      site = self.sites.get(name)
+
+      if site is None:
+        if len(self.sites) >= self.max_sites:
+          del self.sites[min(self.sites.values(), key=lambda item: item.seconds).name]
+        site = self.sites[name] = BlockingSite(name)
+
+      site.blocks += is_new
+      site.seconds += seconds
+      site.last_seen = time.time()
+      return site
+  # endregion
+
+# region describe_site
+def describe_site(stack: traceback.StackSummary) -> str:
+  '''
+  Name the site of a stack: its innermost frame and the innermost frame of the
+  bot's code, if they are different.
+
+  Parameters
+  ----------
+  stack: :class:`traceback.StackSummary`
+      The stack, from the outermost to the innermost frame.
+  return: `str`
+  '''
+  innermost = stack[-1]
+  own = next((frame for frame in reversed(stack) if is_own_code(frame.filename)), None)
+  name = f"{short_path(innermost.filename)}:{innermost.name}"
+
+  if own is not None and own is not innermost:
+    name += f" in {short_path(own.filename)}:{own.name}"
+
+  return name
+
+def is_own_code(filename: str) -> bool:
+  ''' True if the file is part of the bot, not of a library. '''
+  path = os.path.abspath(filename)
+  return path.startswith(PROJECT_ROOT) and "site-packages" not in path
+
+def short_path(filename: str) -> str:
+  ''' The path relative to the bot for its files, the last two parts for the others. '''
+  path = os.path.abspath(filename)
+
+  if is_own_code(path):
+    return os.path.relpath(path, PROJECT_ROOT)
+
+  return "/".join(path.split(os.sep)[-2:])
+# endregion
+
+# The monitor and the watchdog of the bot, started from `main.py`
+loop_monitor = LoopLagMonitor()
+blocking_watchdog = BlockingWatchdog(loop_monitor)
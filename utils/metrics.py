@@ -0,0 +1,483 @@
+'''
+This module contains the metrics of the bot.
+
+The metrics are kept in memory in a registry and rendered in the Prometheus text
+format, by the local exporter (`utils.metrics_server`) and by the `/stats` command.
+
+- command_latency_seconds: from the invocation to the defer, the first
+  response and the end of each slash command.
+- upstream_*: the requests of the services to the upstream APIs.
+- cache_requests_total: the hits and misses of each cache.
+- event_loop_lag_seconds: how late the event loop runs a scheduled callback.
+- event_loop_blocked_total: the periods caught by the blocking watchdog.
+'''
+import bisect
+import math
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Iterable
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from utils.const import METRICS_LATENCY_BUCKETS, METRICS_LOOP_LAG_BUCKETS
+
+# region metrics
+class Metric:
+  '''
+  The base of the metrics, a value for each combination of labels.
+  The metrics are updated from the event loop and the Spotify threads, so the
+  values are changed under a lock.
+
+  Parameters
+  ----------
+  name: `str`
+      The name of the metric.
+  documentation: `str`
+      The help text of the metric.
+  labelnames: `Iterable[str]`
+      The names of the labels.
+  '''
+  kind = "untyped"
+
+  def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+    self.name = name
+    self.documentation = documentation
+    self.labelnames = tuple(labelnames)
+    self._values: dict[tuple[str, ...], object] = {}
+    self._lock = threading.Lock()
+
+  def _key(self, labels: dict) -> tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+  def _labels(self, key: tuple[str, ...], **extra) -> str:
+    pairs = [*zip(self.labelnames, key), *extra.items()]
+    if not pairs:
+      return ""
+
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+  def items(self) -> list[tuple[dict[str, str], object]]:
+    ''' The labels and the value of each combination of labels. '''
+    with self._lock:
+      return [(dict(zip(self.labelnames, key)), value) for key, value in sorted(self._values.items())]
+
+  def clear(self):
+    ''' Remove all the values. '''
+    with self._lock:
+      self._values.clear()
+
+  def render(self) -> list[str]:
+    '''
+    The lines of the metric in the Prometheus text format.
+
+    return: `list[str]`
+    '''
+    lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    with self._lock:
+      for key, value in sorted(self._values.items()):
+        lines.append(f"{self.name}{self._labels(key)} {format_value(value)}")
+
+    return lines
+
+class Counter(Metric):
+  '''
+  A value that only goes up.
+  '''
+  kind = "counter"
+
+  def inc(self, amount: float = 1, **labels):
+    '''
+    Increase the value of the labels.
+
+    Parameters
+    ----------
+    amount: `float`
+        The amount to add. Default is 1.
+    '''
+    key = self._key(labels)
+    with self._lock:
+      self._values[key] = self._values.get(key, 0) + amount
+
+  def value(self, **labels) -> float:
+    ''' The value of the labels. '''
+    return self._values.get(self._key(labels), 0)
+
+class Gauge(Counter):
+  '''
+  A value that can go up and down.
+  '''
+  kind = "gauge"
+
+  def set(self, value: float, **labels):
+    '''
+    Set the value of the labels.
+    '''
+    with self._lock:
+      self._values[self._key(labels)] = value
+
+class Histogram(Metric):
+  '''
+  The distribution of the observed values in buckets.
+
+  Parameters
+  ----------
+  buckets: `Iterable[float]`
+      The upper bounds of the buckets, in increasing order.
+  '''
+  kind = "histogram"
+
+  def __init__(
+    self,
+    name: str,
+    documentation: str,
+    labelnames: Iterable[str] = (),
+    buckets: Iterable[float] = METRICS_LATENCY_BUCKETS
+  ):
+    super().__init__(name, documentation, labelnames)
+    self.buckets = tuple(sorted(buckets))
+
+  def observe(self, value: float, **labels):
+    '''
+    Add a value to the distribution of the labels.
+    '''
+    key = self._key(labels)
+    index = bisect.bisect_left(self.buckets, value)
+
+    with self._lock:
+      data = self._values.get(key)
+      if data is None:
+        # counts of each bucket, plus the values above the last one
+        data = self._values[key] = SimpleNamespace(counts=[0] * (len(self.buckets) + 1), sum=0.0, count=0)
+
+      data.counts[index] += 1
+      data.sum += value
+      data.count += 1
+
+  def count(self, **labels) -> int:
+    ''' The number of observed values of the labels. '''
+    data = self._values.get(self._key(labels))
+    return data.count if data else 0
+
+  def quantile(self, q: float, **labels) -> float | None:
+    '''
+    Estimate a quantile of the labels, interpolating inside its bucket.
+
+    Parameters
+    ----------
+    q: `float`
+        The quantile, between 0 and 1.
+    return: `float` or `None`
+        None if nothing was observed.
+    '''
+    data = self._values.get(self._key(labels))
+    if not data or not data.count:
+      return None
+
+    rank = q * data.count
+    seen = 0
+
+    for index, count in enumerate(data.counts):
+      if count and seen + count >= rank:
+        if index == len(self.buckets):
+          return self.buckets[-1]
+
+        lower = self.buckets[index - 1] if index else 0.0
+        return lower + (self.buckets[index] - lower) * (rank - seen) / count
+      seen += count
+
+    return self.buckets[-1]
+
+  def render(self) -> list[str]:
+    lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    with self._lock:
+      for key, data in sorted(self._values.items()):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), data.counts):
+          cumulative += count
+          lines.append(f"{self.name}_bucket{self._labels(key, le=format_value(bound))} {cumulative}")
+
+        lines.append(f"{self.name}_sum{self._labels(key)} {format_value(data.sum)}")
+        lines.append(f"{self.name}_count{self._labels(key)} {data.count}")
+
+    return lines
+
+def escape(value: str) -> str:
+  ''' Escape a label value for the Prometheus text format. '''
+  return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_value(value: float) -> str:
+  ''' Format a value for the Prometheus text format. '''
+  if value == math.inf:
+    return "+Inf"
+
+  return repr(float(value)) if isinstance(value, float) else str(value)
+# endregion
+
+# region registry
+class MetricsRegistry:
+  '''
+  All the metrics of the bot, by name.
+
+  The collectors are called before rendering, to copy into gauges the counters
+  that other modules keep themselves (the singleflight groups, the dispatcher).
+  '''
+  def __init__(self):
+    self.metrics: dict[str, Metric] = {}
+    self.collectors: dict[str, Callable[[], None]] = {}
+
+  def _get_or_create(self, cls: type, name: str, *args, **kwargs) -> Metric:
+    metric = self.metrics.get(name)
+
+    if metric is None:
+      metric = self.metrics[name] = cls(name, *args, **kwargs)
+
+    return metric
+
+  def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    ''' Get or create a counter. '''
+    return self._get_or_create(Counter, name, documentation, labelnames)
+
+  def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    ''' Get or create a gauge. '''
+    return self._get_or_create(Gauge, name, documentation, labelnames)
+
+  def histogram(
+    self,
+    name: str,
+    documentation: str,
+    labelnames: Iterable[str] = (),
+    buckets: Iterable[float] = METRICS_LATENCY_BUCKETS
+  ) -> Histogram:
+    ''' Get or create a histogram. '''
+    return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+  def add_collector(self, name: str, collector: Callable[[], None]):
+    '''
+    Add a function that updates some metrics before they are rendered.
+
+    Parameters
+    ----------
+    name: `str`
+        The name of the collector, to remove it later.
+    collector: `Callable[[], None]`
+        The function.
+    '''
+    self.collectors[name] = collector
+
+  def remove_collector(self, name: str):
+    ''' Remove a collector, if it exists. '''
+    self.collectors.pop(name, None)
+
+  def collect(self):
+    ''' Call the collectors. '''
+    for collector in list(self.collectors.values()):
+      collector()
+
+  def render(self) -> str:
+    '''
+    Render all the metrics in the Prometheus text format.
+
+    return: `str`
+    '''
+    self.collect()
+    lines = []
+
+    for metric in self.metrics.values():
+      lines.extend(metric.render())
+
+    return "\n".join(lines) + "\n"
+
+# The registry of the bot
+registry = MetricsRegistry()
+# endregion
+
+# region bot metrics
+command_latency = registry.histogram(
+  "command_latency_seconds",
+  "Seconds from the invocation of a slash command to each stage (defer, response, final)",
+  ("command", "stage"),
+)
+command_responses = registry.counter(
+  "command_responses_total",
+  "Slash commands answered in one response (fast) or with a defer and a followup (deferred)",
+  ("command", "path"),
+)
+upstream_requests = registry.counter(
+  "upstream_requests_total",
+  "Requests to the upstream APIs by host and status",
+  ("host", "status"),
+)
+upstream_latency = registry.histogram(
+  "upstream_request_seconds",
+  "Seconds of the requests to the upstream APIs",
+  ("host",),
+)
+upstream_bytes = registry.counter(
+  "upstream_response_bytes_total",
+  "Bytes received from the upstream APIs",
+  ("host",),
+)
+cache_requests = registry.counter(
+  "cache_requests_total",
+  "Lookups in the caches by tier and result",
+  ("cache", "tier", "result"),
+)
+loop_lag = registry.histogram(
+  "event_loop_lag_seconds",
+  "Seconds a scheduled callback waited for the event loop",
+  buckets=METRICS_LOOP_LAG_BUCKETS,
+)
+loop_blocked = registry.counter(
+  "event_loop_blocked_total",
+  "Periods where the event loop was late by more than the watchdog threshold",
+)
+startup_seconds = registry.gauge(
+  "startup_seconds",
+  "Seconds from the creation of the bot to each startup phase (extensions, connect, ready)",
+  ("phase",),
+)
+gateway_latency = registry.gauge(
+  "gateway_latency_seconds",
+  "Seconds between the last heartbeat of a shard and its acknowledgement",
+  ("shard",),
+)
+gateway_events = registry.counter(
+  "gateway_events_total",
+  "Events received by each shard",
+  ("shard",),
+)
+gateway_event_rate = registry.gauge(
+  "gateway_event_rate",
+  "Events per second received by each shard in the last interval",
+  ("shard",),
+)
+gateway_reconnects = registry.counter(
+  "gateway_reconnects_total",
+  "Times a shard connected again, resuming its session or identifying",
+  ("shard", "kind"),
+)
+gateway_disconnects = registry.counter(
+  "gateway_disconnects_total",
+  "Times a shard lost its connection",
+  ("shard",),
+)
+asset_uploads = registry.counter(
+  "asset_uploads_total",
+  "Uploads of the static assets, the other messages reuse their CDN URL",
+  ("asset",),
+)
+asset_bytes_saved = registry.gauge(
+  "asset_bytes_saved",
+  "Bytes saved by the size-optimized variant of each static asset",
+  ("asset",),
+)
+extension_load_seconds = registry.gauge(
+  "extension_load_seconds",
+  "Seconds of each stage (import, setup) of the loading of an extension",
+  ("extension", "stage"),
+)
+# endregion
+
+# region upstream tracing
+def create_trace_config() -> aiohttp.TraceConfig:
+  '''
+  Create the trace config that records the requests of an aiohttp session in
+  the upstream metrics.
+
+  return: :class:`aiohttp.TraceConfig`
+  '''
+  trace_config = aiohttp.TraceConfig()
+
+  async def on_request_start(session, context, params):
+    context.start = time.perf_counter()
+    context.host = urlsplit(str(params.url)).hostname or "unknown"
+
+  async def on_request_end(session, context, params):
+    upstream_latency.observe(time.perf_counter() - context.start, host=context.host)
+    upstream_requests.inc(host=context.host, status=params.response.status)
+
+  async def on_request_exception(session, context, params):
+    upstream_latency.observe(time.perf_counter() - context.start, host=context.host)
+    upstream_requests.inc(host=context.host, status=type(params.exception).__name__)
+
+  async def on_response_chunk_received(session, context, params):
+    upstream_bytes.inc(len(params.chunk), host=context.host)
+
+  trace_config.on_request_start.append(on_request_start)
+  trace_config.on_request_end.append(on_request_end)
+  trace_config.on_request_exception.append(on_request_exception)
+  trace_config.on_response_chunk_received.append(on_response_chunk_received)
+  return trace_config
+
+def record_requests_response(response, *args, **kwargs):
+  '''
+  The `requests` response hook that records the requests of spotipy in the
+  upstream metrics. It runs on the Spotify threads.
+
+  Parameters
+  ----------
+  response: :class:`requests.Response`
+      The response of the request.
+  '''
+  host = urlsplit(response.url).hostname or "unknown"
+  upstream_latency.observe(response.elapsed.total_seconds(), host=host)
+  upstream_requests.inc(host=host, status=response.status_code)
+  upstream_bytes.inc(len(response.content), host=host)
+# endregion
+
+# region summary
+def summarize() -> dict[str, list[str]]:
+  '''
+  Summarize the bot metrics in short lines, for the `/stats` command.
+
+  return: `dict`
+      The lines of each section: "Commands", "Upstreams", "Caches" and "Event loop".
+  '''
+  registry.collect()
+  summary = {"Commands": [], "Upstreams": [], "Caches": [], "Event loop": []}
+
+  for labels, _ in command_latency.items():
+    p50 = command_latency.quantile(0.5, **labels)
+    p99 = command_latency.quantile(0.99, **labels)
+    summary["Commands"].append(
+      f"/{labels['command']} {labels['stage']}: p50 {p50:.3f}s · p99 {p99:.3f}s "
+      f"({command_latency.count(**labels)})"
+    )
+
+  for command in sorted({labels["command"] for labels, _ in command_responses.items()}):
+    fast = command_responses.value(command=command, path="fast")
+    deferred = command_responses.value(command=command, path="deferred")
+    summary["Commands"].append(
+      f"/{command} responses: {fast / (fast + deferred):.0%} fast ({fast:g} fast, {deferred:g} deferred)"
+    )
+
+  for labels, _ in upstream_latency.items():
+    host = labels["host"]
+    statuses = {
+      labels["status"]: count for labels, count in upstream_requests.items() if labels["host"] == host
+    }
+    summary["Upstreams"].append(
+      f"{host}: p99 {upstream_latency.quantile(0.99, host=host):.3f}s · "
+      f"{upstream_bytes.value(host=host) / 1024:.0f} KiB · "
+      + ", ".join(f"{status}×{count:g}" for status, count in sorted(statuses.items()))
+    )
+
+  caches = sorted({labels["cache"] for labels, _ in cache_requests.items()})
+  for cache in caches:
+    hits = cache_requests.value(cache=cache, tier="l1", result="hit")
+    misses = cache_requests.value(cache=cache, tier="l1", result="miss")
+    l2_hits = cache_requests.value(cache=cache, tier="l2", result="hit")
+    ratio = (hits + l2_hits) / (hits + misses) if hits + misses else 0
+    summary["Caches"].append(f"{cache}: {ratio:.0%} hits ({hits:g} L1, {l2_hits:g} L2, {misses:g} L1 misses)")
+
+  if loop_lag.count():
+    summary["Event loop"].append(
+      f"lag p50 {loop_lag.quantile(0.5) * 1000:.1f}ms · p99 {loop_lag.quantile(0.99) * 1000:.1f}ms"
+    )
+
+  return summary
+# endregion
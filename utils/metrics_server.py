@@ -0,0 +1,76 @@
+'''
+This module contains the local exporter of the metrics.
+
+It serves the registry in the Prometheus text format on `/metrics`, only on the
+local interface. It runs in the bot's event loop, rendering is cheap.
+'''
+from aiohttp import web
+
+from utils.apikeys import METRICS_PORT
+from utils.const import METRICS_HOST
+from utils.logger_config import logger
+from utils.metrics import registry
+
+
+class MetricsServer:
+  '''
+  An aiohttp server with the `/metrics` endpoint.
+
+  Parameters
+  ----------
+  host: `str`
+      The interface to listen on.
+  port: `int`
+      The port to listen on, 0 to disable the server.
+  '''
+  def __init__(self, host: str = METRICS_HOST, port: int = METRICS_PORT):
+    self.host = host
+    self.port = port
+    self._runner: web.AppRunner = None
+
+  async def handle_metrics(self, request: web.Request) -> web.Response:
+    '''
+    Render the registry.
+    '''
+    return web.Response(
+      text=registry.render(),
+      content_type="text/plain",
+      headers={"X-Content-Type-Options": "nosniff"},
+    )
+
+  # region start and stop
+  async def start(self):
+    '''
+    Start listening, if the server is enabled and isn't running.
+    This is an asynchronous function and should be called with 'await'.
+    '''
+    if not self.port or self._runner is not None:
+      return
+
+    app = web.Application()
+    app.router.add_get("/metrics", self.handle_metrics)
+
+    self._runner = web.AppRunner(app, access_log=None)
+    await self._runner.setup()
+
+    try:
+      await web.TCPSite(self._runner, self.host, self.port).start()
+    except OSError as err:
+      logger.error("Failed to start the metrics server on port %s: %s", self.port, err)
+      await self.stop()
+      return
+
+    logger.info("Metrics served on http://%s:%s/metrics", self.host, self.port)
+
+  async def stop(self):
+    '''
+    Stop listening.
+    This is an asynchronous function and should be called with 'await'.
+    '''
+    if self._runner is not None:
+      await self._runner.cleanup()
+      self._runner = None
+  # endregion
+
+# The exporter of the bot, started from `main.py`
+metrics_server = MetricsServer()
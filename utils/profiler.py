@@ -0,0 +1,179 @@
+'''
+This module contains the sampling profiler used by the `/profile` command.
+
+A thread takes the stack of every other thread at a fixed interval while the bot
+keeps running. Nothing is instrumented, so the overhead is the sampling thread
+alone and the profiler can run on the live bot. The result has the functions with
+the most cumulative samples and the stacks in the collapsed format read by the
+flamegraph tools (`flamegraph.pl`, speedscope).
+'''
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType, FrameType
+
+from utils.const import PROFILE_SAMPLE_INTERVAL
+from utils.loop_monitor import short_path
+
+# The innermost functions of a thread that is waiting, its samples are idle.
+# The workers of the thread pools and the log listener wait inside C calls.
+IDLE_FUNCTIONS = frozenset({
+  "select", "poll", "epoll", "wait", "_wait_for_tstate_lock", "accept", "_worker", "dequeue",
+})
+
+def is_idle(stack: tuple[str, ...]) -> bool:
+  ''' True if the innermost function of the stack is waiting. '''
+  return stack[-1].rpartition(":")[2] in IDLE_FUNCTIONS
+
+
+class ProfileResult:
+  '''
+  The samples taken by the profiler.
+
+  Attributes
+  ----------
+  seconds: `float`
+      The seconds the profiler ran.
+  samples: `int`
+      The number of times the threads were sampled.
+  stacks: `Counter`
+      The number of samples of each stack, as tuples of functions from the
+      thread name to the innermost function.
+  '''
+  def __init__(self, seconds: float, samples: int, stacks: Counter):
+    self.seconds = seconds
+    self.samples = samples
+    self.stacks = stacks
+
+  @property
+  def busy_samples(self) -> int:
+    ''' The number of stack samples of threads that weren't waiting. '''
+    return sum(count for stack, count in self.stacks.items() if not is_idle(stack))
+
+  # region top
+  def top(self, limit: int = 15) -> list[tuple[str, int, int]]:
+    '''
+    Get the functions with the most cumulative samples, without the idle samples.
+
+    Parameters
+    ----------
+    limit: `int`
+        The number of functions.
+    return: `list[tuple[str, int, int]]`
+        The function, its cumulative samples and its own samples.
+    '''
+    cumulative = Counter()
+    own = Counter()
+
+    for stack, count in self.stacks.items():
+      if is_idle(stack):
+        continue
+
+      # A recursive function counts once per sample
+      for function in set(stack[1:]):
+        cumulative[function] += count
+      own[stack[-1]] += count
+
+    return [(function, count, own[function]) for function, count in cumulative.most_common(limit)]
+  # endregion
+
+  # region collapsed
+  def collapsed(self) -> str:
+    '''
+    Get the stacks in the collapsed format, one `thread;outer;...;inner count` per line.
+
+    return: `str`
+    '''
+    return "\n".join(
+      f"{';'.join(stack)} {count}" for stack, count in sorted(self.stacks.items())
+    ) + "\n"
+  # endregion
+
+
+class SamplingProfiler:
+  '''
+  Samples the stacks of all the threads of the bot.
+
+  Parameters
+  ----------
+  interval: `float`
+      The seconds between the samples.
+  '''
+  def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+    self.interval = interval
+    self._lock = asyncio.Lock()
+    # code object -> "file:function", the labels are built once per function
+    self._labels: dict[CodeType, str] = {}
+
+  @property
+  def running(self) -> bool:
+    ''' True while a profile is being taken. '''
+    return self._lock.locked()
+
+  # region profile
+  async def profile(self, seconds: float) -> ProfileResult:
+    '''
+    Sample the threads for some seconds. Only one profile runs at a time.
+    This is an asynchronous function and should be called with 'await'.
+
+    Parameters
+    ----------
+    seconds: `float`
+        The seconds to sample.
+    return: :class:`ProfileResult`
+    '''
+    async with self._lock:
+      stop = threading.Event()
+      stacks = Counter()
+      samples = [0]
+
+      thread = threading.Thread(
+        target=self._sample, args=(stop, stacks, samples), name="sampling-profiler", daemon=True
+      )
+      start = time.perf_counter()
+      thread.start()
+
+      try:
+        await asyncio.sleep(seconds)
+      finally:
+        stop.set()
+        await asyncio.to_thread(thread.join)
+
+      return ProfileResult(time.perf_counter() - start, samples[0], stacks)
+  # endregion
+
+  # region sampling
+  def _sample(self, stop: threading.Event, stacks: Counter, samples: list):
+    own_id = threading.get_ident()
+
+    while not stop.wait(self.interval):
+      names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+      for thread_id, frame in sys._current_frames().items():
+        if thread_id != own_id:
+          stacks[self._stack(names.get(thread_id, str(thread_id)), frame)] += 1
+
+      samples[0] += 1
+
+  def _stack(self, thread_name: str, frame: FrameType) -> tuple[str, ...]:
+    functions = []
+
+    while frame is not None:
+      code = frame.f_code
+      label = self._labels.get(code)
+
+      if label is None:
+        label = self._labels[code] = f"{short_path(code.co_filename)}:{code.co_name}"
+
+      functions.append(label)
+      frame = frame.f_back
+
+    functions.append(thread_name)
+    functions.reverse()
+    return tuple(functions)
+  # endregion
+
+# The profiler of the `/profile` command
+profiler = SamplingProfiler()
@@ -0,0 +1,152 @@
+'''
+This module contains the dispatcher of the bot's reactions to trigger messages.
+
+The reactions of a message are sent concurrently in a background task, so the
+listener returns right away. Triggers over the per-channel or per-user budget
+are dropped, and triggers in a channel that is still being answered are merged
+into that answer, so spam can't turn into a burst of rate limited requests.
+'''
+import asyncio
+
+import discord
+
+from utils.const import (
+  REACTION_CHANNEL_COOLDOWN,
+  REACTION_EMOJIS,
+  REACTION_GIF,
+  REACTION_MAX_PENDING,
+  REACTION_USER_COOLDOWN,
+)
+from utils.cooldowns import CooldownTracker
+from utils.logger_config import logger
+from utils.metrics import registry
+
+reaction_triggers = registry.gauge(
+  "reaction_triggers",
+  "Trigger messages by outcome (dispatched, merged, dropped) and pending",
+  ("kind",),
+)
+
+
+class ReactionDispatcher:
+  '''
+  Sends the reactions to the trigger messages within a budget.
+
+  Parameters
+  ----------
+  channel_cooldown: `float`
+      The seconds between reactions in the same channel.
+  user_cooldown: `float`
+      The seconds between reactions to the same user.
+  max_pending: `int`
+      The number of reactions sent at the same time. The triggers over it are dropped.
+
+  Attributes
+  ----------
+  dispatched: `int`
+      The triggers answered.
+  merged: `int`
+      The triggers that arrived while their channel was being answered.
+  dropped: `int`
+      The triggers over the budget.
+  '''
+  def __init__(
+    self,
+    channel_cooldown: float = REACTION_CHANNEL_COOLDOWN,
+    user_cooldown: float = REACTION_USER_COOLDOWN,
+    max_pending: int = REACTION_MAX_PENDING
+  ):
+    self.channel_cooldowns = CooldownTracker(channel_cooldown)
+    self.user_cooldowns = CooldownTracker(user_cooldown)
+    self.max_pending = max_pending
+    self.dispatched = 0
+    self.merged = 0
+    self.dropped = 0
+    # channel id -> task sending its reactions
+    self._pending: dict[int, asyncio.Task] = {}
+
+  # region dispatch
+  def dispatch(self, message: discord.Message) -> bool:
+    '''
+    Send the reactions to a trigger message, if it is within the budget.
+    It must be called from the event loop, the reactions are sent in the background.
+
+    Parameters
+    ----------
+    message: :class:`discord.Message`
+        The trigger message.
+    return: `bool`
+        True if the reactions are being sent, False if the trigger was merged or dropped.
+    '''
+    channel_id = message.channel.id
+    user_id = message.author.id
+
+    if channel_id in self._pending:
+      self.merged += 1
+      return False
+
+    now = CooldownTracker.now()
+    if (
+      len(self._pending) >= self.max_pending
+      or not self.channel_cooldowns.is_ready(channel_id, now)
+      or not self.user_cooldowns.is_ready(user_id, now)
+    ):
+      self.dropped += 1
+      return False
+
+    self.channel_cooldowns.record(channel_id, now)
+    self.user_cooldowns.record(user_id, now)
+    self.dispatched += 1
+
+    task = asyncio.create_task(self._send(message))
+    self._pending[channel_id] = task
+    task.add_done_callback(lambda _: self._pending.pop(channel_id, None))
+    return True
+  # endregion
+
+  # region _send
+  async def _send(self, message: discord.Message):
+    # The reactions and the gif are independent requests, send them at once
+    results = await asyncio.gather(
+      *(message.add_reaction(emoji) for emoji in REACTION_EMOJIS),
+      message.channel.send(REACTION_GIF),
+      return_exceptions=True
+    )
+
+    for result in results:
+      if isinstance(result, Exception):
+        logger.error("Failed to react to message %s: %s", message.id, result)
+  # endregion
+
+  # region close
+  def close(self):
+    '''
+    Cancel the reactions being sent.
+    '''
+    for task in self._pending.values():
+      task.cancel()
+
+    self._pending.clear()
+  # endregion
+
+  # region stats
+  def stats(self) -> dict[str, int]:
+    '''
+    Get the counters of the dispatcher.
+
+    return: `dict`
+    '''
+    return {
+      "dispatched": self.dispatched,
+      "merged": self.merged,
+      "dropped": self.dropped,
+      "pending": len(self._pending),
+    }
+
+  def collect_metrics(self):
+    '''
+    Copy the counters of the dispatcher into the registry.
+    '''
+    for kind, value in self.stats().items():
+      reaction_triggers.set(value, kind=kind)
+  # endregion
@@ -0,0 +1,254 @@
+'''
+This module contains the configuration of the shards and their monitor.
+
+With `AUTO_SHARD` the bot is an :class:`AutoShardedBot`: one gateway connection
+per shard, each one with the events of its share of the guilds. `SHARD_COUNT` is
+the total of shards (default is Discord's recommendation) and `SHARD_IDS` the
+shards of this process (default is all of them), so several processes can share
+the shards of the bot.
+
+The monitor reads each shard's connection at a fixed interval. The sequence
+number of a connection grows with every event Discord sends, so the events and
+their rate come from it without hooking into the library. The reconnections are
+counted from the connection events of the bot.
+'''
+import asyncio
+import time
+
+import discord
+
+from utils.const import PING_MAX_SHARDS, SHARD_SAMPLE_INTERVAL
+from utils.metrics import (
+  gateway_disconnects,
+  gateway_event_rate,
+  gateway_events,
+  gateway_latency,
+  gateway_reconnects,
+  registry,
+)
+
+def parse_shard_ids(text: str) -> list[int] | None:
+  '''
+  Parse the shards of a process, like `0-3,8`.
+
+  Parameters
+  ----------
+  text: `str`
+      Shard ids and inclusive ranges, separated by commas.
+  return: `list[int]` | `None`
+      The shard ids in order, `None` if there are none (every shard).
+  '''
+  shard_ids = set()
+
+  for part in text.split(","):
+    part = part.strip()
+    if not part:
+      continue
+
+    first, _, last = part.partition("-")
+    shard_ids.update(range(int(first), int(last or first) + 1))
+
+  return sorted(shard_ids) or None
+
+
+class ShardStats:
+  '''
+  The health of a shard.
+
+  Attributes
+  ----------
+  shard_id: `int`
+      The id of the shard.
+  latency: `float`
+      The seconds between the last heartbeat and its acknowledgement.
+  events: `int`
+      The events received since the bot started.
+  event_rate: `float`
+      The events per second of the last interval.
+  reconnects: `int`
+      The times the shard connected again, resuming its session or not.
+  '''
+  __slots__ = ("shard_id", "latency", "events", "event_rate", "reconnects", "_sequence", "_session", "_connected")
+
+  def __init__(self, shard_id: int):
+    self.shard_id = shard_id
+    self.latency = float("nan")
+    self.events = 0
+    self.event_rate = 0.0
+    self.reconnects = 0
+    self._sequence = 0
+    self._session: str | None = None
+    self._connected = False
+
+
+class ShardMonitor:
+  '''
+  Measures the latency, the events and the reconnections of each shard.
+
+  Parameters
+  ----------
+  interval: `float`
+      The seconds between the samples of the connections.
+  '''
+  def __init__(self, interval: float = SHARD_SAMPLE_INTERVAL):
+    self.interval = interval
+    self.shards: dict[int, ShardStats] = {}
+    self._bot: discord.Client = None
+    self._task: asyncio.Task = None
+
+  def _stats(self, shard_id: int) -> ShardStats:
+    stats = self.shards.get(shard_id)
+
+    if stats is None:
+      stats = self.shards[shard_id] = ShardStats(shard_id)
+
+    return stats
+
+  # region start and stop
+  def start(self, bot: discord.Client):
+    '''
+    Start sampling the shards of a bot, if it isn't running. It must be called from the event loop.
+    '''
+    self._bot = bot
+
+    if self._task is None or self._task.done():
+      self._task = asyncio.create_task(self._run(), name="shard-monitor")
+      registry.add_collector("shards", self.collect)
+
+  def stop(self):
+    '''
+    Stop sampling.
+    '''
+    if self._task is not None:
+      self._task.cancel()
+      self._task = None
+      registry.remove_collector("shards")
+  # endregion
+
+  # region connection events
+  def connected(self, shard_id: int):
+    '''
+    Record that a shard identified, a reconnection if it connected before.
+    '''
+    stats = self._stats(shard_id)
+
+    if stats._connected:
+      stats.reconnects += 1
+      gateway_reconnects.inc(shard=shard_id, kind="identify")
+
+    stats._connected = True
+
+  def resumed(self, shard_id: int):
+    '''
+    Record that a shard resumed its session.
+    '''
+    self._stats(shard_id).reconnects += 1
+    gateway_reconnects.inc(shard=shard_id, kind="resume")
+
+  def disconnected(self, shard_id: int):
+    '''
+    Record that a shard lost its connection.
+    '''
+    self._stats(shard_id)
+    gateway_disconnects.inc(shard=shard_id)
+  # endregion
+
+  # region sample
+  def websockets(self) -> dict[int, object]:
+    '''
+    Get the gateway connection of each shard of the bot.
+
+    return: `dict[int, DiscordWebSocket]`
+    '''
+    if isinstance(self._bot, discord.AutoShardedClient):
+      return {shard_id: shard._parent.ws for shard_id, shard in self._bot.shards.items()}
+
+    websocket = getattr(self._bot, "ws", None)
+    return {} if websocket is None else {self._bot.shard_id or 0: websocket}
+
+  def sample(self, seconds: float):
+    '''
+    Add the events received by each shard since the last sample.
+
+    Parameters
+    ----------
+    seconds: `float`
+        The seconds since the last sample.
+    '''
+    for shard_id, websocket in self.websockets().items():
+      stats = self._stats(shard_id)
+      sequence = websocket.sequence or 0
+
+      # A new session starts its sequence again, a resumed one keeps it
+      if websocket.session_id == stats._session and sequence >= stats._sequence:
+        received = sequence - stats._sequence
+      else:
+        received = sequence
+
+      stats._sequence = sequence
+      stats._session = websocket.session_id
+      stats.events += received
+      stats.event_rate = received / seconds if seconds > 0 else 0.0
+      stats.latency = websocket.latency
+
+      gateway_events.inc(received, shard=shard_id)
+      gateway_event_rate.set(stats.event_rate, shard=shard_id)
+
+  def collect(self):
+    '''
+    Update the latency of each shard in the metrics, registered as a collector.
+    '''
+    for shard_id, websocket in self.websockets().items():
+      self._stats(shard_id).latency = websocket.latency
+      gateway_latency.set(websocket.latency, shard=shard_id)
+
+  async def _run(self):
+    last = time.perf_counter()
+
+    while True:
+      await asyncio.sleep(self.interval)
+      now = time.perf_counter()
+      self.sample(now - last)
+      last = now
+  # endregion
+
+  def stats(self) -> list[ShardStats]:
+    '''
+    Get the health of every shard, by shard id.
+
+    return: `list[ShardStats]`
+    '''
+    self.collect()
+    return [self.shards[shard_id] for shard_id in sorted(self.shards)]
+
+def describe_shards(stats: list[ShardStats], current: int | None = None, limit: int = PING_MAX_SHARDS) -> list[str]:
+  '''
+  Describe the health of the shards in short lines, for the `/ping` command.
+
+  Parameters
+  ----------
+  stats: `list[ShardStats]`
+      The shards, from :meth:`ShardMonitor.stats`.
+  current: `int` | `None`
+      The shard of the server where the command was used, it is marked.
+  limit: `int`
+      The shards listed, the rest are summarized in one line.
+  return: `list[str]`
+  '''
+  lines = []
+
+  for shard in stats[:limit]:
+    latency = "-" if shard.latency != shard.latency else f"{shard.latency * 1000:.0f}ms" # NaN before the first heartbeat
+    marker = " (this server)" if shard.shard_id == current and len(stats) > 1 else ""
+    lines.append(
+      f"Shard {shard.shard_id}{marker}: {latency} · {shard.event_rate:.1f} events/s · "
+      f"{shard.reconnects} reconnects"
+    )
+
+  if len(stats) > limit:
+    lines.append(f"... and {len(stats) - limit} more shards")
+
+  return lines
+
+# The monitor of the shards of this process
+shard_monitor = ShardMonitor()
@@ -0,0 +1,118 @@
+'''
+This module contains the request coalescing used by the services.
+
+When several commands ask for the same key at the same time (five `/rlrank`
+for the same nametag), only the first one calls the upstream API and the
+others await the same in-flight result.
+'''
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from utils.logger_config import logger
+from utils.metrics import registry
+
+# All the groups by name, to report their counters
+groups: dict[str, "SingleFlight"] = {}
+
+class SingleFlight:
+  '''
+  A group of coalesced calls.
+
+  Parameters
+  ----------
+  name: `str`
+      The name of the group, used in the logs and the stats.
+
+  Attributes
+  ----------
+  calls: `int`
+      The number of calls made through the group.
+  executions: `int`
+      The number of calls that actually ran the function.
+  coalesced: `int`
+      The number of calls that awaited an in-flight execution instead.
+  '''
+  def __init__(self, name: str):
+    self.name = name
+    self.calls = 0
+    self.executions = 0
+    self.coalesced = 0
+    self._in_flight: dict[Hashable, asyncio.Task] = {}
+
+    groups[name] = self
+
+  # region do
+  async def do(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+    '''
+    Run `func(*args, **kwargs)`, or await its in-flight execution for the same key.
+    This is an asynchronous function and should be called with 'await'.
+
+    The execution runs in its own task, so cancelling one caller doesn't
+    cancel the result the other callers are waiting for.
+
+    Parameters
+    ----------
+    key: `Hashable`
+        The key that identifies identical calls.
+    func: `Callable`
+        The coroutine function to run.
+    return: `Any`
+        The result of the function. Its exceptions are raised to every caller.
+    '''
+    self.calls += 1
+    task = self._in_flight.get(key)
+
+    if task is None:
+      self.executions += 1
+      task = asyncio.ensure_future(func(*args, **kwargs))
+      self._in_flight[key] = task
+      task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+    else:
+      self.coalesced += 1
+      logger.debug("Coalesced %s call for %s", self.name, key)
+
+    return await asyncio.shield(task)
+  # endregion
+
+  # region stats
+  def stats(self) -> dict[str, int]:
+    '''
+    Get the counters of the group.
+
+    return: `dict`
+    '''
+    return {
+      "calls": self.calls,
+      "executions": self.executions,
+      "coalesced": self.coalesced,
+      "in_flight": len(self._in_flight),
+    }
+  # endregion
+
+# region stats
+def stats() -> dict[str, dict[str, int]]:
+  '''
+  Get the counters of every group by name.
+
+  return: `dict`
+  '''
+  return {name: group.stats() for name, group in groups.items()}
+# endregion
+
+# region metrics
+singleflight_calls = registry.gauge(
+  "singleflight_calls",
+  "Calls of each singleflight group by outcome (execution, coalesced) and in flight",
+  ("group", "kind"),
+)
+
+def collect_metrics():
+  '''
+  Copy the counters of the groups into the registry.
+  '''
+  for name, group_stats in stats().items():
+    for kind, value in group_stats.items():
+      singleflight_calls.set(value, group=name, kind=kind)
+
+registry.add_collector("singleflight", collect_metrics)
+# endregion
@@ -0,0 +1,225 @@
+'''
+This module contains the loading of the extensions and the startup report.
+
+The extensions are imported at the same time on worker threads, with their
+dependencies, and then set up one by one on the event loop with `load_extension`.
+It runs the module of the extension again, which is cheap: its dependencies,
+the slow part of the import, are already loaded.
+
+An extension whose import takes longer than `EXTENSION_IMPORT_TIMEOUT` doesn't
+hold up the connection to Discord: it is set up when its import finishes and its
+slash commands are synchronized then. An extension that fails is reported and
+skipped, the rest of the bot keeps working.
+'''
+import asyncio
+import importlib
+import os
+import time
+
+from discord.ext import commands
+
+from utils.const import EXTENSION_IMPORT_TIMEOUT, EXTENSIONS_PACKAGE
+from utils.logger_config import logger
+from utils.metrics import extension_load_seconds, startup_seconds
+
+
+class ExtensionStatus:
+  '''
+  The loading of an extension.
+
+  Attributes
+  ----------
+  name: `str`
+      The name of the extension, like `cogs.utilities`.
+  state: `str`
+      "importing", "loaded", "late" (loaded after the timeout) or "failed".
+  import_seconds: `float` | `None`
+      The seconds of the import, `None` while it runs.
+  setup_seconds: `float` | `None`
+      The seconds of the setup, `None` until it runs.
+  error: `str` | `None`
+      Why the extension failed.
+  '''
+  __slots__ = ("name", "state", "import_seconds", "setup_seconds", "error")
+
+  def __init__(self, name: str):
+    self.name = name
+    self.state = "importing"
+    self.import_seconds: float | None = None
+    self.setup_seconds: float | None = None
+    self.error: str | None = None
+
+
+class StartupReport:
+  '''
+  The times of the startup: each extension, and the phases from the start of the
+  bot until the extensions are loaded, the gateway is connected and the bot is ready.
+  '''
+  def __init__(self):
+    self.started_at = time.perf_counter()
+    self.phases: dict[str, float] = {}
+    self.extensions: dict[str, ExtensionStatus] = {}
+
+  def mark(self, phase: str) -> bool:
+    '''
+    Record the time of a phase, only the first time it happens.
+
+    Parameters
+    ----------
+    phase: `str`
+        The phase, like "connect" or "ready".
+    return: `bool`
+        True if it is the first time.
+    '''
+    if phase in self.phases:
+      return False
+
+    seconds = self.phases[phase] = time.perf_counter() - self.started_at
+    startup_seconds.set(seconds, phase=phase)
+    return True
+
+  # region render
+  def render(self) -> str:
+    '''
+    Get the report as a table, one extension per line and the phases at the end.
+
+    return: `str`
+    '''
+    def format_seconds(seconds: float | None) -> str:
+      return "-" if seconds is None else f"{seconds:.3f}s"
+
+    lines = [f"{'extension':<24} {'import':>9} {'setup':>9}  state"]
+
+    for status in self.extensions.values():
+      line = (
+        f"{status.name:<24} {format_seconds(status.import_seconds):>9} "
+        f"{format_seconds(status.setup_seconds):>9}  {status.state}"
+      )
+      lines.append(f"{line} ({status.error})" if status.error else line)
+
+    lines.append(" · ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases.items()))
+    return "\n".join(lines)
+  # endregion
+
+
+class ExtensionLoader:
+  '''
+  Loads the extensions of a bot.
+
+  Parameters
+  ----------
+  bot: :class:`commands.Bot`
+      The bot.
+  report: :class:`StartupReport`
+      Where the times are recorded.
+  timeout: `float`
+      The seconds the connection waits for the imports.
+  '''
+  def __init__(self, bot: commands.Bot, report: StartupReport, timeout: float = EXTENSION_IMPORT_TIMEOUT):
+    self.bot = bot
+    self.report = report
+    self.timeout = timeout
+    self._late: set[asyncio.Task] = set()
+
+  # region discover
+  @staticmethod
+  def discover(package: str = EXTENSIONS_PACKAGE) -> list[str]:
+    '''
+    Get the extensions of a package, one per module.
+
+    Parameters
+    ----------
+    package: `str`
+        The package, a folder of the working directory.
+    return: `list[str]`
+    '''
+    return sorted(
+      f"{package}.{filename[:-3]}" for filename in os.listdir(f"./{package}") if filename.endswith(".py")
+    )
+  # endregion
+
+  # region load
+  async def load_all(self, names: list[str] = None):
+    '''
+    Import the extensions at the same time and set up the ones imported within
+    the timeout. The rest are set up later, in the background.
+    This is an asynchronous function and should be called with 'await'.
+
+    Parameters
+    ----------
+    names: `list[str]`
+        The extensions. Default is every module of `EXTENSIONS_PACKAGE`.
+    '''
+    names = names or self.discover()
+    imports = {}
+
+    for name in names:
+      self.report.extensions[name] = ExtensionStatus(name)
+      imports[name] = asyncio.create_task(self._import(name), name=f"import-{name}")
+
+    await asyncio.wait(imports.values(), timeout=self.timeout)
+
+    # Set up in a fixed order, whatever order the imports finished in
+    for name, task in imports.items():
+      if task.done():
+        self._setup(name)
+      else:
+        logger.warning("Extension %s is still importing, it will be loaded later", name)
+        late = asyncio.create_task(self._load_late(name, task), name=f"load-{name}")
+        self._late.add(late)
+        late.add_done_callback(self._late.discard)
+
+    self.report.mark("extensions")
+
+  async def _import(self, name: str):
+    start = time.perf_counter()
+
+    try:
+      await asyncio.to_thread(importlib.import_module, name)
+    except Exception as e:
+      # The setup imports it again on the event loop and reports the error
+      logger.debug("Import of %s failed on a worker thread: %s", name, e)
+
+    seconds = self.report.extensions[name].import_seconds = time.perf_counter() - start
+    extension_load_seconds.set(seconds, extension=name, stage="import")
+
+  def _setup(self, name: str, state: str = "loaded") -> bool:
+    status = self.report.extensions[name]
+    start = time.perf_counter()
+
+    try:
+      self.bot.load_extension(name)
+      status.state = state
+      logger.debug("Loaded extension: %s", name)
+    except Exception as e:
+      status.state = "failed"
+      status.error = str(e.__cause__ or e)
+      logger.error("Failed to load extension %s. Error: %s", name, status.error)
+
+    seconds = status.setup_seconds = time.perf_counter() - start
+    extension_load_seconds.set(seconds, extension=name, stage="setup")
+    return status.state != "failed"
+
+  async def _load_late(self, name: str, task: asyncio.Task):
+    await task
+
+    if not self._setup(name, state="late"):
+      return
+
+    # Before the connection, the commands are synchronized with the others
+    if "connect" not in self.report.phases:
+      return
+
+    try:
+      await self.bot.sync_all_application_commands()
+      logger.info("Extension %s loaded late, its commands were synchronized", name)
+    except Exception as e:
+      logger.error("Failed to synchronize the commands of %s. Error: %s", name, e)
+  # endregion
+
+  def close(self):
+    '''
+    Stop waiting for the extensions that are still importing.
+    '''
+    for task in self._late:
+      task.cancel()
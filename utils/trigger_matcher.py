@@ -0,0 +1,67 @@
+'''
+This module contains the matcher of the words the bot reacts to.
+
+The triggers are compiled once: the exact triggers into a set (one hash lookup
+per message) and the substring triggers into one regular expression, instead
+of comparing every message against every word.
+'''
+import re
+from typing import Iterable
+
+
+class TriggerMatcher:
+  '''
+  A compiled set of triggers.
+
+  Parameters
+  ----------
+  exact: `Iterable[str]`
+      The triggers that must be the whole message.
+  substrings: `Iterable[str]`
+      The triggers that can be anywhere in the message.
+  '''
+  __slots__ = ("exact", "substrings", "_pattern")
+
+  def __init__(self, exact: Iterable[str] = (), substrings: Iterable[str] = ()):
+    self.exact = frozenset(word.lower().strip() for word in exact if word.strip())
+    self.substrings = tuple(sorted(
+      {word.lower().strip() for word in substrings if word.strip()},
+      # Longest first, so the longest trigger wins when they overlap
+      key=lambda word: (-len(word), word)
+    ))
+    self._pattern = (
+      re.compile("|".join(re.escape(word) for word in self.substrings))
+      if self.substrings else None
+    )
+
+  def __bool__(self):
+    return bool(self.exact or self.substrings)
+
+  # region match
+  def match(self, content: str) -> str | None:
+    '''
+    Get the trigger found in a message.
+
+    Parameters
+    ----------
+    content: `str`
+        The content of the message.
+    return: `str` or `None`
+        The matched trigger, or None if there isn't one.
+    '''
+    if not content:
+      return None
+
+    content = content.lower()
+    stripped = content.strip()
+
+    if stripped in self.exact:
+      return stripped
+
+    if self._pattern is not None:
+      found = self._pattern.search(content)
+      if found is not None:
+        return found.group()
+
+    return None
+  # endregion
@@ -0,0 +1,164 @@
+'''
+This module contains the storage of the triggers configured for each guild.
+
+The configuration is saved in a JSON file in `DATA_DIR`. The compiled matchers are kept in a
+read-through cache: a guild's matcher is compiled the first time one of its
+messages is checked, and it is dropped when its triggers change, so the changes
+apply to the next message without restarting the bot.
+'''
+import asyncio
+import json
+import os
+
+from utils.apikeys import DATA_DIR
+from utils.const import TRIGGERS_FILE, WORDS_TO_REACT
+from utils.logger_config import logger
+from utils.trigger_matcher import TriggerMatcher
+
+
+class TriggerStore:
+  '''
+  The triggers of each guild and their compiled matchers.
+  The guilds without configuration use `WORDS_TO_REACT` as exact triggers.
+
+  Parameters
+  ----------
+  path: `str`
+      The JSON file where the configuration is saved.
+  '''
+  def __init__(self, path: str = os.path.join(DATA_DIR, TRIGGERS_FILE)):
+    self.path = path
+    # guild id -> {"exact": [...], "substring": [...]}
+    self._config: dict[str, dict[str, list[str]]] = self._read()
+    # guild id -> compiled matcher
+    self._matchers: dict[int | None, TriggerMatcher] = {}
+    self._write_lock = asyncio.Lock()
+
+  # region get_matcher
+  def get_matcher(self, guild_id: int | None) -> TriggerMatcher:
+    '''
+    Get the compiled matcher of a guild, compiling it on the first use.
+
+    Parameters
+    ----------
+    guild_id: `int` or `None`
+        The id of the guild, None for direct messages.
+    return: :class:`TriggerMatcher`
+    '''
+    matcher = self._matchers.get(guild_id)
+
+    if matcher is None:
+      triggers = self.get_triggers(guild_id)
+      matcher = TriggerMatcher(exact=triggers["exact"], substrings=triggers["substring"])
+      self._matchers[guild_id] = matcher
+
+    return matcher
+  # endregion
+
+  # region get_triggers
+  def get_triggers(self, guild_id: int | None) -> dict[str, list[str]]:
+    '''
+    Get the triggers of a guild.
+
+    Parameters
+    ----------
+    guild_id: `int` or `None`
+        The id of the guild, None for direct messages.
+    return: `dict`
+        The exact triggers in "exact" and the substring triggers in "substring".
+    '''
+    triggers = self._config.get(str(guild_id))
+
+    if triggers is None:
+      return {"exact": list(WORDS_TO_REACT), "substring": []}
+
+    return {"exact": list(triggers["exact"]), "substring": list(triggers["substring"])}
+  # endregion
+
+  # region add and remove
+  async def add_trigger(self, guild_id: int, word: str, substring: bool = False) -> bool:
+    '''
+    Add a trigger to a guild and save the configuration.
+    This is an asynchronous function and should be called with 'await'.
+
+    Parameters
+    ----------
+    guild_id: `int`
+        The id of the guild.
+    word: `str`
+        The trigger.
+    substring: `bool`
+        True if the trigger can be anywhere in the message. Default is False.
+    return: `bool`
+        False if the guild already had the trigger.
+    '''
+    word = word.lower().strip()
+    triggers = self.get_triggers(guild_id)
+    kind = "substring" if substring else "exact"
+
+    if not word or word in triggers[kind]:
+      return False
+
+    triggers[kind].append(word)
+    await self._update(guild_id, triggers)
+    return True
+
+  async def remove_trigger(self, guild_id: int, word: str) -> bool:
+    '''
+    Remove a trigger from a guild and save the configuration.
+    This is an asynchronous function and should be called with 'await'.
+
+    Parameters
+    ----------
+    guild_id: `int`
+        The id of the guild.
+    word: `str`
+        The trigger, exact or substring.
+    return: `bool`
+        False if the guild didn't have the trigger.
+    '''
+    word = word.lower().strip()
+    triggers = self.get_triggers(guild_id)
+
+    if word not in triggers["exact"] and word not in triggers["substring"]:
+      return False
+
+    triggers = {kind: [item for item in words if item != word] for kind, words in triggers.items()}
+    await self._update(guild_id, triggers)
+    return True
+  # endregion
+
+  # region persistence
+  async def _update(self, guild_id: int, triggers: dict[str, list[str]]):
+    self._config[str(guild_id)] = triggers
+    # Compiled again on the next message of the guild
+    self._matchers.pop(guild_id, None)
+
+    async with self._write_lock:
+      await asyncio.to_thread(self._write, dict(self._config))
+
+  def _read(self) -> dict:
+    path = self.path
+
+    # The file used to be saved in the working directory, it moves on the next write
+    if not os.path.exists(path) and os.path.exists(TRIGGERS_FILE):
+      path = TRIGGERS_FILE
+
+    if not os.path.exists(path):
+      return {}
+
+    try:
+      with open(path, encoding="utf-8") as file:
+        return json.load(file)
+    except (OSError, ValueError) as e:
+      logger.error("Failed to read the triggers from %s: %s", path, e)
+      return {}
+
+  def _write(self, config: dict):
+    # Write a temporary file and replace the old one, so a crash can't leave half a file
+    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+    temp_path = f"{self.path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+      json.dump(config, file, ensure_ascii=False, indent=2)
+    os.replace(temp_path, self.path)
+  # endregion